@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import func, not_, or_, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Action, Company
+from aso_validity import normalize_key
+from changelog import log_changes
+from versions import bump_versions
+from dashboard_cache import invalidate_dashboards
+
+
+# ============================================================
+# PRAZOS DO PLANO DE AÇÃO (PGR)
+# ============================================================
+# Ação em aberto = status que não começa com "concl" (sem diferenciar
+# maiúsculas: "Concluído", "concluida", "CONCLUÍDO"), incluindo sem
+# status, como no gráfico do dashboard. O status é texto livre; as
+# rotas do PGR gravam as variantes conhecidas na forma canônica
+# (canonical_status), mas a comparação não depende disso.
+#
+# A lista de vencidas / a vencer é uma faixa de prazo no índice
+# (company_id, prazo), em todas as empresas do usuário de uma vez, sem
+# percorrer a árvore; o filtro de status é aplicado sobre essa faixa.
+#
+# Varredura opcional: ACTION_SWEEP_INTERVAL_S > 0 liga uma thread que,
+# a cada intervalo, marca como "Atrasada" as ações em aberto com prazo
+# vencido (UPDATE em blocos). Com vários workers cada um roda a sua;
+# o UPDATE é idempotente.
+
+STATUS_DONE = "Concluído"
+STATUS_IN_PROGRESS = "Em andamento"
+STATUS_OVERDUE = "Atrasada"
+
+# prefixo (minúsculo, sem acento) → forma gravada
+CANONICAL_STATUS = [
+    ("concl", STATUS_DONE),
+    ("em andamento", STATUS_IN_PROGRESS),
+    ("atrasad", STATUS_OVERDUE),
+]
+
+SWEEP_INTERVAL_S = int(os.environ.get("ACTION_SWEEP_INTERVAL_S", "0"))
+SWEEP_BATCH_SIZE = 1000
+
+
+def canonical_status(status):
+    """'concluida' / 'CONCLUÍDO' → 'Concluído' etc.; outro texto fica como veio."""
+    if not isinstance(status, str):
+        return status
+
+    key = normalize_key(status)
+
+    if key is None:
+        return None
+
+    for prefix, canonical in CANONICAL_STATUS:
+        if key.startswith(prefix):
+            return canonical
+
+    return status.strip()
+
+
+def _status_like(prefix: str):
+    # prefixos em ASCII: lower() do SQLite basta mesmo com "CONCLUÍDO"
+    return func.lower(Action.status).like(f"{prefix}%")
+
+
+def _is_open(*excluded_prefixes):
+    """Sem status ou status fora de Concluído (e dos prefixos excluídos)."""
+    closed = or_(*[_status_like(p) for p in ("concl", *excluded_prefixes)])
+    return or_(Action.status.is_(None), not_(closed))
+
+
+def due_actions_query(
+    db: Session,
+    company_ids,
+    today: date,
+    dias: int,
+    situacao: Optional[str] = None,
+):
+    """
+    Ações em aberto com prazo vencido (situacao="atrasadas"), vencendo
+    nos próximos `dias` ("a_vencer") ou os dois (None), com o nome da
+    empresa. company_ids=None: todas.
+    """
+    query = (
+        db.query(
+            Action.id,
+            Action.company_id,
+            Company.name.label("empresa"),
+            Action.risk_id,
+            Action.recomendacao,
+            Action.tipo,
+            Action.prazo,
+            Action.responsavel,
+            Action.status,
+        )
+        .join(Company, Company.id == Action.company_id)
+        .filter(_is_open())
+    )
+
+    if company_ids is not None:
+        query = query.filter(Action.company_id.in_(sorted(company_ids)))
+
+    if situacao == "atrasadas":
+        query = query.filter(Action.prazo < today)
+    elif situacao == "a_vencer":
+        query = query.filter(Action.prazo >= today, Action.prazo <= today + timedelta(days=dias))
+    else:
+        query = query.filter(Action.prazo <= today + timedelta(days=dias))
+
+    return query
+
+
+def mark_overdue(db: Session, today: Optional[date] = None, company_ids=None) -> set:
+    """
+    Marca como Atrasada as ações em aberto com prazo < hoje, em blocos
+    de SWEEP_BATCH_SIZE. Devolve as empresas afetadas. Não faz commit.
+    """
+    today = today or date.today()
+    touched = set()
+
+    criteria = [
+        _is_open("atrasad"),
+        Action.prazo < today,
+    ]
+
+    if company_ids is not None:
+        criteria.append(Action.company_id.in_(sorted(company_ids)))
+
+    while True:
+        ids = db.execute(
+            select(Action.id).where(*criteria).order_by(Action.id).limit(SWEEP_BATCH_SIZE)
+        ).scalars().all()
+
+        if not ids:
+            break
+
+        companies = db.execute(
+            update(Action)
+            .where(Action.id.in_(ids))
+            .values(status=STATUS_OVERDUE, version=Action.version + 1)
+            .returning(Action.company_id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+
+        log_changes(db, Action, Action.id.in_(ids))
+        touched.update(companies)
+
+        if len(ids) < SWEEP_BATCH_SIZE:
+            break
+
+    if touched:
+        bump_versions(db, "pgr", touched)
+
+    return touched
+
+
+def _sweep_forever():
+    while True:
+        db = SessionLocal()
+        try:
+            touched = mark_overdue(db)
+            db.commit()
+            invalidate_dashboards(*touched)
+        except Exception as e:
+            db.rollback()
+            print(f"Varredura de ações atrasadas falhou: {e}")
+        finally:
+            db.close()
+
+        time.sleep(SWEEP_INTERVAL_S)
+
+
+def start_overdue_sweeper():
+    """Liga a varredura periódica se ACTION_SWEEP_INTERVAL_S > 0."""
+    if SWEEP_INTERVAL_S <= 0:
+        return None
+
+    thread = threading.Thread(target=_sweep_forever, name="action-overdue-sweep", daemon=True)
+    thread.start()
+    return thread
@@ -1,17 +1,31 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from sqlalchemy import func
 from sqlalchemy.orm import Session
-from datetime import date, timedelta
+from datetime import date
 
 from database import Base, engine, SessionLocal
 from models import *  # User, ASORecord, NR17Record, LTCATRecord etc.
+from summary import load_dashboard_geral
+from dashboard_cache import cached_dashboard
+from aso_validity import aso_status_counts
+from aso_stats import exames_por_mes as aso_exames_por_mes
+from tenancy import scope_company_ids
+from versions import conditional_response
+from search import ensure_search_indexes
+from action_deadlines import start_overdue_sweeper
 
 # ❌ NÃO rodar create_all no Supabase (tabelas já existem)
 # Base.metadata.create_all(bind=engine)
 print("Tabelas já estão no Supabase — create_all desativado.")
 
+# SQLite local: cria o índice FTS da busca em /records se faltar
+ensure_search_indexes(engine)
+
+# Plano de ação: marca ações vencidas como "Atrasada" de tempos em
+# tempos (só se ACTION_SWEEP_INTERVAL_S > 0)
+start_overdue_sweeper()
+
 
 # Routers
 from routers.auth_router import router as auth_router       # login / usuários
@@ -19,6 +33,9 @@ from routers.pgr_router import router as pgr_router         # PGR / NR-01
 from routers.aso_router import router as aso_router         # PCMSO / ASO
 from routers.nr17_router import router as nr17_router       # NR-17
 from routers.ltcat_router import router as ltcat_router     # LTCAT
+from routers.workers_router import router as workers_router # busca de trabalhadores
+from routers.sync_router import router as sync_router       # sync incremental (offline)
+from routers.auth_router import get_current_user
 
 app = FastAPI(
     title="Datainsight SST Suite",
@@ -44,6 +61,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # o front lê o ETag para mandar If-None-Match
+    expose_headers=["ETag", "Last-Modified"],
 )
 
 
@@ -56,6 +75,15 @@ def get_db() -> Session:
     return db
 
 
+def dashboard_not_modified(request: Request, response: Response, collections, company_ids, *extra):
+    """ETag do dashboard pelas versões das coleções (304 sem recalcular)."""
+    db = get_db()
+    try:
+        return conditional_response(request, response, db, collections, company_ids, *extra)
+    finally:
+        db.close()
+
+
 # ============================================================
 # ROTAS BÁSICAS
 # ============================================================
@@ -73,176 +101,81 @@ def health():
 # DASHBOARD GERAL — /api/dashboard/geral
 # ============================================================
 @app.get("/api/dashboard/geral")
-def dashboard_geral():
-    db = get_db()
-    try:
-        # ---------- Totais principais ----------
-        try:
-            total_asos = db.query(func.count(ASORecord.id)).scalar() or 0
-        except Exception:
-            total_asos = 0
+def dashboard_geral(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Lê os contadores mantidos em company_summaries / company_agent_counts
+    (ver summary.py) em vez de varrer as tabelas dos módulos.
+    """
+    company_ids = scope_company_ids(current_user)
 
-        try:
-            total_nr17 = db.query(func.count(NR17Record.id)).scalar() or 0
-        except Exception:
-            total_nr17 = 0
+    not_modified = dashboard_not_modified(
+        request, response, ["aso", "nr17", "ltcat"], company_ids
+    )
+    if not_modified:
+        return not_modified
 
+    def compute():
+        db = get_db()
         try:
-            total_ltcat = db.query(func.count(LTCATRecord.id)).scalar() or 0
-        except Exception:
-            total_ltcat = 0
+            return load_dashboard_geral(db, company_ids)
+        finally:
+            db.close()
 
-        # ---------- Risco médio NR-17 ----------
-        risco_medio_nr17 = 0.0
-        try:
-            media = db.query(func.avg(NR17Record.score)).scalar()
-            if media is not None:
-                risco_medio_nr17 = float(media)
-        except Exception:
-            risco_medio_nr17 = 0.0
-
-        # ---------- Perfil de risco NR-17 ----------
-        perfil = {"baixo": 0, "medio": 0, "alto": 0}
-        try:
-            rows = (
-                db.query(NR17Record.risk_level, func.count(NR17Record.id))
-                .group_by(NR17Record.risk_level)
-                .all()
-            )
-            for nivel, qtde in rows:
-                if not nivel:
-                    continue
-                n = str(nivel).strip().lower()
-                if "baixo" in n:
-                    perfil["baixo"] += qtde
-                elif "médio" in n or "medio" in n:
-                    perfil["medio"] += qtde
-                elif "alto" in n:
-                    perfil["alto"] += qtde
-        except Exception:
-            pass
-
-        # ---------- TOP 5 agentes nocivos (LTCAT) ----------
-        agentes_top5 = []
-        try:
-            rows = (
-                db.query(
-                    LTCATRecord.agent_name,
-                    func.count(LTCATRecord.id).label("total"),
-                )
-                .group_by(LTCATRecord.agent_name)
-                .order_by(func.count(LTCATRecord.id).desc())
-                .limit(5)
-                .all()
-            )
-            for nome, total in rows:
-                agentes_top5.append(
-                    {"nome": nome or "Agente não informado", "ocorrencias": int(total)}
-                )
-        except Exception:
-            agentes_top5 = []
-
-        # ---------- Últimas atividades (placeholder) ----------
-        ultimas_atividades = []
-
-        return {
-            "total_asos": total_asos,
-            "total_nr17": total_nr17,
-            "total_ltcat": total_ltcat,
-            "risco_medio_nr17": risco_medio_nr17,
-            "distribuicao_modulos": {
-                "aso": total_asos,
-                "nr17": total_nr17,
-                "ltcat": total_ltcat,
-            },
-            "perfil_risco_nr17": perfil,
-            "agentes_top5": agentes_top5,
-            "ultimas_atividades": ultimas_atividades,
-        }
-    finally:
-        db.close()
+    return cached_dashboard("geral", company_ids, compute)
 
 
 # ============================================================
 # DASHBOARD PCMSO / ASO — /api/dashboard/pcmsos
 # ============================================================
 @app.get("/api/dashboard/pcmsos")
-def dashboard_pcmsos():
+def dashboard_pcmsos(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
     """
-    Retorna indicadores do módulo PCMSO / ASO:
+    Retorna indicadores do módulo PCMSO / ASO, nas empresas do usuário:
     - exames_por_mes: [{mes, total}]
     - status_asos: {validos, vencidos, a_vencer}
     """
+    company_ids = scope_company_ids(current_user)
+
+    not_modified = dashboard_not_modified(request, response, ["aso"], company_ids, date.today())
+    if not_modified:
+        return not_modified
+
+    return cached_dashboard(
+        "pcmsos", company_ids, lambda: calcular_dashboard_pcmsos(company_ids)
+    )
+
+
+def calcular_dashboard_pcmsos(company_ids=None):
     db = get_db()
     try:
         exames_por_mes = []
         status_asos = {"validos": 0, "vencidos": 0, "a_vencer": 0}
 
+        asos = db.query(AsoRecord)
+        if company_ids is not None:
+            asos = asos.filter(AsoRecord.company_id.in_(sorted(company_ids)))
+
         # ---------- Exames por mês (últimos 12 meses) ----------
         try:
             hoje = date.today()
-            um_ano_atras = hoje.replace(year=hoje.year - 1)
-
-            # Ajuste os nomes de campos se forem diferentes:
-            # ASORecord.exam_date -> data do exame (Date ou DateTime)
-            rows = (
-                db.query(
-                    func.date_trunc("month", ASORecord.exam_date).label("mes"),
-                    func.count(ASORecord.id).label("total"),
-                )
-                .filter(ASORecord.exam_date >= um_ano_atras)
-                .group_by("mes")
-                .order_by("mes")
-                .all()
-            )
-
-            meses_pt = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun",
-                        "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
-
-            for mes_dt, total in rows:
-                if hasattr(mes_dt, "month"):
-                    label = f"{meses_pt[mes_dt.month - 1]}/{mes_dt.year}"
-                else:
-                    label = "Mês"
-                exames_por_mes.append(
-                    {"mes": label, "total": int(total)}
-                )
+            um_ano_atras = hoje.replace(year=hoje.year - 1, day=1)
+
+            exames_por_mes = aso_exames_por_mes(asos, since=um_ano_atras)
         except Exception as e:
             print("Erro ao calcular exames_por_mes:", e)
             exames_por_mes = []
 
         # ---------- Status dos ASOs ----------
         try:
-            hoje = date.today()
-            daqui_30 = hoje + timedelta(days=30)
-
-            # Ajuste o nome do campo de validade se for diferente:
-            # ASORecord.valid_until -> data de vencimento do ASO
-            validos = (
-                db.query(func.count(ASORecord.id))
-                .filter(ASORecord.valid_until >= hoje)
-                .scalar()
-                or 0
-            )
-            vencidos = (
-                db.query(func.count(ASORecord.id))
-                .filter(ASORecord.valid_until < hoje)
-                .scalar()
-                or 0
-            )
-            a_vencer = (
-                db.query(func.count(ASORecord.id))
-                .filter(ASORecord.valid_until >= hoje)
-                .filter(ASORecord.valid_until <= daqui_30)
-                .scalar()
-                or 0
-            )
-
-            status_asos = {
-                "validos": int(validos),
-                "vencidos": int(vencidos),
-                "a_vencer": int(a_vencer),
-            }
+            status_asos = aso_status_counts(asos)
         except Exception as e:
             print("Erro ao calcular status_asos:", e)
             status_asos = {"validos": 0, "vencidos": 0, "a_vencer": 0}
@@ -273,3 +206,9 @@ app.include_router(nr17_router)
 
 # módulo LTCAT
 app.include_router(ltcat_router)
+
+# busca de trabalhadores (ASO + NR-17 + LTCAT)
+app.include_router(workers_router)
+
+# sync incremental para clientes offline
+app.include_router(sync_router)
@@ -0,0 +1,51 @@
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import func
+
+from models import AsoRecord
+
+
+# ============================================================
+# EXAMES POR MÊS
+# ============================================================
+# mes_exame = ano * 100 + mês (ex.: 202603), gravado junto com o
+# ASO. É um inteiro comum: ordena corretamente, funciona igual no
+# SQLite e no Postgres e usa o índice (company_id, mes_exame).
+
+MESES_PT = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun",
+            "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
+
+
+def month_key(d: Optional[date]) -> Optional[int]:
+    if not d:
+        return None
+    return d.year * 100 + d.month
+
+
+def label_mes_ano(key: int) -> str:
+    """202603 → 'Mar/2026'"""
+    return f"{MESES_PT[key % 100 - 1]}/{key // 100}"
+
+
+def label_mm_yyyy(key: int) -> str:
+    """202603 → '03/2026'"""
+    return f"{key % 100:02d}/{key // 100}"
+
+
+def exames_por_mes(query, since: Optional[date] = None, label=label_mes_ano):
+    """[{mes, total}] em ordem cronológica, a partir de `since` (inclusive)."""
+    query = query.with_entities(AsoRecord.mes_exame, func.count().label("total"))
+
+    if since is not None:
+        query = query.filter(AsoRecord.mes_exame >= month_key(since))
+    else:
+        query = query.filter(AsoRecord.mes_exame.isnot(None))
+
+    rows = (
+        query.group_by(AsoRecord.mes_exame)
+        .order_by(AsoRecord.mes_exame)
+        .all()
+    )
+
+    return [{"mes": label(key), "total": int(total)} for key, total in rows]
@@ -0,0 +1,267 @@
+import calendar
+import unicodedata
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import bindparam, case, func, update
+from sqlalchemy.orm import Session
+
+from models import AsoRecord, AsoPeriodicity, Sector, Hazard
+from changelog import log_changes
+
+
+# ============================================================
+# VALIDADE DOS ASOs (NR-07)
+# ============================================================
+# valid_until = data_exame + periodicidade (em meses), conforme a
+# tabela aso_periodicities. A regra mais específica vence:
+#
+#   empresa + função + tipo  >  empresa + função  >  empresa + tipo
+#   > empresa  >  (mesma ordem nas regras globais, company_id NULL)
+#   > padrão do sistema
+#
+# meses NULL numa regra = exame sem validade (ex.: demissional).
+#
+# Regras por risco (agente preenchido) só encurtam o prazo: valem para
+# o trabalhador cujo setor (ASO.setor = nome do setor no PGR da mesma
+# empresa) tem um perigo com esse agente (ou nome), e vence a menor
+# periodicidade entre a regra acima e as regras de risco que casarem
+# (empresa / função / tipo NULL = qualquer). Mudanças no PGR não
+# recalculam sozinhas: usar POST /api/aso/records/recompute-validity.
+
+DEFAULT_PERIODICITY_MONTHS = 12
+DEFAULT_NO_VALIDITY = {"demissional"}
+
+RECOMPUTE_BATCH_SIZE = 2000
+
+
+def normalize_key(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return None
+
+    folded = unicodedata.normalize("NFKD", str(text))
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+
+    return folded.strip().lower() or None
+
+
+def add_months(d: date, months: int) -> date:
+    """Soma meses limitando ao último dia do mês (31/01 + 1 → 28/02)."""
+    month_index = d.month - 1 + months
+    year = d.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(d.day, calendar.monthrange(year, month)[1])
+    return date(year, month, day)
+
+
+class PeriodicityRules:
+    def __init__(self, rows: Iterable[AsoPeriodicity], exposures: Optional[dict] = None):
+        self._rules = {}
+        self._risk_rules = []
+
+        for row in rows:
+            funcao = normalize_key(row.funcao)
+            tipo = normalize_key(row.tipo_exame)
+            agente = normalize_key(row.agente)
+
+            if agente:
+                if row.meses is not None:
+                    self._risk_rules.append((row.company_id, funcao, tipo, agente, row.meses))
+                continue
+
+            self._rules[(row.company_id, funcao, tipo)] = row.meses
+
+        # (empresa, setor normalizado) → agentes dos perigos do setor no PGR
+        self._exposures = exposures or {}
+
+    def months_for(self, company_id, funcao, tipo_exame, setor=None):
+        funcao = normalize_key(funcao)
+        tipo = normalize_key(tipo_exame)
+
+        months = self._base_months(company_id, funcao, tipo)
+
+        if months is None or not self._risk_rules:
+            return months
+
+        agents = self._exposures.get((company_id, normalize_key(setor)), ())
+
+        for rule_company, rule_funcao, rule_tipo, agente, meses in self._risk_rules:
+            if (
+                agente in agents
+                and rule_company in (None, company_id)
+                and rule_funcao in (None, funcao)
+                and rule_tipo in (None, tipo)
+            ):
+                months = min(months, meses)
+
+        return months
+
+    def _base_months(self, company_id, funcao, tipo):
+        for scope in (company_id, None):
+            for key in (
+                (scope, funcao, tipo),
+                (scope, funcao, None),
+                (scope, None, tipo),
+                (scope, None, None),
+            ):
+                if key in self._rules:
+                    return self._rules[key]
+
+        if tipo in DEFAULT_NO_VALIDITY:
+            return None
+
+        return DEFAULT_PERIODICITY_MONTHS
+
+    def valid_until(self, company_id, funcao, tipo_exame, data_exame, setor=None):
+        if not data_exame:
+            return None
+
+        months = self.months_for(company_id, funcao, tipo_exame, setor)
+
+        if months is None:
+            return None
+
+        return add_months(data_exame, months)
+
+
+def load_exposures(db: Session, company_ids: Optional[Iterable[int]] = None) -> dict:
+    """(empresa, setor normalizado) → agentes / nomes dos perigos do setor."""
+    query = db.query(Sector.company_id, Sector.nome, Hazard.agente, Hazard.nome).join(
+        Hazard, Hazard.sector_id == Sector.id
+    )
+
+    if company_ids is not None:
+        query = query.filter(Sector.company_id.in_(sorted(set(company_ids))))
+
+    exposures = {}
+
+    for company_id, setor, agente, nome in query:
+        agents = exposures.setdefault((company_id, normalize_key(setor)), set())
+        agents.update(a for a in (normalize_key(agente), normalize_key(nome)) if a)
+
+    return exposures
+
+
+def load_rules(db: Session, company_ids: Optional[Iterable[int]] = None) -> PeriodicityRules:
+    """Regras globais + regras das empresas informadas (None = todas)."""
+    query = db.query(AsoPeriodicity)
+
+    if company_ids is not None:
+        query = query.filter(
+            (AsoPeriodicity.company_id.is_(None))
+            | (AsoPeriodicity.company_id.in_(sorted(set(company_ids))))
+        )
+
+    rows = query.all()
+
+    # setores / perigos do PGR só importam se houver regra por risco
+    exposures = load_exposures(db, company_ids) if any(r.agente for r in rows) else None
+
+    return PeriodicityRules(rows, exposures)
+
+
+def recompute_valid_until(db: Session, company_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recalcula valid_until em lote (ex.: depois de mudar a tabela de
+    periodicidade). Lê só as colunas necessárias em blocos e grava com
+    um UPDATE executemany por bloco. Não faz commit.
+    """
+    rules = load_rules(db, company_ids)
+
+    query = db.query(
+        AsoRecord.id,
+        AsoRecord.company_id,
+        AsoRecord.funcao,
+        AsoRecord.setor,
+        AsoRecord.tipo_exame,
+        AsoRecord.data_exame,
+        AsoRecord.valid_until,
+    )
+
+    if company_ids is not None:
+        query = query.filter(AsoRecord.company_id.in_(sorted(set(company_ids))))
+
+    stmt = (
+        update(AsoRecord.__table__)
+        .where(AsoRecord.__table__.c.id == bindparam("_id"))
+        .values(valid_until=bindparam("_valid_until"))
+    )
+
+    changed = []
+    total = 0
+    last_id = 0
+
+    # paginação por id: não mantém cursor aberto enquanto grava
+    while True:
+        rows = (
+            query.filter(AsoRecord.id > last_id)
+            .order_by(AsoRecord.id)
+            .limit(RECOMPUTE_BATCH_SIZE)
+            .all()
+        )
+
+        if not rows:
+            break
+
+        for row in rows:
+            new_value = rules.valid_until(
+                row.company_id, row.funcao, row.tipo_exame, row.data_exame, row.setor
+            )
+
+            if new_value != row.valid_until:
+                changed.append({"_id": row.id, "_valid_until": new_value})
+
+        last_id = rows[-1].id
+
+        if changed:
+            db.execute(stmt, changed)
+            log_changes(db, AsoRecord, AsoRecord.id.in_([c["_id"] for c in changed]))
+            total += len(changed)
+            changed = []
+
+    return total
+
+
+def aso_status_counts(query, hoje: Optional[date] = None):
+    """
+    Válidos / vencidos / a vencer (30 dias) em uma única query com
+    agregação condicional. Conta só o último exame de cada trabalhador
+    (empresa + CPF): o exame periódico renovado substitui o anterior.
+    Trabalhador cujo último exame não tem validade (demissional) fica
+    de fora.
+    """
+    hoje = hoje or date.today()
+    daqui_30 = hoje + timedelta(days=30)
+
+    latest = (
+        query.with_entities(
+            AsoRecord.valid_until.label("valid_until"),
+            func.row_number()
+            .over(
+                partition_by=(AsoRecord.company_id, AsoRecord.cpf),
+                order_by=(AsoRecord.data_exame.desc(), AsoRecord.id.desc()),
+            )
+            .label("ordem"),
+        )
+        .order_by(None)
+        .subquery()
+    )
+
+    def count_if(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    validos, vencidos, a_vencer = (
+        query.session.query(
+            count_if(latest.c.valid_until >= hoje),
+            count_if(latest.c.valid_until < hoje),
+            count_if(latest.c.valid_until.between(hoje, daqui_30)),
+        )
+        .filter(latest.c.ordem == 1, latest.c.valid_until.isnot(None))
+        .one()
+    )
+
+    return {
+        "validos": int(validos),
+        "vencidos": int(vencidos),
+        "a_vencer": int(a_vencer),
+    }
@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Cache em memória do processo, com tamanho máximo (LRU) e expiração
+    por TTL. Thread-safe, já que as rotas síncronas do FastAPI rodam
+    em threadpool.
+
+    Cada worker do uvicorn tem a sua própria cópia, então o TTL é o
+    limite de tempo em que um worker pode enxergar um dado antigo
+    quando a invalidação acontece em outro processo.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        # cálculo em andamento por chave; invalidar a chave descarta o
+        # token e o resultado daquele cálculo não é guardado
+        self._pending = {}
+
+    def _lookup(self, key):
+        # chamar com self._lock adquirido
+        item = self._data.get(key)
+
+        if item is None:
+            return None
+
+        expires_at, value = item
+
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key):
+        with self._lock:
+            value = self._lookup(key)
+
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+            return value
+
+    def get_or_compute(self, key, compute):
+        """
+        Single-flight: se várias threads pedem a mesma chave ausente ao
+        mesmo tempo, só uma executa compute(); as outras esperam e
+        reaproveitam o resultado.
+        """
+        with self._lock:
+            value = self._lookup(key)
+
+            if value is not None:
+                self.hits += 1
+                return value
+
+            self.misses += 1
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                value = self._lookup(key)
+
+                if value is not None:
+                    self.coalesced += 1
+                    return value
+
+                token = object()
+                self._pending[key] = token
+
+            try:
+                value = compute()
+
+                # não guarda se a chave foi invalidada durante o cálculo
+                with self._lock:
+                    if self._pending.get(key) is token:
+                        self._store(key, value)
+
+                return value
+            finally:
+                with self._lock:
+                    if self._pending.get(key) is token:
+                        del self._pending[key]
+
+                    if self._inflight.get(key) is key_lock:
+                        del self._inflight[key]
+
+    def _store(self, key, value):
+        # chamar com self._lock adquirido
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._pending.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """Remove todas as chaves para as quais predicate(key) é verdadeiro."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+            for key in [k for k in self._pending if predicate(k)]:
+                del self._pending[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._pending.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
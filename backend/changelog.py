@@ -0,0 +1,306 @@
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import DateTime, delete, event, exists, func, insert, inspect, literal, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import (
+    Company, Sector, Hazard, Risk, Action,
+    AsoRecord, NR17Record, LTCATRecord, ChangeLog,
+)
+
+
+# ============================================================
+# LOG DE MUDANÇAS (sync incremental — /sync/changes)
+# ============================================================
+# Escritas pelo ORM (add / alteração / delete) entram em change_log no
+# mesmo flush, pelo listener abaixo. Escritas em lote (UPDATE / INSERT
+# em massa) chamam log_changes com o mesmo filtro; comandos únicos com
+# RETURNING (writes.py) chamam log_records.
+#
+# O log é compacto: antes de registrar um registro numa empresa, a
+# entrada anterior dele nessa mesma empresa é apagada. A tabela fica
+# com no máximo uma linha por registro e empresa (vivo ou excluído) e
+# quem ficou offline recebe cada registro uma vez, já no estado atual.
+#
+# Registro movido para outra empresa (PGR): upsert na nova e tombstone
+# na antiga, para o cliente da empresa antiga removê-lo. Como a
+# compactação é por empresa, edições posteriores (na nova) não apagam
+# o tombstone da antiga.
+#
+# Cursor = seq, atribuído no commit, não no INSERT: no Postgres as
+# transações não terminam na ordem dos ids, e um cliente que avançasse
+# o cursor além de um id ainda não commitado nunca veria essa mudança.
+# Antes do commit, a transação que gravou no log pega um advisory lock
+# (liberado só no fim dela) e numera as próprias entradas com a
+# sequence change_log_seq; seq cresce na ordem de commit e nenhuma
+# entrada aparece com seq menor que outra já visível. O custo é
+# serializar só esse trecho final dos commits que mexem no log. No
+# SQLite há um escritor por vez no banco todo: seq = id.
+
+SYNC_ENTITIES = {
+    "aso": AsoRecord,
+    "nr17": NR17Record,
+    "ltcat": LTCATRecord,
+    "companies": Company,
+    "sectors": Sector,
+    "hazards": Hazard,
+    "risks": Risk,
+    "actions": Action,
+}
+
+ENTITY_BY_MODEL = {model: entity for entity, model in SYNC_ENTITIES.items()}
+
+SYNC_PAGE_SIZE = 1000
+
+_LOG_COLUMNS = ["entity", "record_id", "company_id", "op", "changed_at"]
+
+# advisory lock da numeração do log (Postgres); valor arbitrário e fixo
+CHANGE_LOG_LOCK_KEY = 0x636C6F67
+
+_PENDING = "change_log_pending"
+
+
+def _company_column(model):
+    return model.id if model is Company else model.company_id
+
+
+def _company_of(obj):
+    return obj.id if isinstance(obj, Company) else obj.company_id
+
+
+def _compact(conn, entity: str, company, record_ids):
+    """Apaga as entradas anteriores dos registros na empresa `company`."""
+    table = ChangeLog.__table__
+
+    conn.execute(
+        delete(table).where(
+            table.c.entity == entity,
+            table.c.company_id.is_not_distinct_from(company),
+            table.c.record_id.in_(record_ids),
+        )
+    )
+
+
+def _compact_current(conn, model, entity: str, criteria):
+    """Como _compact, com a empresa atual de cada registro (subquery correlacionada)."""
+    table = ChangeLog.__table__
+    source = model.__table__
+    company = _company_column(model)
+
+    conn.execute(
+        delete(table).where(
+            table.c.entity == entity,
+            exists().where(
+                source.c.id == table.c.record_id,
+                company.is_not_distinct_from(table.c.company_id),
+                *criteria,
+            ),
+        )
+    )
+
+
+def log_changes(
+    db: Session,
+    model,
+    *criteria,
+    previous_company_id: Optional[int] = None,
+    op: str = "upsert",
+):
+    """
+    Registra como alterados os registros de model que atendem aos
+    critérios (INSERT ... SELECT, sem carregar linhas). Para UPDATEs em
+    lote: chamar com um filtro que continue valendo depois do UPDATE, ou
+    antes dele. previous_company_id: empresa de onde os registros saíram.
+    op="delete": tombstones, chamar antes do DELETE em lote.
+    """
+    entity = ENTITY_BY_MODEL[model]
+    source = model.__table__
+    now = literal(datetime.utcnow(), DateTime())
+    conn = db.connection()
+    db.info[_PENDING] = True
+
+    _compact_current(conn, model, entity, criteria)
+
+    targets = [(_company_column(model), op)]
+
+    if previous_company_id is not None:
+        _compact(conn, entity, previous_company_id, select(source.c.id).where(*criteria))
+        targets.append((literal(previous_company_id), "delete"))
+
+    for company, op in targets:
+        conn.execute(
+            insert(ChangeLog.__table__).from_select(
+                _LOG_COLUMNS,
+                select(literal(entity), source.c.id, company, literal(op), now).where(*criteria),
+            )
+        )
+
+
+def _flush_entries(session: Session):
+    entries = []
+
+    for obj in session.new:
+        entity = ENTITY_BY_MODEL.get(type(obj))
+
+        if entity:
+            entries.append((entity, obj.id, _company_of(obj), "upsert"))
+
+    for obj in session.dirty:
+        entity = ENTITY_BY_MODEL.get(type(obj))
+
+        if not entity or not session.is_modified(obj, include_collections=False):
+            continue
+
+        entries.append((entity, obj.id, _company_of(obj), "upsert"))
+
+        if not isinstance(obj, Company):
+            for previous in inspect(obj).attrs.company_id.history.deleted:
+                if previous is not None and previous != obj.company_id:
+                    entries.append((entity, obj.id, previous, "delete"))
+
+    for obj in session.deleted:
+        entity = ENTITY_BY_MODEL.get(type(obj))
+
+        if entity:
+            entries.append((entity, obj.id, _company_of(obj), "delete"))
+
+    return entries
+
+
+def _write_entries(session: Session, entries):
+    conn = session.connection()
+    session.info[_PENDING] = True
+    now = datetime.utcnow()
+
+    by_company = {}
+    for entity, record_id, company_id, _ in entries:
+        by_company.setdefault((entity, company_id), set()).add(record_id)
+
+    for (entity, company_id), record_ids in by_company.items():
+        _compact(conn, entity, company_id, sorted(record_ids))
+
+    conn.execute(
+        insert(ChangeLog.__table__),
+        [dict(zip(_LOG_COLUMNS, (*entry, now))) for entry in entries],
+    )
+
+
+def log_records(db: Session, model, records, op: str = "upsert", previous_company_id: Optional[int] = None):
+    """
+    Registra registros gravados fora do flush do ORM (UPDATE / DELETE /
+    INSERT ... RETURNING de writes.py).
+    """
+    entity = ENTITY_BY_MODEL[model]
+    entries = []
+
+    for record in records:
+        company_id = _company_of(record)
+        entries.append((entity, record.id, company_id, op))
+
+        if previous_company_id is not None and previous_company_id != company_id:
+            entries.append((entity, record.id, previous_company_id, "delete"))
+
+    if entries:
+        _write_entries(db, entries)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _log_flush(session: Session, flush_context):
+    entries = _flush_entries(session)
+
+    if entries:
+        _write_entries(session, entries)
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _number_entries(session: Session):
+    # o flush do próprio commit vem depois deste evento: adianta aqui
+    # para as entradas dele também serem numeradas
+    session.flush()
+
+    if not session.info.pop(_PENDING, False):
+        return
+
+    conn = session.connection()
+    table = ChangeLog.__table__
+
+    if conn.dialect.name == "postgresql":
+        conn.execute(select(func.pg_advisory_xact_lock(CHANGE_LOG_LOCK_KEY)))
+        seq = func.nextval("change_log_seq")
+    else:
+        seq = table.c.id
+
+    # entradas sem seq visíveis aqui são só as desta transação
+    conn.execute(update(table).where(table.c.seq.is_(None)).values(seq=seq))
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_pending(session: Session):
+    session.info.pop(_PENDING, None)
+
+
+def changes_since(
+    db: Session,
+    since: int,
+    company_ids=None,
+    entities: Optional[Iterable[str]] = None,
+    limit: int = SYNC_PAGE_SIZE,
+):
+    """
+    Mudanças com seq > since, em ordem de commit, no escopo das
+    empresas (None = todas). Devolve o novo cursor, se há mais páginas
+    e, por entidade, as linhas atuais (upserts) e os ids excluídos.
+    """
+    query = db.query(ChangeLog).filter(ChangeLog.seq > since)
+
+    if company_ids is not None:
+        query = query.filter(ChangeLog.company_id.in_(sorted(company_ids)))
+
+    if entities is not None:
+        query = query.filter(ChangeLog.entity.in_(sorted(entities)))
+
+    entries = query.order_by(ChangeLog.seq).limit(limit + 1).all()
+
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    upserts = {}
+    deletes = {}
+
+    for entry in entries:
+        target = upserts if entry.op == "upsert" else deletes
+        target.setdefault(entry.entity, []).append(entry.record_id)
+
+    changes = {}
+
+    for entity, ids in upserts.items():
+        table = SYNC_ENTITIES[entity].__table__
+        rows = [
+            dict(row)
+            for row in db.execute(
+                select(table).where(table.c.id.in_(ids)).order_by(table.c.id)
+            ).mappings()
+        ]
+
+        changes[entity] = {"upserts": rows, "deletes": []}
+
+        # excluído depois de logado (transação concorrente): vira tombstone
+        missing = set(ids) - {row["id"] for row in rows}
+        if missing:
+            deletes.setdefault(entity, []).extend(sorted(missing))
+
+    for entity, ids in deletes.items():
+        # movido entre duas empresas do mesmo usuário: vale o upsert
+        alive = {row["id"] for row in changes.get(entity, {}).get("upserts", [])}
+        ids = [i for i in ids if i not in alive]
+
+        if ids:
+            changes.setdefault(entity, {"upserts": [], "deletes": []})["deletes"] = ids
+
+    return {
+        "cursor": entries[-1].seq if entries else since,
+        "has_more": has_more,
+        "changes": changes,
+    }
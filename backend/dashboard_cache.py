@@ -0,0 +1,40 @@
+import os
+
+from cache import TTLCache
+
+
+# ============================================================
+# CACHE DOS DASHBOARDS
+# ============================================================
+# Chave: (nome do dashboard, escopo). O escopo é o conjunto de
+# empresas do usuário, ou None para quem enxerga tudo (admin).
+# As rotas de escrita dos módulos chamam invalidate_dashboards()
+# depois do commit; o TTL cobre os demais workers.
+
+DASHBOARD_CACHE_TTL = float(os.environ.get("DASHBOARD_CACHE_TTL", "30"))
+DASHBOARD_CACHE_SIZE = int(os.environ.get("DASHBOARD_CACHE_SIZE", "2048"))
+
+dashboard_cache = TTLCache(maxsize=DASHBOARD_CACHE_SIZE, ttl=DASHBOARD_CACHE_TTL)
+
+
+def cached_dashboard(name: str, company_ids, compute):
+    """company_ids=None → escopo global (admin)."""
+    scope = None if company_ids is None else frozenset(company_ids)
+    return dashboard_cache.get_or_compute((name, scope), compute)
+
+
+def invalidate_dashboards(*company_ids):
+    changed = {c for c in company_ids if c is not None}
+
+    if not changed:
+        return
+
+    def affected(key):
+        _, scope = key
+        return scope is None or not scope.isdisjoint(changed)
+
+    dashboard_cache.invalidate_where(affected)
+
+
+def invalidate_all_dashboards():
+    dashboard_cache.clear()
@@ -0,0 +1,216 @@
+import io
+import os
+import uuid
+
+import numpy as np
+
+
+# ============================================================
+# DOSIMETRIA DE RUÍDO (LTCAT)
+# ============================================================
+# O arquivo do dosímetro (uma amostra em dB(A) por linha, com ou sem
+# coluna de horário) é lido em blocos e convertido direto para um
+# array NumPy pelo parser em C do np.loadtxt. Os indicadores são
+# calculados sobre o array inteiro (NHO-01):
+#
+#   k    = q / log10(2)                   (q = fator de duplicação)
+#   Leq  = k · log10(média(10^(L/k)))
+#   Dose = 100 · Σ dt / T(L),  T(L) = 8h / 2^((L − Lc)/q), L ≥ limiar
+#   TWA  = Lc + k · log10(Dose / 100)     (nível normalizado p/ 8h)
+#
+# A série bruta fica em DOSIMETRY_DIR como .npz (float32 comprimido),
+# e só o resumo vai para o banco (tabela ltcat_dosimetries).
+
+DOSIMETRY_DIR = os.environ.get(
+    "DOSIMETRY_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "dosimetria"),
+)
+
+CRITERIO_DBA = 85.0
+LIMIAR_DBA = 80.0
+JORNADA_REFERENCIA_S = 8 * 3600
+
+READ_BLOCK_SIZE = 1024 * 1024
+MAX_SAMPLES = int(os.environ.get("DOSIMETRY_MAX_SAMPLES", "5000000"))
+
+
+class DosimetryError(ValueError):
+    pass
+
+
+def _is_number(text: str) -> bool:
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def _detect_format(first_line: str):
+    """Separador, se a vírgula é decimal e se a linha é cabeçalho."""
+    if ";" in first_line:
+        delimiter = ";"
+    elif "\t" in first_line:
+        delimiter = "\t"
+    elif "," in first_line:
+        parts = first_line.split(",")
+        single_decimal = (
+            len(parts) == 2 and "." not in first_line
+            and all(_is_number(p.strip()) for p in parts)
+        )
+        # "87,5" sozinho é vírgula decimal; o resto é separador
+        delimiter = None if single_decimal else ","
+    else:
+        delimiter = None
+
+    decimal_comma = delimiter != ","
+
+    # delimiter None = espaços / tabs, como no np.loadtxt ("08:00:01 87.5")
+    last = first_line.split(delimiter)[-1].strip()
+    if decimal_comma:
+        last = last.replace(",", ".")
+
+    return delimiter, decimal_comma, not _is_number(last)
+
+
+def read_samples(fileobj) -> np.ndarray:
+    """Lê as amostras (última coluna) em blocos; devolve float64."""
+    blocks = []
+    total = 0
+    rest = b""
+    fmt = None
+
+    while True:
+        data = fileobj.read(READ_BLOCK_SIZE)
+        buffer = rest + data
+
+        if data:
+            cut = buffer.rfind(b"\n") + 1
+            buffer, rest = buffer[:cut], buffer[cut:]
+        else:
+            rest = b""
+
+        if buffer.strip():
+            text = buffer.decode("utf-8-sig")
+
+            if fmt is None:
+                first_line = next(line for line in text.splitlines() if line.strip())
+                fmt = _detect_format(first_line)
+                delimiter, decimal_comma, has_header = fmt
+                usecols = -1  # nível = última coluna, com ou sem horário
+                skip = 1 if has_header else 0
+            else:
+                skip = 0
+
+            if decimal_comma:
+                text = text.replace(",", ".")
+
+            try:
+                block = np.loadtxt(
+                    io.StringIO(text),
+                    delimiter=delimiter,
+                    usecols=usecols,
+                    skiprows=skip,
+                    comments="#",
+                    ndmin=1,
+                )
+            except ValueError as e:
+                raise DosimetryError(f"Arquivo de dosimetria inválido: {e}")
+
+            total += block.size
+
+            if total > MAX_SAMPLES:
+                raise DosimetryError(f"Arquivo excede o limite de {MAX_SAMPLES} amostras.")
+
+            blocks.append(block)
+
+        if not data:
+            break
+
+    if not total:
+        raise DosimetryError("Arquivo de dosimetria sem amostras.")
+
+    return np.concatenate(blocks)
+
+
+def noise_metrics(
+    levels: np.ndarray,
+    intervalo_s: float = 1.0,
+    q: float = 3.0,
+    criterio: float = CRITERIO_DBA,
+    limiar: float = LIMIAR_DBA,
+):
+    """Leq, dose, TWA e pico de uma série de níveis em dB(A)."""
+    levels = np.asarray(levels, dtype=np.float64)
+    levels = levels[np.isfinite(levels)]
+
+    if not levels.size:
+        raise DosimetryError("Série de dosimetria vazia.")
+
+    k = q / np.log10(2.0)
+
+    leq = k * np.log10(np.mean(np.power(10.0, levels / k)))
+
+    counted = levels >= limiar
+    dose = 100.0 * intervalo_s / JORNADA_REFERENCIA_S * np.sum(
+        np.power(2.0, (levels[counted] - criterio) / q)
+    )
+
+    twa = criterio + k * np.log10(dose / 100.0) if dose > 0 else None
+
+    return {
+        "amostras": int(levels.size),
+        "intervalo_s": float(intervalo_s),
+        "duracao_s": float(levels.size * intervalo_s),
+        "fator_duplicacao": float(q),
+        "leq": round(float(leq), 2),
+        "dose": round(float(dose), 2),
+        "twa": None if twa is None else round(float(twa), 2),
+        "pico": round(float(levels.max()), 2),
+    }
+
+
+def save_series(record_id: int, levels: np.ndarray, intervalo_s: float) -> str:
+    """Grava a série como .npz comprimido; devolve o nome do arquivo."""
+    os.makedirs(DOSIMETRY_DIR, exist_ok=True)
+
+    arquivo = f"{record_id}_{uuid.uuid4().hex}.npz"
+    np.savez_compressed(
+        os.path.join(DOSIMETRY_DIR, arquivo),
+        levels=levels.astype(np.float32),
+        intervalo_s=intervalo_s,
+    )
+
+    return arquivo
+
+
+def load_series(arquivo: str):
+    with np.load(os.path.join(DOSIMETRY_DIR, arquivo)) as data:
+        return data["levels"], float(data["intervalo_s"])
+
+
+def remove_series(arquivo: str):
+    try:
+        os.remove(os.path.join(DOSIMETRY_DIR, arquivo))
+    except FileNotFoundError:
+        pass
+
+
+# Exclusão de registro: os arquivos só podem sair do disco depois do
+# commit. Ficam anotados na sessão (db.info) até lá.
+PENDING_REMOVAL_KEY = "dosimetry_pending_removal"
+
+
+def schedule_removal(db, arquivos):
+    db.info.setdefault(PENDING_REMOVAL_KEY, []).extend(arquivos)
+
+
+def remove_pending(db):
+    """Chamar depois do commit."""
+    for arquivo in db.info.pop(PENDING_REMOVAL_KEY, []):
+        remove_series(arquivo)
+
+
+def discard_pending(db):
+    """Chamar no rollback: os arquivos continuam valendo."""
+    db.info.pop(PENDING_REMOVAL_KEY, None)
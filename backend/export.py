@@ -0,0 +1,84 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Literal
+
+from fastapi import Query
+from fastapi.responses import StreamingResponse
+
+from database import SessionLocal
+
+
+# ============================================================
+# EXPORTAÇÃO EM STREAMING (CSV / NDJSON)
+# ============================================================
+# As linhas são lidas do banco em lotes (yield_per + stream_results,
+# cursor do lado do servidor no Postgres) e enviadas ao cliente
+# conforme são lidas, então a memória não cresce com o tamanho da
+# tabela.
+
+EXPORT_BATCH_SIZE = 1000
+
+ExportFormat = Literal["csv", "ndjson"]
+
+
+def export_format_param(fmt: ExportFormat = Query("csv", alias="format")):
+    return fmt
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def stream_export(build_query, model, fmt: ExportFormat, filename: str):
+    """
+    `build_query(db)` deve devolver a query já filtrada pelo escopo do
+    usuário. O gerador abre a própria sessão, porque a sessão da
+    requisição pode ser fechada antes do fim do streaming.
+    """
+    columns = list(model.__table__.columns)
+    names = [c.name for c in columns]
+
+    def generate():
+        db = SessionLocal()
+        try:
+            rows = (
+                build_query(db)
+                .with_entities(*columns)
+                .order_by(model.id.asc())
+                .execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+            )
+
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+
+            if fmt == "csv":
+                buffer.write("\ufeff")  # BOM para o Excel abrir acentos corretamente
+                writer.writerow(names)
+
+            for i, row in enumerate(rows, start=1):
+                if fmt == "csv":
+                    writer.writerow(row)
+                else:
+                    buffer.write(json.dumps(dict(zip(names, row)), default=_json_default, ensure_ascii=False))
+                    buffer.write("\n")
+
+                if i % EXPORT_BATCH_SIZE == 0:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+
+            yield buffer.getvalue()
+        finally:
+            db.close()
+
+    media_type = "text/csv; charset=utf-8" if fmt == "csv" else "application/x-ndjson"
+
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
@@ -0,0 +1,400 @@
+import re
+import unicodedata
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import update
+
+from models import LTCATRecord
+from changelog import log_changes
+
+
+# ============================================================
+# MOTOR DE ENQUADRAMENTO LTCAT (aposentadoria especial)
+# ============================================================
+# Classifica um lote inteiro de registros de uma vez:
+#
+# 1. intensidade / unidade / agente são textos livres. Cada valor
+#    distinto é interpretado uma única vez (np.unique + inverse), e
+#    o resultado é espalhado para todas as linhas.
+# 2. O cálculo de exposição e o enquadramento são operações NumPy
+#    sobre o lote inteiro, sem laço por registro.
+#
+# Regras (Decreto 3.048/99, Anexo IV; NHO-01; NR-15):
+# - Ruído: NEN = L + 10·log10(Te / 8h), enquadra se NEN > 85 dB(A).
+#   EPI não descaracteriza (STF, ARE 664.335).
+# - Calor / vibração / químicos quantitativos: enquadra acima do
+#   limite; químicos com jornada > 8h usam o limite corrigido por
+#   Brief & Scala. EPI eficaz descaracteriza.
+# - Cancerígenos (LINACH) e biológicos: avaliação qualitativa,
+#   enquadra pela presença; EPI não descaracteriza cancerígenos.
+# - 20 anos: asbesto/amianto e mineração subterrânea afastada da
+#   frente; 15 anos: mineração subterrânea na frente de produção;
+#   25 anos: demais agentes.
+# - Agente fora da tabela (ex.: eletricidade, frio, radiação não
+#   ionizante) não é classificado: o recálculo mantém o enquadramento
+#   gravado (informado pelo técnico) e só conta esses registros.
+
+SEM_ENQUADRAMENTO = "Sem enquadramento"
+ENQUADRAMENTO_LABELS = {
+    15: "Especial – 15 anos",
+    20: "Especial – 20 anos",
+    25: "Especial – 25 anos",
+}
+
+JORNADA_PADRAO = 8.0
+DIAS_SEMANA_PADRAO = 5
+
+NOISE_LIMIT_DBA = 85.0
+
+# tipos de agente
+GENERIC, NOISE, HEAT, VIBRATION, CHEMICAL, QUALITATIVE, QUALITATIVE_NO_EPI = range(7)
+KIND_NAMES = {
+    GENERIC: "nao_classificado",
+    NOISE: "ruido",
+    HEAT: "calor",
+    VIBRATION: "vibracao",
+    CHEMICAL: "quimico",
+    QUALITATIVE: "qualitativo",
+    QUALITATIVE_NO_EPI: "cancerigeno",
+}
+
+# unidades normalizadas: (código, fator para a unidade base)
+UNIT_NONE, UNIT_DBA, UNIT_PPM, UNIT_MGM3, UNIT_CELSIUS, UNIT_MS2 = range(6)
+UNIT_NAMES = {
+    UNIT_NONE: None,
+    UNIT_DBA: "dB(A)",
+    UNIT_PPM: "ppm",
+    UNIT_MGM3: "mg/m³",
+    UNIT_CELSIUS: "°C",
+    UNIT_MS2: "m/s²",
+}
+
+# palavra-chave no nome do agente → (tipo, limite, unidade do limite, anos)
+# A ordem importa: a primeira palavra encontrada vence.
+AGENT_RULES = [
+    ("frente de producao", (QUALITATIVE_NO_EPI, np.nan, UNIT_NONE, 15)),
+    ("mineracao subterranea", (QUALITATIVE_NO_EPI, np.nan, UNIT_NONE, 20)),
+    ("asbesto", (QUALITATIVE_NO_EPI, np.nan, UNIT_NONE, 20)),
+    ("amianto", (QUALITATIVE_NO_EPI, np.nan, UNIT_NONE, 20)),
+    ("benzeno", (QUALITATIVE_NO_EPI, np.nan, UNIT_NONE, 25)),
+    ("silica", (QUALITATIVE_NO_EPI, np.nan, UNIT_NONE, 25)),
+    # "não ionizante" contém "ionizante": fica de fora antes da regra
+    ("nao ionizante", (GENERIC, np.nan, UNIT_NONE, 25)),
+    ("ionizante", (QUALITATIVE_NO_EPI, np.nan, UNIT_NONE, 25)),
+    ("raios x", (QUALITATIVE_NO_EPI, np.nan, UNIT_NONE, 25)),
+    ("raio x", (QUALITATIVE_NO_EPI, np.nan, UNIT_NONE, 25)),
+    ("radioativ", (QUALITATIVE_NO_EPI, np.nan, UNIT_NONE, 25)),
+    ("ruido", (NOISE, NOISE_LIMIT_DBA, UNIT_DBA, 25)),
+    ("calor", (HEAT, 26.7, UNIT_CELSIUS, 25)),
+    ("ibutg", (HEAT, 26.7, UNIT_CELSIUS, 25)),
+    ("vibracao", (VIBRATION, 1.1, UNIT_MS2, 25)),
+    ("tolueno", (CHEMICAL, 78.0, UNIT_PPM, 25)),
+    ("xileno", (CHEMICAL, 78.0, UNIT_PPM, 25)),
+    ("amonia", (CHEMICAL, 20.0, UNIT_PPM, 25)),
+    ("monoxido de carbono", (CHEMICAL, 39.0, UNIT_PPM, 25)),
+    ("acetona", (CHEMICAL, 780.0, UNIT_PPM, 25)),
+    ("chumbo", (CHEMICAL, 0.1, UNIT_MGM3, 25)),
+    ("manganes", (CHEMICAL, 5.0, UNIT_MGM3, 25)),
+    ("virus", (QUALITATIVE, np.nan, UNIT_NONE, 25)),
+    ("bacteria", (QUALITATIVE, np.nan, UNIT_NONE, 25)),
+    ("fungo", (QUALITATIVE, np.nan, UNIT_NONE, 25)),
+    ("biologic", (QUALITATIVE, np.nan, UNIT_NONE, 25)),
+]
+
+UNRECOGNIZED_AGENT = (GENERIC, np.nan, UNIT_NONE, 25)
+
+# texto da unidade (normalizado) → (unidade base, fator)
+UNIT_ALIASES = {
+    "db(a)": (UNIT_DBA, 1.0),
+    "dba": (UNIT_DBA, 1.0),
+    "db": (UNIT_DBA, 1.0),
+    "ppm": (UNIT_PPM, 1.0),
+    "mg/m3": (UNIT_MGM3, 1.0),
+    "mg/m³": (UNIT_MGM3, 1.0),
+    "mg/m^3": (UNIT_MGM3, 1.0),
+    "ug/m3": (UNIT_MGM3, 0.001),
+    "µg/m3": (UNIT_MGM3, 0.001),
+    "µg/m³": (UNIT_MGM3, 0.001),
+    "μg/m³": (UNIT_MGM3, 0.001),
+    "g/m3": (UNIT_MGM3, 1000.0),
+    "°c": (UNIT_CELSIUS, 1.0),
+    "ºc": (UNIT_CELSIUS, 1.0),
+    "c": (UNIT_CELSIUS, 1.0),
+    "ibutg": (UNIT_CELSIUS, 1.0),
+    "m/s2": (UNIT_MS2, 1.0),
+    "m/s²": (UNIT_MS2, 1.0),
+}
+
+NUMBER_RE = re.compile(r"[-+]?\d+(?:[.,]\d+)*")
+
+
+def _fold(text) -> str:
+    if not text:
+        return ""
+    folded = unicodedata.normalize("NFKD", str(text))
+    return "".join(ch for ch in folded if not unicodedata.combining(ch)).strip().lower()
+
+
+def parse_number(text):
+    """'87,5 dB(A)' → 87.5 ; '1.234,5' → 1234.5 ; sem número → nan"""
+    if text is None:
+        return np.nan
+
+    match = NUMBER_RE.search(str(text))
+    if not match:
+        return np.nan
+
+    raw = match.group(0)
+
+    if "," in raw:
+        raw = raw.replace(".", "").replace(",", ".")
+
+    try:
+        return float(raw)
+    except ValueError:
+        return np.nan
+
+
+def parse_unit(unidade, intensidade=None):
+    """Unidade explícita ou, na falta dela, o sufixo do texto da intensidade."""
+    text = str(unidade or "").strip().lower().replace(" ", "")
+
+    if not text and intensidade:
+        text = NUMBER_RE.sub("", str(intensidade)).strip().lower().replace(" ", "")
+
+    return UNIT_ALIASES.get(text, (UNIT_NONE, 1.0))
+
+
+def classify_agent(agente):
+    name = _fold(agente)
+
+    for keyword, rule in AGENT_RULES:
+        if keyword in name:
+            return rule
+
+    return UNRECOGNIZED_AGENT
+
+
+def _map_distinct(values, fn, n_out):
+    """Aplica fn uma vez por valor distinto e devolve n_out arrays por linha."""
+    # fatoração por dict: mais rápida que ordenar um array de objetos
+    index = {}
+    codes = np.fromiter(
+        (index.setdefault(v, len(index)) for v in values),
+        dtype=np.intp,
+        count=len(values),
+    )
+    results = [fn(v) for v in index]
+    columns = list(zip(*results)) if results else [()] * n_out
+    return [np.asarray(col)[codes] for col in columns]
+
+
+def _is_yes(values):
+    (yes,) = _map_distinct(values, lambda v: (_fold(v) in ("sim", "s", "true", "1", "yes"),), 1)
+    return yes.astype(bool)
+
+
+def classify_batch(agente, intensidade, unidade, jornada, dias_semana, epi_eficaz):
+    """
+    Recebe colunas (sequências do mesmo tamanho) e devolve um dict de
+    arrays: valor, unidade, tipo, exposicao, limite, dose, excede,
+    anos, enquadramento.
+    """
+    n = len(agente)
+
+    if n == 0:
+        empty = np.array([], dtype=object)
+        return {k: empty for k in (
+            "valor", "unidade", "tipo", "exposicao", "limite",
+            "dose", "excede", "anos", "enquadramento",
+        )}
+
+    kind, limit, limit_unit, years = _map_distinct(agente, classify_agent, 4)
+    kind = kind.astype(np.int8)
+    limit = limit.astype(float)
+    limit_unit = limit_unit.astype(np.int8)
+    years = years.astype(np.int16)
+
+    (raw_value,) = _map_distinct(intensidade, lambda v: (parse_number(v),), 1)
+    raw_value = raw_value.astype(float)
+
+    unit, factor = _map_distinct(list(zip(unidade, intensidade)), lambda p: parse_unit(*p), 2)
+    unit = unit.astype(np.int8)
+    value = raw_value * factor.astype(float)
+
+    # unidade ausente: assume a unidade do limite do agente
+    unit = np.where(unit == UNIT_NONE, limit_unit, unit)
+
+    hours = np.array([np.nan if h is None else h for h in jornada], dtype=float)
+    hours = np.where(np.isnan(hours) | (hours <= 0), JORNADA_PADRAO, hours)
+    days = np.array([np.nan if d is None else d for d in dias_semana], dtype=float)
+    days = np.where(np.isnan(days) | (days <= 0), DIAS_SEMANA_PADRAO, days)
+
+    # tempo de exposição diário equivalente (semana de 5 dias)
+    te = hours * days / DIAS_SEMANA_PADRAO
+
+    exposure = np.full(n, np.nan)
+    dose = np.full(n, np.nan)
+    exceeds = np.zeros(n, dtype=bool)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # ruído — NHO-01 (q = 3)
+        is_noise = (kind == NOISE) & (unit == UNIT_DBA) & ~np.isnan(value)
+        nen = value + 10.0 * np.log10(te / 8.0)
+        allowed_hours = 8.0 / np.power(2.0, (value - NOISE_LIMIT_DBA) / 3.0)
+        exposure = np.where(is_noise, nen, exposure)
+        dose = np.where(is_noise, 100.0 * te / allowed_hours, dose)
+        exceeds |= is_noise & (nen > NOISE_LIMIT_DBA)
+
+        # químicos quantitativos — limite corrigido para jornadas > 8h
+        is_chem = (kind == CHEMICAL) & (unit == limit_unit) & ~np.isnan(value)
+        adjusted = np.where(
+            hours > 8.0,
+            limit * (8.0 / hours) * ((24.0 - hours) / 16.0),
+            limit,
+        )
+        exposure = np.where(is_chem, value, exposure)
+        dose = np.where(is_chem, 100.0 * value / adjusted, dose)
+        exceeds |= is_chem & (value > adjusted)
+
+        # calor / vibração — comparação direta com o limite
+        is_direct = np.isin(kind, [HEAT, VIBRATION]) & (unit == limit_unit) & ~np.isnan(value)
+        exposure = np.where(is_direct, value, exposure)
+        dose = np.where(is_direct, 100.0 * value / limit, dose)
+        exceeds |= is_direct & (value > limit)
+
+    # qualitativos: a presença do agente basta
+    qualitative = np.isin(kind, [QUALITATIVE, QUALITATIVE_NO_EPI])
+    exceeds |= qualitative
+
+    ignores_epi = (kind == NOISE) | (kind == QUALITATIVE_NO_EPI)
+    epi = _is_yes(epi_eficaz)
+
+    qualifies = exceeds & (ignores_epi | ~epi)
+
+    labels = np.full(n, SEM_ENQUADRAMENTO, dtype=object)
+    for y, label in ENQUADRAMENTO_LABELS.items():
+        labels[qualifies & (years == y)] = label
+
+    return {
+        "valor": value,
+        "unidade": unit,
+        "tipo": kind,
+        "exposicao": exposure,
+        "limite": np.where(kind == CHEMICAL, adjusted, limit),
+        "dose": dose,
+        "excede": exceeds,
+        "anos": np.where(qualifies, years, 0),
+        "enquadramento": labels,
+    }
+
+
+def _clean(value):
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else round(float(value), 2)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    return value
+
+
+def describe_row(result, i):
+    """Detalhamento de uma linha do resultado, pronto para JSON."""
+    return {
+        "intensidade_normalizada": _clean(result["valor"][i]),
+        "unidade_normalizada": UNIT_NAMES[int(result["unidade"][i])],
+        "tipo_agente": KIND_NAMES[int(result["tipo"][i])],
+        "exposicao_normalizada": _clean(result["exposicao"][i]),
+        "limite": _clean(result["limite"][i]),
+        "dose_percentual": _clean(result["dose"][i]),
+        "excede_limite": _clean(result["excede"][i]),
+        "enquadramento": result["enquadramento"][i],
+    }
+
+
+# ============================================================
+# RECÁLCULO EM LOTE NO BANCO
+# ============================================================
+ENGINE_COLUMNS = [
+    LTCATRecord.id,
+    LTCATRecord.agente,
+    LTCATRecord.intensidade,
+    LTCATRecord.unidade,
+    LTCATRecord.jornada,
+    LTCATRecord.dias_semana,
+    LTCATRecord.epi_eficaz,
+    LTCATRecord.enquadramento,
+]
+
+UPDATE_CHUNK_SIZE = 5000
+
+
+def classify_query(query):
+    """
+    Lê só as colunas do motor (uma query) e classifica tudo de uma vez.
+    Devolve (ids, enquadramento atual, resultado).
+    """
+    rows = query.with_entities(*ENGINE_COLUMNS).order_by(None).all()
+
+    if not rows:
+        return np.array([], dtype=np.int64), np.array([], dtype=object), classify_batch([], [], [], [], [], [])
+
+    ids, agente, intensidade, unidade, jornada, dias, epi, atual = zip(*rows)
+
+    result = classify_batch(agente, intensidade, unidade, jornada, dias, epi)
+
+    return np.asarray(ids, dtype=np.int64), np.asarray(atual, dtype=object), result
+
+
+def recompute_enquadramento(db, query, dry_run: bool = False, sample_size: int = 50):
+    """
+    Recalcula o enquadramento dos registros da query. Grava só o que
+    mudou, com um UPDATE ... WHERE id IN (...) por rótulo e bloco.
+    Registros com agente não classificado ficam como estão. Não faz
+    commit.
+    """
+    ids, atual, result = classify_query(query)
+    novo = result["enquadramento"]
+    classified = result["tipo"] != GENERIC
+
+    changed = classified & (atual != novo)
+    changed_idx = np.flatnonzero(changed)
+
+    labels, counts = np.unique(novo[classified], return_counts=True)
+
+    summary = {
+        "total": int(len(ids)),
+        "alterados": int(len(changed_idx)),
+        "nao_classificados": int(np.count_nonzero(~classified)),
+        "por_enquadramento": {str(k): int(v) for k, v in zip(labels, counts)},
+        "dry_run": dry_run,
+    }
+
+    if dry_run:
+        summary["amostra"] = [
+            {"id": int(ids[i]), "enquadramento_atual": atual[i], **describe_row(result, i)}
+            for i in changed_idx[:sample_size]
+        ]
+        return summary
+
+    table = LTCATRecord.__table__
+
+    for label in np.unique(novo[changed_idx]):
+        target = ids[changed_idx[novo[changed_idx] == label]].tolist()
+
+        for start in range(0, len(target), UPDATE_CHUNK_SIZE):
+            chunk = target[start:start + UPDATE_CHUNK_SIZE]
+            db.execute(
+                update(table)
+                .where(table.c.id.in_(chunk))
+                .values(
+                    enquadramento=str(label),
+                    version=table.c.version + 1,
+                    updated_at=datetime.utcnow(),
+                )
+            )
+            log_changes(db, LTCATRecord, LTCATRecord.id.in_(chunk))
+
+    return summary
@@ -0,0 +1,32 @@
+-- ============================================================
+-- PGR: company_id desnormalizado em hazards / risks / actions
+-- Permite autorizar qualquer nó da árvore com um único JOIN
+-- em companies.owner_id, sem subir a cadeia de pais.
+-- ============================================================
+
+ALTER TABLE hazards ADD COLUMN IF NOT EXISTS company_id INTEGER REFERENCES companies(id);
+ALTER TABLE risks   ADD COLUMN IF NOT EXISTS company_id INTEGER REFERENCES companies(id);
+ALTER TABLE actions ADD COLUMN IF NOT EXISTS company_id INTEGER REFERENCES companies(id);
+
+-- Backfill (ordem importa: cada nível copia do pai)
+UPDATE hazards h
+SET company_id = s.company_id
+FROM sectors s
+WHERE s.id = h.sector_id
+  AND h.company_id IS DISTINCT FROM s.company_id;
+
+UPDATE risks r
+SET company_id = h.company_id
+FROM hazards h
+WHERE h.id = r.hazard_id
+  AND r.company_id IS DISTINCT FROM h.company_id;
+
+UPDATE actions a
+SET company_id = r.company_id
+FROM risks r
+WHERE r.id = a.risk_id
+  AND a.company_id IS DISTINCT FROM r.company_id;
+
+CREATE INDEX IF NOT EXISTS ix_hazards_company_id ON hazards (company_id);
+CREATE INDEX IF NOT EXISTS ix_risks_company_id   ON risks (company_id);
+CREATE INDEX IF NOT EXISTS ix_actions_company_id ON actions (company_id);
@@ -0,0 +1,16 @@
+-- ============================================================
+-- Índices compostos para paginação por cursor (keyset)
+-- Cada índice cobre o filtro de escopo + a chave de ordenação
+-- usada pelo endpoint de listagem correspondente.
+-- ============================================================
+
+CREATE INDEX IF NOT EXISTS ix_companies_owner_id_id ON companies (owner_id, id);
+CREATE INDEX IF NOT EXISTS ix_sectors_company_id_id ON sectors (company_id, id);
+CREATE INDEX IF NOT EXISTS ix_hazards_sector_id_id  ON hazards (sector_id, id);
+CREATE INDEX IF NOT EXISTS ix_risks_hazard_id_id    ON risks (hazard_id, id);
+CREATE INDEX IF NOT EXISTS ix_actions_risk_id_id    ON actions (risk_id, id);
+
+CREATE INDEX IF NOT EXISTS ix_aso_records_company_id_created_at_id ON aso_records (company_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_aso_records_created_at_id            ON aso_records (created_at, id);
+CREATE INDEX IF NOT EXISTS ix_nr17_records_company_id_id           ON nr17_records (company_id, id);
+CREATE INDEX IF NOT EXISTS ix_ltcat_records_company_id_id          ON ltcat_records (company_id, id);
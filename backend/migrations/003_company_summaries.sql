@@ -0,0 +1,79 @@
+-- ============================================================
+-- Resumo por empresa para o dashboard geral
+-- Mantido incrementalmente pelas rotas (summary.track_summary);
+-- este script cria as tabelas e faz a carga inicial.
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS company_summaries (
+    company_id       INTEGER PRIMARY KEY REFERENCES companies(id),
+    total_aso        INTEGER NOT NULL DEFAULT 0,
+    total_nr17       INTEGER NOT NULL DEFAULT 0,
+    total_ltcat      INTEGER NOT NULL DEFAULT 0,
+    nr17_score_sum   INTEGER NOT NULL DEFAULT 0,
+    nr17_score_count INTEGER NOT NULL DEFAULT 0,
+    nr17_baixo       INTEGER NOT NULL DEFAULT 0,
+    nr17_medio       INTEGER NOT NULL DEFAULT 0,
+    nr17_alto        INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS company_agent_counts (
+    company_id INTEGER NOT NULL REFERENCES companies(id),
+    agente     TEXT NOT NULL,
+    total      INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (company_id, agente)
+);
+
+CREATE INDEX IF NOT EXISTS ix_company_agent_counts_company_id_total
+    ON company_agent_counts (company_id, total);
+
+-- Carga inicial (recalcula do zero)
+TRUNCATE company_summaries, company_agent_counts;
+
+INSERT INTO company_summaries (
+    company_id, total_aso, total_nr17, total_ltcat,
+    nr17_score_sum, nr17_score_count, nr17_baixo, nr17_medio, nr17_alto
+)
+SELECT
+    c.id,
+    COALESCE(a.total, 0),
+    COALESCE(n.total, 0),
+    COALESCE(l.total, 0),
+    COALESCE(n.score_sum, 0),
+    COALESCE(n.score_count, 0),
+    COALESCE(n.baixo, 0),
+    COALESCE(n.medio, 0),
+    COALESCE(n.alto, 0)
+FROM companies c
+LEFT JOIN (
+    SELECT company_id, COUNT(*) AS total
+    FROM aso_records GROUP BY company_id
+) a ON a.company_id = c.id
+LEFT JOIN (
+    SELECT
+        company_id,
+        COUNT(*) AS total,
+        SUM(score) AS score_sum,
+        COUNT(score) AS score_count,
+        COUNT(*) FILTER (WHERE lower(risco) LIKE '%baixo%') AS baixo,
+        COUNT(*) FILTER (
+            WHERE lower(risco) NOT LIKE '%baixo%'
+              AND (lower(risco) LIKE '%médio%' OR lower(risco) LIKE '%medio%')
+        ) AS medio,
+        COUNT(*) FILTER (
+            WHERE lower(risco) NOT LIKE '%baixo%'
+              AND lower(risco) NOT LIKE '%médio%'
+              AND lower(risco) NOT LIKE '%medio%'
+              AND lower(risco) LIKE '%alto%'
+        ) AS alto
+    FROM nr17_records GROUP BY company_id
+) n ON n.company_id = c.id
+LEFT JOIN (
+    SELECT company_id, COUNT(*) AS total
+    FROM ltcat_records GROUP BY company_id
+) l ON l.company_id = c.id;
+
+INSERT INTO company_agent_counts (company_id, agente, total)
+SELECT l.company_id, COALESCE(trim(l.agente), ''), COUNT(*)
+FROM ltcat_records l
+JOIN companies c ON c.id = l.company_id
+GROUP BY l.company_id, COALESCE(trim(l.agente), '');
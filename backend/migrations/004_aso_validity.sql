@@ -0,0 +1,29 @@
+-- ============================================================
+-- Validade dos ASOs
+-- valid_until é mantido pela API (aso_validity.py). Este script
+-- cria a coluna, a tabela de periodicidade e faz a carga inicial
+-- com a regra padrão (12 meses; demissional sem validade).
+-- Depois de cadastrar regras próprias, rodar
+-- POST /api/aso/records/recompute-validity.
+-- ============================================================
+
+ALTER TABLE aso_records ADD COLUMN IF NOT EXISTS valid_until DATE;
+
+CREATE TABLE IF NOT EXISTS aso_periodicities (
+    id         SERIAL PRIMARY KEY,
+    company_id INTEGER REFERENCES companies(id),
+    funcao     TEXT,
+    tipo_exame TEXT,
+    meses      INTEGER,
+    criado_em  TIMESTAMP DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_aso_periodicities_company_id ON aso_periodicities (company_id);
+
+UPDATE aso_records
+SET valid_until = (data_exame + interval '12 months')::date
+WHERE valid_until IS NULL
+  AND lower(tipo_exame) NOT LIKE 'demiss%';
+
+CREATE INDEX IF NOT EXISTS ix_aso_records_valid_until ON aso_records (valid_until);
+CREATE INDEX IF NOT EXISTS ix_aso_records_company_id_valid_until ON aso_records (company_id, valid_until);
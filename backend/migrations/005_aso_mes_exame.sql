@@ -0,0 +1,14 @@
+-- ============================================================
+-- Chave de mês do exame (aaaamm) para a estatística mensal
+-- Gravada pela API a cada ASO (aso_stats.month_key).
+-- ============================================================
+
+ALTER TABLE aso_records ADD COLUMN IF NOT EXISTS mes_exame INTEGER;
+
+UPDATE aso_records
+SET mes_exame = EXTRACT(YEAR FROM data_exame)::int * 100 + EXTRACT(MONTH FROM data_exame)::int
+WHERE mes_exame IS NULL
+  AND data_exame IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS ix_aso_records_mes_exame ON aso_records (mes_exame);
+CREATE INDEX IF NOT EXISTS ix_aso_records_company_id_mes_exame ON aso_records (company_id, mes_exame);
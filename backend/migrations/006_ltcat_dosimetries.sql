@@ -0,0 +1,25 @@
+-- ============================================================
+-- Dosimetrias de ruído do LTCAT
+-- Só o resumo fica no banco; a série bruta é gravada em .npz no
+-- diretório DOSIMETRY_DIR (ver dosimetry.py).
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS ltcat_dosimetries (
+    id               SERIAL PRIMARY KEY,
+    record_id        INTEGER NOT NULL REFERENCES ltcat_records(id),
+    company_id       INTEGER,
+    arquivo          TEXT NOT NULL,
+    nome_original    TEXT,
+    amostras         INTEGER NOT NULL,
+    intervalo_s      DOUBLE PRECISION NOT NULL,
+    duracao_s        DOUBLE PRECISION NOT NULL,
+    fator_duplicacao DOUBLE PRECISION NOT NULL,
+    leq              DOUBLE PRECISION NOT NULL,
+    dose             DOUBLE PRECISION NOT NULL,
+    twa              DOUBLE PRECISION,
+    pico             DOUBLE PRECISION NOT NULL,
+    criado_em        TIMESTAMP DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_ltcat_dosimetries_record_id ON ltcat_dosimetries (record_id);
+CREATE INDEX IF NOT EXISTS ix_ltcat_dosimetries_company_id ON ltcat_dosimetries (company_id);
@@ -0,0 +1,8 @@
+-- ============================================================
+-- Fatores ergonômicos da NR-17
+-- Os seis fatores (1–3) ficam empacotados em um SMALLINT, 2 bits
+-- cada, na ordem: mobiliario, postura, esforco, pausas, ambiente,
+-- organizacao. Registros antigos ficam com NULL e mantêm o score.
+-- ============================================================
+
+ALTER TABLE nr17_records ADD COLUMN IF NOT EXISTS fatores SMALLINT;
@@ -0,0 +1,57 @@
+-- ============================================================
+-- Filtros e busca textual em /records (ASO, NR-17, LTCAT)
+-- B-tree compostos para os filtros estruturados e GIN pg_trgm
+-- para a busca "contém" (?q=, ILIKE '%termo%') — ver search.py.
+-- Em tabelas grandes, rodar cada CREATE INDEX com CONCURRENTLY
+-- fora de transação.
+-- ============================================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- ASO
+CREATE INDEX IF NOT EXISTS ix_aso_records_company_id_setor_created_at
+    ON aso_records (company_id, setor, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_aso_records_company_id_funcao_created_at
+    ON aso_records (company_id, funcao, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_aso_records_company_id_data_exame
+    ON aso_records (company_id, data_exame);
+
+CREATE INDEX IF NOT EXISTS ix_aso_records_nome_trgm ON aso_records USING gin (nome gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_aso_records_cpf_trgm ON aso_records USING gin (cpf gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_aso_records_funcao_trgm ON aso_records USING gin (funcao gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_aso_records_setor_trgm ON aso_records USING gin (setor gin_trgm_ops);
+
+-- NR-17
+CREATE INDEX IF NOT EXISTS ix_nr17_records_company_id_setor_id
+    ON nr17_records (company_id, setor, id);
+CREATE INDEX IF NOT EXISTS ix_nr17_records_company_id_funcao_id
+    ON nr17_records (company_id, funcao, id);
+CREATE INDEX IF NOT EXISTS ix_nr17_records_company_id_risco_id
+    ON nr17_records (company_id, risco, id);
+CREATE INDEX IF NOT EXISTS ix_nr17_records_company_id_data_avaliacao
+    ON nr17_records (company_id, data_avaliacao);
+
+CREATE INDEX IF NOT EXISTS ix_nr17_records_empresa_trgm ON nr17_records USING gin (empresa gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_nr17_records_setor_trgm ON nr17_records USING gin (setor gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_nr17_records_funcao_trgm ON nr17_records USING gin (funcao gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_nr17_records_trabalhador_trgm ON nr17_records USING gin (trabalhador gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_nr17_records_risco_trgm ON nr17_records USING gin (risco gin_trgm_ops);
+
+-- LTCAT
+CREATE INDEX IF NOT EXISTS ix_ltcat_records_company_id_setor_id
+    ON ltcat_records (company_id, setor, id);
+CREATE INDEX IF NOT EXISTS ix_ltcat_records_company_id_funcao_id
+    ON ltcat_records (company_id, funcao, id);
+CREATE INDEX IF NOT EXISTS ix_ltcat_records_company_id_enquadramento_id
+    ON ltcat_records (company_id, enquadramento, id);
+CREATE INDEX IF NOT EXISTS ix_ltcat_records_company_id_data_avaliacao
+    ON ltcat_records (company_id, data_avaliacao);
+
+CREATE INDEX IF NOT EXISTS ix_ltcat_records_empresa_trgm ON ltcat_records USING gin (empresa gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_ltcat_records_setor_trgm ON ltcat_records USING gin (setor gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_ltcat_records_funcao_trgm ON ltcat_records USING gin (funcao gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_ltcat_records_agente_trgm ON ltcat_records USING gin (agente gin_trgm_ops);
+
+ANALYZE aso_records;
+ANALYZE nr17_records;
+ANALYZE ltcat_records;
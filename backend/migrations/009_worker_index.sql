@@ -0,0 +1,25 @@
+-- ============================================================
+-- Índice de trabalhadores (/api/workers/search)
+-- Mantido pelas rotas de ASO e NR-17 (workers.py). Depois de criar
+-- a tabela, popular com POST /api/workers/reindex (admin), que usa a
+-- mesma normalização de nome / CPF da API.
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS worker_index (
+    id               SERIAL PRIMARY KEY,
+    company_id       INTEGER,
+    modulo           TEXT NOT NULL,
+    record_id        INTEGER NOT NULL,
+    cpf              TEXT,
+    nome             TEXT,
+    nome_normalizado TEXT,
+    funcao           TEXT,
+    setor            TEXT
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_worker_index_modulo_record_id
+    ON worker_index (modulo, record_id);
+CREATE INDEX IF NOT EXISTS ix_worker_index_company_id_cpf
+    ON worker_index (company_id, cpf);
+CREATE INDEX IF NOT EXISTS ix_worker_index_company_id_nome
+    ON worker_index (company_id, nome_normalizado text_pattern_ops);
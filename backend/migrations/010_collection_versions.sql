@@ -0,0 +1,29 @@
+-- ============================================================
+-- updated_at nos registros / PGR + versão por empresa e coleção
+-- collection_versions é incrementada a cada escrita da API
+-- (versions.bump_versions) e vira o ETag das listagens e dashboards.
+-- ============================================================
+
+ALTER TABLE companies     ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now();
+ALTER TABLE sectors       ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now();
+ALTER TABLE hazards       ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now();
+ALTER TABLE risks         ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now();
+ALTER TABLE actions       ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now();
+ALTER TABLE aso_records   ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now();
+ALTER TABLE nr17_records  ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now();
+ALTER TABLE ltcat_records ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT now();
+
+CREATE TABLE IF NOT EXISTS collection_versions (
+    company_id INTEGER NOT NULL,
+    collection TEXT NOT NULL,
+    version    INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP,
+    PRIMARY KEY (company_id, collection)
+);
+
+-- Carga inicial: uma linha por empresa e coleção
+INSERT INTO collection_versions (company_id, collection, version, updated_at)
+SELECT c.id, col.name, 1, now()
+FROM companies c
+CROSS JOIN (VALUES ('aso'), ('nr17'), ('ltcat'), ('pgr')) AS col(name)
+ON CONFLICT (company_id, collection) DO NOTHING;
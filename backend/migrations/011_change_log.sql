@@ -0,0 +1,33 @@
+-- ============================================================
+-- Log de mudanças para /sync/changes (ver changelog.py)
+-- Uma linha por registro (a última mudança); exclusões ficam como
+-- tombstone. O id é o cursor do cliente.
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS change_log (
+    id         BIGSERIAL PRIMARY KEY,
+    entity     TEXT NOT NULL,
+    record_id  INTEGER NOT NULL,
+    company_id INTEGER,
+    op         TEXT NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_change_log_entity_record_id ON change_log (entity, record_id);
+CREATE INDEX IF NOT EXISTS ix_change_log_company_id_id ON change_log (company_id, id);
+
+-- Carga inicial: todo registro existente entra como upsert, para o
+-- primeiro sync (since=0) trazer a base completa. Só roda com o log vazio.
+INSERT INTO change_log (entity, record_id, company_id, op)
+SELECT entity, record_id, company_id, 'upsert'
+FROM (
+              SELECT 'companies' AS entity, id AS record_id, id AS company_id FROM companies
+    UNION ALL SELECT 'sectors', id, company_id FROM sectors
+    UNION ALL SELECT 'hazards', id, company_id FROM hazards
+    UNION ALL SELECT 'risks',   id, company_id FROM risks
+    UNION ALL SELECT 'actions', id, company_id FROM actions
+    UNION ALL SELECT 'aso',     id, company_id FROM aso_records
+    UNION ALL SELECT 'nr17',    id, company_id FROM nr17_records
+    UNION ALL SELECT 'ltcat',   id, company_id FROM ltcat_records
+) AS seed
+WHERE NOT EXISTS (SELECT 1 FROM change_log);
@@ -0,0 +1,18 @@
+-- ============================================================
+-- Chaves de idempotência do /sync/push (fila offline)
+-- Uma linha por item aplicado; reenvios com a mesma chave não gravam
+-- de novo. Linhas com mais de IDEMPOTENCY_TTL_DAYS são apagadas pela
+-- própria rota.
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    user_id         INTEGER NOT NULL,
+    idempotency_key VARCHAR(100) NOT NULL,
+    modulo          TEXT NOT NULL,
+    op              TEXT NOT NULL,
+    record_id       INTEGER,
+    criado_em       TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_id, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS ix_idempotency_keys_criado_em ON idempotency_keys (criado_em);
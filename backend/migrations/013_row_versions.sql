@@ -0,0 +1,14 @@
+-- ============================================================
+-- Versão por linha (concorrência otimista)
+-- PUT vira UPDATE ... WHERE id = :id AND version = :v RETURNING *,
+-- com version = version + 1 (writes.update_returning). Quem salva com
+-- uma versão velha recebe 409 em vez de sobrescrever a edição do outro.
+-- ============================================================
+
+ALTER TABLE companies     ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE sectors       ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE hazards       ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE risks         ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE actions       ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE nr17_records  ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE ltcat_records ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
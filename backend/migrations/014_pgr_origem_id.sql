@@ -0,0 +1,9 @@
+-- ============================================================
+-- Clonagem de inventário PGR (POST /pgr/companies/{src}/clone-to/{dst})
+-- origem_id guarda o id do nó copiado; o nível de baixo acha o novo
+-- pai por ele, tudo em INSERT ... SELECT (pgr_clone.py).
+-- ============================================================
+
+ALTER TABLE sectors ADD COLUMN IF NOT EXISTS origem_id INTEGER;
+ALTER TABLE hazards ADD COLUMN IF NOT EXISTS origem_id INTEGER;
+ALTER TABLE risks   ADD COLUMN IF NOT EXISTS origem_id INTEGER;
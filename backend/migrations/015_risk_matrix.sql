@@ -0,0 +1,22 @@
+-- ============================================================
+-- Matriz de risco persistida (GET /pgr/companies/{id}/risk-matrix)
+-- score e nivel são colunas geradas: o banco recalcula a cada escrita.
+-- Faixas iguais a models.RISK_LEVELS.
+-- ============================================================
+
+ALTER TABLE risks ADD COLUMN IF NOT EXISTS score INTEGER
+    GENERATED ALWAYS AS (probabilidade * severidade) STORED;
+
+ALTER TABLE risks ADD COLUMN IF NOT EXISTS nivel TEXT
+    GENERATED ALWAYS AS (
+        CASE
+            WHEN probabilidade IS NULL OR severidade IS NULL THEN NULL
+            WHEN probabilidade * severidade <= 4  THEN 'Baixo'
+            WHEN probabilidade * severidade <= 9  THEN 'Médio'
+            WHEN probabilidade * severidade <= 16 THEN 'Alto'
+            ELSE 'Crítico'
+        END
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS ix_risks_company_id_nivel ON risks (company_id, nivel);
+CREATE INDEX IF NOT EXISTS ix_risks_company_id_score ON risks (company_id, score);
@@ -0,0 +1,12 @@
+-- ============================================================
+-- Prazos do plano de ação (GET /pgr/actions/due)
+-- Vencidas / a vencer por empresa = faixa de prazo dentro de
+-- (company_id, status). A varredura (action_deadlines.mark_overdue)
+-- usa o mesmo índice.
+-- ============================================================
+
+CREATE INDEX IF NOT EXISTS ix_actions_company_id_status_prazo
+    ON actions (company_id, status, prazo);
+
+CREATE INDEX IF NOT EXISTS ix_pgr_records_company_id_status_prazo
+    ON pgr_records (company_id, status, prazo);
@@ -0,0 +1,13 @@
+-- ============================================================
+-- Validade dos ASOs: periodicidade por risco e último exame
+-- agente = regra que vale para quem trabalha em setor do PGR com
+-- esse perigo (ver aso_validity.py). O índice por CPF atende a
+-- contagem de válidos / vencidos pelo último exame de cada
+-- trabalhador. Depois de cadastrar regras por risco, rodar
+-- POST /api/aso/records/recompute-validity.
+-- ============================================================
+
+ALTER TABLE aso_periodicities ADD COLUMN IF NOT EXISTS agente TEXT;
+
+CREATE INDEX IF NOT EXISTS ix_aso_records_company_id_cpf_data_exame
+    ON aso_records (company_id, cpf, data_exame);
@@ -0,0 +1,21 @@
+-- ============================================================
+-- Cursor do /sync/changes numerado no commit (ver changelog.py)
+-- seq é preenchido antes do commit, sob advisory lock, com a
+-- sequence change_log_seq: cresce na ordem em que as transações
+-- terminam. As entradas já gravadas estão todas commitadas e ficam
+-- com seq = id, então os cursores que os clientes já guardaram
+-- continuam valendo.
+-- ============================================================
+
+ALTER TABLE change_log ADD COLUMN IF NOT EXISTS seq BIGINT;
+
+CREATE SEQUENCE IF NOT EXISTS change_log_seq;
+
+UPDATE change_log SET seq = id WHERE seq IS NULL;
+
+SELECT setval('change_log_seq', GREATEST((SELECT max(seq) FROM change_log), 1));
+
+CREATE INDEX IF NOT EXISTS ix_change_log_company_id_seq ON change_log (company_id, seq);
+CREATE INDEX IF NOT EXISTS ix_change_log_seq ON change_log (seq);
+
+DROP INDEX IF EXISTS ix_change_log_company_id_id;
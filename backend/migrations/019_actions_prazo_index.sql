@@ -0,0 +1,17 @@
+-- ============================================================
+-- Prazos do plano de ação: índice por (company_id, prazo)
+-- Com status na segunda coluna, o filtro "não concluída" (NOT LIKE /
+-- IS NULL) não delimita a faixa de prazo em (company_id, status,
+-- prazo). Vencidas / a vencer passam a ser uma faixa de prazo por
+-- empresa; o status é filtrado sobre essa faixa.
+-- ============================================================
+
+CREATE INDEX IF NOT EXISTS ix_actions_company_id_prazo
+    ON actions (company_id, prazo);
+
+CREATE INDEX IF NOT EXISTS ix_pgr_records_company_id_prazo
+    ON pgr_records (company_id, prazo);
+
+DROP INDEX IF EXISTS ix_actions_company_id_status_prazo;
+
+DROP INDEX IF EXISTS ix_pgr_records_company_id_status_prazo;
@@ -1,6 +1,6 @@
 from sqlalchemy import (
-    Column, Integer, String, Boolean, DateTime,
-    Text, ForeignKey, Date, Float
+    Column, Integer, SmallInteger, BigInteger, String, Boolean, DateTime,
+    Text, ForeignKey, Date, Float, Index, Computed
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -27,6 +27,9 @@ class User(Base):
 
 class Company(Base):
     __tablename__ = "companies"
+    __table_args__ = (
+        Index("ix_companies_owner_id_id", "owner_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -37,65 +40,135 @@ class Company(Base):
     atividade = Column(String)
     grau_risco = Column(Integer)
     criado_em = Column(DateTime, default=datetime.utcnow)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     sectors = relationship("Sector", back_populates="company")
 
 
 class Sector(Base):
     __tablename__ = "sectors"
+    __table_args__ = (
+        Index("ix_sectors_company_id_id", "company_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     company_id = Column(Integer, ForeignKey("companies.id"))
     nome = Column(String, nullable=False)
     descricao = Column(Text)
 
+    # nó de onde este foi clonado (pgr_clone)
+    origem_id = Column(Integer)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
     company = relationship("Company", back_populates="sectors")
     hazards = relationship("Hazard", back_populates="sector")
 
 
 class Hazard(Base):
     __tablename__ = "hazards"
+    __table_args__ = (
+        Index("ix_hazards_sector_id_id", "sector_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     sector_id = Column(Integer, ForeignKey("sectors.id"))
+    company_id = Column(Integer, ForeignKey("companies.id"), index=True)
     nome = Column(String, nullable=False)
     agente = Column(String)
     fonte = Column(String)
     descricao = Column(Text)
 
+    # nó de onde este foi clonado (pgr_clone)
+    origem_id = Column(Integer)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
     sector = relationship("Sector", back_populates="hazards")
     risks = relationship("Risk", back_populates="hazard")
 
 
+# Matriz de risco 5×5 (NR-01): score = probabilidade × severidade,
+# nível pela faixa do score. Colunas geradas pelo banco: valem para
+# qualquer escrita (API, lote, clonagem, SQL direto).
+RISK_LEVELS = [(4, "Baixo"), (9, "Médio"), (16, "Alto")]
+RISK_LEVEL_MAX = "Crítico"
+
+RISK_SCORE_SQL = "probabilidade * severidade"
+RISK_LEVEL_SQL = (
+    "CASE WHEN probabilidade IS NULL OR severidade IS NULL THEN NULL "
+    + " ".join(
+        f"WHEN probabilidade * severidade <= {limit} THEN '{label}'"
+        for limit, label in RISK_LEVELS
+    )
+    + f" ELSE '{RISK_LEVEL_MAX}' END"
+)
+
+
 class Risk(Base):
     __tablename__ = "risks"
+    __table_args__ = (
+        Index("ix_risks_hazard_id_id", "hazard_id", "id"),
+        Index("ix_risks_company_id_nivel", "company_id", "nivel"),
+        Index("ix_risks_company_id_score", "company_id", "score"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     hazard_id = Column(Integer, ForeignKey("hazards.id"))
+    company_id = Column(Integer, ForeignKey("companies.id"), index=True)
     probabilidade = Column(Integer)
     severidade = Column(Integer)
     medidas_existentes = Column(Text)
 
+    score = Column(Integer, Computed(RISK_SCORE_SQL, persisted=True))
+    nivel = Column(String, Computed(RISK_LEVEL_SQL, persisted=True))
+
+    # nó de onde este foi clonado (pgr_clone)
+    origem_id = Column(Integer)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
     hazard = relationship("Hazard", back_populates="risks")
     actions = relationship("Action", back_populates="risk")
 
 
 class Action(Base):
     __tablename__ = "actions"
+    __table_args__ = (
+        Index("ix_actions_risk_id_id", "risk_id", "id"),
+        # plano de ação: vencidas / a vencer por empresa (action_deadlines)
+        Index("ix_actions_company_id_prazo", "company_id", "prazo"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     risk_id = Column(Integer, ForeignKey("risks.id"))
+    company_id = Column(Integer, ForeignKey("companies.id"), index=True)
     recomendacao = Column(Text)
     tipo = Column(String)
     prazo = Column(Date)
     responsavel = Column(String)
     status = Column(String, default="pendente")
 
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
     risk = relationship("Risk", back_populates="actions")
 
 
 class AsoRecord(Base):
     __tablename__ = "aso_records"
+    __table_args__ = (
+        Index("ix_aso_records_company_id_created_at_id", "company_id", "created_at", "id"),
+        Index("ix_aso_records_created_at_id", "created_at", "id"),
+        Index("ix_aso_records_company_id_valid_until", "company_id", "valid_until"),
+        Index("ix_aso_records_company_id_mes_exame", "company_id", "mes_exame"),
+        Index("ix_aso_records_company_id_setor_created_at", "company_id", "setor", "created_at", "id"),
+        Index("ix_aso_records_company_id_funcao_created_at", "company_id", "funcao", "created_at", "id"),
+        Index("ix_aso_records_company_id_data_exame", "company_id", "data_exame"),
+        # último exame de cada trabalhador (aso_status_counts)
+        Index("ix_aso_records_company_id_cpf_data_exame", "company_id", "cpf", "data_exame"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -109,13 +182,45 @@ class AsoRecord(Base):
 
     tipo_exame = Column(String, nullable=False)
     data_exame = Column(Date, nullable=False)
+    mes_exame = Column(Integer, nullable=True, index=True)  # aaaamm, ver aso_stats
 
     medico = Column(String)
     resultado = Column(String, nullable=False)
 
+    # calculado por aso_validity a partir da tabela de periodicidade
+    valid_until = Column(Date, nullable=True, index=True)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class AsoPeriodicity(Base):
+    """
+    Periodicidade dos exames (em meses) por empresa / função / tipo,
+    ou por risco (agente). company_id, funcao ou tipo_exame NULL = vale
+    para todos. meses NULL = exame sem validade.
+    """
+    __tablename__ = "aso_periodicities"
+
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=True, index=True)
+
+    funcao = Column(String, nullable=True)
+    tipo_exame = Column(String, nullable=True)
+    agente = Column(String, nullable=True)  # perigo / agente do PGR
+    meses = Column(Integer, nullable=True)
+
+    criado_em = Column(DateTime, default=datetime.utcnow)
+
 
 class NR17Record(Base):
     __tablename__ = "nr17_records"
+    __table_args__ = (
+        Index("ix_nr17_records_company_id_id", "company_id", "id"),
+        Index("ix_nr17_records_company_id_setor_id", "company_id", "setor", "id"),
+        Index("ix_nr17_records_company_id_funcao_id", "company_id", "funcao", "id"),
+        Index("ix_nr17_records_company_id_risco_id", "company_id", "risco", "id"),
+        Index("ix_nr17_records_company_id_data_avaliacao", "company_id", "data_avaliacao"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -132,11 +237,24 @@ class NR17Record(Base):
     risco = Column(String)
     score = Column(Integer)
 
+    # seis fatores ergonômicos (1–3), 2 bits cada (ver nr17_router.py)
+    fatores = Column(SmallInteger, nullable=True)
+
     observacoes = Column(Text)
 
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 
 class LTCATRecord(Base):
     __tablename__ = "ltcat_records"
+    __table_args__ = (
+        Index("ix_ltcat_records_company_id_id", "company_id", "id"),
+        Index("ix_ltcat_records_company_id_setor_id", "company_id", "setor", "id"),
+        Index("ix_ltcat_records_company_id_funcao_id", "company_id", "funcao", "id"),
+        Index("ix_ltcat_records_company_id_enquadramento_id", "company_id", "enquadramento", "id"),
+        Index("ix_ltcat_records_company_id_data_avaliacao", "company_id", "data_avaliacao"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
 
@@ -167,9 +285,42 @@ class LTCATRecord(Base):
     responsavel = Column(String, nullable=True)
     observacoes = Column(Text, nullable=True)
 
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class LTCATDosimetry(Base):
+    """
+    Resumo de uma dosimetria de ruído anexada a um registro LTCAT.
+    A série bruta fica em arquivo .npz (ver dosimetry.py).
+    """
+    __tablename__ = "ltcat_dosimetries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    record_id = Column(Integer, ForeignKey("ltcat_records.id"), nullable=False, index=True)
+    company_id = Column(Integer, nullable=True, index=True)
+
+    arquivo = Column(String, nullable=False)
+    nome_original = Column(String, nullable=True)
+
+    amostras = Column(Integer, nullable=False)
+    intervalo_s = Column(Float, nullable=False)
+    duracao_s = Column(Float, nullable=False)
+    fator_duplicacao = Column(Float, nullable=False)
+
+    leq = Column(Float, nullable=False)
+    dose = Column(Float, nullable=False)
+    twa = Column(Float, nullable=True)
+    pico = Column(Float, nullable=False)
+
+    criado_em = Column(DateTime, default=datetime.utcnow)
+
 
 class PGRRecord(Base):
     __tablename__ = "pgr_records"
+    __table_args__ = (
+        Index("ix_pgr_records_company_id_prazo", "company_id", "prazo"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -193,3 +344,122 @@ class PGRRecord(Base):
     prazo = Column(Date, nullable=True)
     responsavel = Column(String, nullable=True)
     status = Column(String, nullable=True)
+
+
+class WorkerIndex(Base):
+    """
+    Índice de trabalhadores: uma linha por registro de ASO / NR-17,
+    com CPF só com dígitos e nome sem acento em minúsculas
+    (ver workers.py). Mantido pelas rotas de escrita.
+    """
+    __tablename__ = "worker_index"
+    __table_args__ = (
+        Index("ux_worker_index_modulo_record_id", "modulo", "record_id", unique=True),
+        Index("ix_worker_index_company_id_cpf", "company_id", "cpf"),
+        Index(
+            "ix_worker_index_company_id_nome",
+            "company_id", "nome_normalizado",
+            postgresql_ops={"nome_normalizado": "text_pattern_ops"},
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, nullable=True)
+
+    modulo = Column(String, nullable=False)  # "aso" | "nr17"
+    record_id = Column(Integer, nullable=False)
+
+    cpf = Column(String, nullable=True)
+    nome = Column(String, nullable=True)
+    nome_normalizado = Column(String, nullable=True)
+
+    funcao = Column(String, nullable=True)
+    setor = Column(String, nullable=True)
+
+
+class CollectionVersion(Base):
+    """
+    Versão de cada coleção (aso, nr17, ltcat, pgr) por empresa,
+    incrementada a cada escrita. Base dos ETags (ver versions.py).
+    """
+    __tablename__ = "collection_versions"
+
+    company_id = Column(Integer, primary_key=True)
+    collection = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, nullable=True)
+
+
+class ChangeLog(Base):
+    """
+    Log compacto de mudanças para /sync/changes: só a última mudança
+    de cada registro em cada empresa fica; exclusões ficam como
+    tombstone (op = "delete"). O cursor é seq, numerado no commit
+    (NULL enquanto a transação não termina). Ver changelog.py.
+    """
+    __tablename__ = "change_log"
+    __table_args__ = (
+        Index("ix_change_log_entity_record_id", "entity", "record_id"),
+        Index("ix_change_log_company_id_seq", "company_id", "seq"),
+        Index("ix_change_log_seq", "seq"),
+        # SQLite reaproveitaria o maior id depois da compactação:
+        # o cursor (seq = id no SQLite) precisa ser sempre crescente
+        {"sqlite_autoincrement": True},
+    )
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)  # "aso" | "nr17" | "ltcat" | "sectors" ...
+    record_id = Column(Integer, nullable=False)
+    company_id = Column(Integer, nullable=True)
+    op = Column(String, nullable=False)  # "upsert" | "delete"
+    changed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    seq = Column(BigInteger, nullable=True)
+
+
+class IdempotencyKey(Base):
+    """
+    Chaves já aplicadas pelo /sync/push (por usuário). Reenviar um item
+    com a mesma chave não grava de novo: devolve o registro original.
+    """
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        Index("ix_idempotency_keys_criado_em", "criado_em"),
+    )
+
+    user_id = Column(Integer, primary_key=True)
+    idempotency_key = Column(String(100), primary_key=True)
+
+    modulo = Column(String, nullable=False)  # "nr17" | "ltcat"
+    op = Column(String, nullable=False)      # "create" | "update" | "delete"
+    record_id = Column(Integer, nullable=True)
+    criado_em = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class CompanySummary(Base):
+    """Contadores por empresa mantidos a cada escrita (ver summary.py)."""
+    __tablename__ = "company_summaries"
+
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+
+    total_aso = Column(Integer, nullable=False, default=0, server_default="0")
+    total_nr17 = Column(Integer, nullable=False, default=0, server_default="0")
+    total_ltcat = Column(Integer, nullable=False, default=0, server_default="0")
+
+    nr17_score_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    nr17_score_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    nr17_baixo = Column(Integer, nullable=False, default=0, server_default="0")
+    nr17_medio = Column(Integer, nullable=False, default=0, server_default="0")
+    nr17_alto = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class CompanyAgentCount(Base):
+    """Frequência de agentes nocivos (LTCAT) por empresa."""
+    __tablename__ = "company_agent_counts"
+    __table_args__ = (
+        Index("ix_company_agent_counts_company_id_total", "company_id", "total"),
+    )
+
+    company_id = Column(Integer, ForeignKey("companies.id"), primary_key=True)
+    agente = Column(String, primary_key=True)
+    total = Column(Integer, nullable=False, default=0, server_default="0")
@@ -0,0 +1,93 @@
+import base64
+import json
+from datetime import date, datetime
+from typing import Optional
+
+from fastapi import HTTPException, Query
+from sqlalchemy import tuple_
+
+
+# ============================================================
+# PAGINAÇÃO POR CURSOR (keyset)
+# ============================================================
+# Em vez de OFFSET, cada página continua a partir da chave de
+# ordenação do último item da página anterior. Com um índice
+# composto (company_id, <colunas de ordenação>) a página N custa
+# o mesmo que a página 1.
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def page_params(
+    after: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    return {"after": after, "limit": limit}
+
+
+def _to_json(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _from_json(value, column):
+    if value is None:
+        return None
+
+    python_type = column.type.python_type
+
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+
+    return python_type(value)
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps([_to_json(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor com tamanho inválido")
+
+        return [_from_json(v, c) for v, c in zip(values, columns)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+
+
+def keyset_page(query, columns, after: Optional[str], limit: int, descending: bool = False):
+    """
+    Aplica ordenação + filtro de cursor e devolve
+    {"items": [...], "next_cursor": str | None}.
+
+    `columns` são as colunas da chave de ordenação; a última deve ser
+    única (normalmente o id) para o cursor ser determinístico.
+    """
+    key = columns[0] if len(columns) == 1 else tuple_(*columns)
+
+    if after:
+        values = decode_cursor(after, columns)
+        bound = values[0] if len(columns) == 1 else tuple_(*values)
+        query = query.filter(key < bound if descending else key > bound)
+
+    order_by = [c.desc() if descending else c.asc() for c in columns]
+
+    rows = query.order_by(*order_by).limit(limit + 1).all()
+
+    next_cursor = None
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in columns])
+
+    return {"items": rows, "next_cursor": next_cursor}
@@ -0,0 +1,103 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, insert, literal, select
+from sqlalchemy.orm import Session, aliased
+
+from models import Sector, Hazard, Risk, Action
+from changelog import log_changes
+
+
+# ============================================================
+# CLONAGEM DE INVENTÁRIO PGR ENTRE EMPRESAS
+# ============================================================
+# Copia Setor → Perigo → Risco → Ação de uma empresa para outra só com
+# INSERT ... SELECT, um por nível; nenhuma linha passa pelo Python.
+#
+# Mapeamento de ids: cada nó copiado guarda em origem_id o id do nó de
+# origem, e o INSERT devolve (RETURNING) os ids criados. O nível de
+# baixo acha o novo pai pelo JOIN
+#   novo_pai.origem_id = filho.<fk do pai>  AND  novo_pai.id IN (criados)
+# Só os ids desta cópia entram no JOIN: clones anteriores ou
+# simultâneos para a mesma empresa (ou da mesma origem) não casam. Os
+# ids de pai vão em blocos de CLONE_CHUNK_SIZE (limite de parâmetros).
+
+CLONE_LEVELS = [
+    (Sector, None, None),
+    (Hazard, Sector, "sector_id"),
+    (Risk, Hazard, "hazard_id"),
+    (Action, Risk, "risk_id"),
+]
+
+CLONE_CHUNK_SIZE = 5000
+
+_NOT_COPIED = {"id", "company_id", "origem_id", "version", "updated_at"}
+
+# prazo e status do plano de ação são do cliente de origem
+_RESET = {
+    Action: {"status": "pendente", "prazo": None},
+}
+
+
+def _chunks(ids):
+    for start in range(0, len(ids), CLONE_CHUNK_SIZE):
+        yield ids[start:start + CLONE_CHUNK_SIZE]
+
+
+def clone_tree(db: Session, src_company_id: int, dst_company_id: int, sector_ids=None):
+    """
+    Clona a árvore (ou só os setores em sector_ids) de src para dst.
+    Não faz commit. Devolve quantos nós foram criados por nível.
+    """
+    now = literal(datetime.utcnow(), DateTime())
+    created = {}
+    parent_ids = None
+
+    for model, parent_model, parent_key in CLONE_LEVELS:
+        table = model.__table__
+        reset = _RESET.get(model, {})
+        copied = [
+            c for c in table.c
+            if c.name not in _NOT_COPIED and c.name != parent_key and c.computed is None
+        ]
+
+        columns = [c.name for c in copied] + ["company_id", "version", "updated_at"]
+        values = [
+            literal(reset[c.name], c.type) if c.name in reset else c
+            for c in copied
+        ] + [literal(dst_company_id), literal(1), now]
+
+        if "origem_id" in table.c:
+            columns.append("origem_id")
+            values.append(table.c.id)
+
+        query = select(*values).where(table.c.company_id == src_company_id)
+
+        if parent_model is None:
+            if sector_ids is not None:
+                query = query.where(table.c.id.in_(sorted(sector_ids)))
+            queries = [query]
+        else:
+            new_parent = aliased(parent_model)
+            columns.append(parent_key)
+            query = query.add_columns(new_parent.id).join(
+                new_parent, new_parent.origem_id == table.c[parent_key]
+            )
+            queries = [query.where(new_parent.id.in_(chunk)) for chunk in _chunks(parent_ids)]
+
+        ids = []
+        for level_query in queries:
+            ids.extend(
+                db.execute(
+                    insert(table).from_select(columns, level_query).returning(table.c.id)
+                ).scalars()
+            )
+
+        created[table.name] = len(ids)
+
+        for chunk in _chunks(ids):
+            log_changes(db, model, model.id.in_(chunk))
+
+        # nível vazio: os de baixo não têm bloco nenhum e ficam em 0
+        parent_ids = ids
+
+    return created
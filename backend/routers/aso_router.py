@@ -1,14 +1,28 @@
+import csv
+import io
+from collections import Counter
 from datetime import date, datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, File, Query, Request, Response, UploadFile
+from pydantic import BaseModel, Field, ValidationError
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, insert
 
 from database import get_db
-from models import AsoRecord, User, Company
+from models import AsoRecord, AsoPeriodicity, User
 from routers.auth_router import get_current_user
+from pagination import page_params, keyset_page
+from export import ExportFormat, export_format_param, stream_export
+from search import apply_record_filters
+from workers import index_record, unindex_record, index_records_after
+from versions import bump_versions, conditional_response
+from changelog import log_changes
+from tenancy import is_admin, get_default_company_id, validate_company_access, scope_query, scope_company_ids
+from summary import summary_deltas, track_summary
+from dashboard_cache import cached_dashboard, invalidate_dashboards, invalidate_all_dashboards
+from aso_validity import load_rules, recompute_valid_until, aso_status_counts, normalize_key
+from aso_stats import month_key, exames_por_mes, label_mm_yyyy
 
 router = APIRouter(
     prefix="/api/aso",
@@ -35,61 +49,35 @@ class AsoCreate(AsoBase):
 class AsoOut(AsoBase):
     id: int
     created_at: datetime
+    valid_until: Optional[date] = None
 
     class Config:
         from_attributes = True
 
 
-def is_admin(user: User):
-    return user.role == "admin"
+class AsoPage(BaseModel):
+    items: List[AsoOut]
+    next_cursor: Optional[str] = None
 
 
-def get_default_company_id(db: Session, current_user: User):
-    if is_admin(current_user):
-        return current_user.company_id
-
-    company = (
-        db.query(Company)
-        .filter(Company.owner_id == current_user.id)
-        .order_by(Company.id.desc())
-        .first()
-    )
-
-    return company.id if company else None
-
-
-def validate_company_access(db: Session, company_id: Optional[int], current_user: User):
-    if is_admin(current_user):
-        return True
+class PeriodicityIn(BaseModel):
+    company_id: Optional[int] = None
+    funcao: Optional[str] = None
+    tipo_exame: Optional[str] = None
+    # regra por risco: agente / perigo do setor no PGR (ver aso_validity)
+    agente: Optional[str] = None
+    meses: Optional[int] = Field(None, ge=1, le=120)
 
-    if not company_id:
-        return False
 
-    company = (
-        db.query(Company)
-        .filter(
-            Company.id == company_id,
-            Company.owner_id == current_user.id
-        )
-        .first()
-    )
+class PeriodicityOut(PeriodicityIn):
+    id: int
 
-    return company is not None
+    class Config:
+        from_attributes = True
 
 
 def base_query_for_user(db: Session, current_user: User):
-    query = db.query(AsoRecord)
-
-    if is_admin(current_user):
-        return query
-
-    owned_company_ids = (
-        db.query(Company.id)
-        .filter(Company.owner_id == current_user.id)
-        .subquery()
-    )
-
-    return query.filter(AsoRecord.company_id.in_(owned_company_ids))
+    return scope_query(db.query(AsoRecord), AsoRecord, current_user)
 
 
 @router.post("/records", response_model=AsoOut)
@@ -101,7 +89,7 @@ def create_aso_record(
     try:
         data = payload.dict()
 
-        company_id = data.get("company_id") or get_default_company_id(db, current_user)
+        company_id = data.get("company_id") or get_default_company_id(current_user)
 
         if not company_id:
             raise HTTPException(
@@ -116,13 +104,23 @@ def create_aso_record(
             )
 
         data["company_id"] = company_id
+        data["mes_exame"] = month_key(data["data_exame"])
+        data["valid_until"] = load_rules(db, [company_id]).valid_until(
+            company_id, data["funcao"], data["tipo_exame"], data["data_exame"], data["setor"]
+        )
 
         db_aso = AsoRecord(**data)
 
         db.add(db_aso)
+        db.flush()
+        track_summary(db, after=summary_deltas(db_aso))
+        index_record(db, "aso", db_aso)
+        bump_versions(db, "aso", [company_id])
         db.commit()
         db.refresh(db_aso)
 
+        invalidate_dashboards(db_aso.company_id)
+
         return db_aso
 
     except HTTPException:
@@ -134,15 +132,53 @@ def create_aso_record(
         raise HTTPException(status_code=500, detail="Erro ao salvar ASO no banco.")
 
 
-@router.get("/records", response_model=List[AsoOut])
+@router.get("/records", response_model=AsoPage)
 def list_aso_records(
+    request: Request,
+    response: Response,
+    page: dict = Depends(page_params),
+    setor: Optional[str] = None,
+    funcao: Optional[str] = None,
+    tipo_exame: Optional[str] = None,
+    resultado: Optional[str] = None,
+    data_de: Optional[date] = None,
+    data_ate: Optional[date] = None,
+    q: Optional[str] = Query(None, max_length=100),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    return (
-        base_query_for_user(db, current_user)
-        .order_by(AsoRecord.created_at.desc())
-        .all()
+    not_modified = conditional_response(request, response, db, ["aso"], scope_company_ids(current_user))
+    if not_modified:
+        return not_modified
+
+    query = apply_record_filters(
+        base_query_for_user(db, current_user),
+        AsoRecord,
+        equals={"setor": setor, "funcao": funcao, "tipo_exame": tipo_exame, "resultado": resultado},
+        date_column=AsoRecord.data_exame,
+        data_de=data_de,
+        data_ate=data_ate,
+        q=q,
+    )
+
+    return keyset_page(
+        query,
+        [AsoRecord.created_at, AsoRecord.id],
+        descending=True,
+        **page
+    )
+
+
+@router.get("/records/export")
+def export_aso_records(
+    fmt: ExportFormat = Depends(export_format_param),
+    current_user: User = Depends(get_current_user)
+):
+    return stream_export(
+        lambda db: base_query_for_user(db, current_user),
+        AsoRecord,
+        fmt,
+        "aso_records",
     )
 
 
@@ -165,9 +201,16 @@ def delete_aso_record(
                 detail="Registro não encontrado ou sem permissão para excluir."
             )
 
+        company_id = record.company_id
+
+        track_summary(db, before=summary_deltas(record))
+        unindex_record(db, "aso", record.id)
+        bump_versions(db, "aso", [company_id])
         db.delete(record)
         db.commit()
 
+        invalidate_dashboards(company_id)
+
         return {"msg": "Registro excluído com sucesso."}
 
     except HTTPException:
@@ -179,39 +222,353 @@ def delete_aso_record(
         raise HTTPException(status_code=500, detail="Erro ao excluir registro.")
 
 
-@router.get("/dashboard/pcmsos")
-def dashboard_pcmsos(
+# ============================================================
+# IMPORTAÇÃO EM LOTE (CSV)
+# ============================================================
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_MAX_ERRORS = 1000
+
+IMPORT_COLUMNS = [
+    "created_at", "updated_at", "company_id", "nome", "cpf", "funcao", "setor",
+    "tipo_exame", "data_exame", "mes_exame", "medico", "resultado", "valid_until",
+]
+
+
+def normalize_csv_row(row: dict):
+    data = {
+        (k or "").strip().lower(): (v.strip() if isinstance(v, str) else v)
+        for k, v in row.items()
+    }
+
+    data = {k: (v if v != "" else None) for k, v in data.items()}
+
+    # aceita data no formato brasileiro (dd/mm/aaaa)
+    data_exame = data.get("data_exame")
+    if data_exame and "/" in data_exame:
+        parts = data_exame.split("/")
+        if len(parts) == 3:
+            data["data_exame"] = f"{parts[2]}-{parts[1]}-{parts[0]}"
+
+    return data
+
+
+def copy_aso_rows(db: Session, rows: List[dict]):
+    """
+    Postgres (psycopg 3): COPY FROM STDIN.
+    Demais bancos: executemany com um único INSERT.
+    """
+    if not rows:
+        return
+
+    if db.bind.dialect.name == "postgresql":
+        cursor = db.connection().connection.cursor()
+
+        if hasattr(cursor, "copy"):
+            sql = f"COPY aso_records ({', '.join(IMPORT_COLUMNS)}) FROM STDIN"
+
+            with cursor.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(tuple(row[c] for c in IMPORT_COLUMNS))
+            return
+
+    db.execute(insert(AsoRecord.__table__), rows)
+
+
+@router.post("/records/import")
+def import_aso_records(
+    file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    query = base_query_for_user(db, current_user)
+    """
+    Importa ASOs de um CSV (cabeçalho com os campos de AsoCreate,
+    separador "," ou ";"). O arquivo é lido em streaming e validado em
+    blocos; as linhas válidas entram em uma única transação e as
+    inválidas voltam no relatório de erros.
+    """
+    default_company_id = get_default_company_id(current_user)
+    allowed_companies = {}
+    rules = load_rules(db, None if is_admin(current_user) else current_user.owned_company_ids)
+
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+
+    now = datetime.utcnow()
+    total = 0
+    imported = 0
+    errors = []
+    chunk = []
+    per_company = Counter()
+
+    # o COPY não devolve ids: o índice de trabalhadores pega tudo acima deste
+    last_id = db.query(func.max(AsoRecord.id)).scalar() or 0
 
-    format_expr = func.to_char(AsoRecord.data_exame, "MM/YYYY")
+    try:
+        header = stream.readline()
+        if not header.strip():
+            raise HTTPException(status_code=400, detail="Arquivo CSV vazio.")
+
+        delimiter = ";" if header.count(";") > header.count(",") else ","
+        fieldnames = next(csv.reader([header], delimiter=delimiter))
+        reader = csv.DictReader(stream, fieldnames=fieldnames, delimiter=delimiter)
+
+        for line_number, raw in enumerate(reader, start=2):
+            total += 1
+
+            try:
+                record = AsoCreate(**normalize_csv_row(raw)).dict()
+            except ValidationError as e:
+                if len(errors) < IMPORT_MAX_ERRORS:
+                    errors.append({
+                        "linha": line_number,
+                        "erros": [
+                            f"{'.'.join(str(p) for p in err['loc'])}: {err['msg']}"
+                            for err in e.errors()
+                        ],
+                    })
+                continue
+
+            company_id = record.get("company_id") or default_company_id
+
+            if company_id not in allowed_companies:
+                allowed_companies[company_id] = validate_company_access(db, company_id, current_user)
+
+            if not company_id or not allowed_companies[company_id]:
+                if len(errors) < IMPORT_MAX_ERRORS:
+                    errors.append({
+                        "linha": line_number,
+                        "erros": ["company_id: empresa inexistente ou sem permissão"],
+                    })
+                continue
+
+            record["company_id"] = company_id
+            record["created_at"] = now
+            record["updated_at"] = now
+            record["mes_exame"] = month_key(record["data_exame"])
+            record["valid_until"] = rules.valid_until(
+                company_id, record["funcao"], record["tipo_exame"], record["data_exame"],
+                record["setor"],
+            )
+            chunk.append(record)
+            per_company[company_id] += 1
+
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                copy_aso_rows(db, chunk)
+                imported += len(chunk)
+                chunk = []
+
+        copy_aso_rows(db, chunk)
+        imported += len(chunk)
+
+        for company_id, count in per_company.items():
+            track_summary(db, after=(company_id, {"total_aso": count}, {}))
+
+        if per_company:
+            index_records_after(db, "aso", last_id, per_company)
+            log_changes(
+                db, AsoRecord,
+                AsoRecord.id > last_id,
+                AsoRecord.company_id.in_(sorted(per_company)),
+            )
+            bump_versions(db, "aso", per_company)
+
+        db.commit()
+
+        invalidate_dashboards(*per_company)
+
+    except HTTPException:
+        raise
+
+    except UnicodeDecodeError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="O arquivo CSV deve estar em UTF-8.")
+
+    except Exception as e:
+        db.rollback()
+        print("Erro ao importar ASOs:", e)
+        raise HTTPException(status_code=500, detail="Erro ao importar ASOs no banco.")
 
-    exames_rows = (
-        query.with_entities(
-            format_expr.label("mes"),
-            func.count(AsoRecord.id).label("total"),
+    return {
+        "total_linhas": total,
+        "importados": imported,
+        "rejeitados": total - imported,
+        "erros": errors,
+    }
+
+
+# ============================================================
+# PERIODICIDADE / VALIDADE DOS ASOs
+# ============================================================
+def recompute_for_scope(db: Session, company_id: Optional[int]):
+    """Recalcula a validade na empresa da regra (ou em todas, se global)."""
+    if company_id is None:
+        updated = recompute_valid_until(db)
+        bump_versions(db, "aso")
+        db.commit()
+        invalidate_all_dashboards()
+    else:
+        updated = recompute_valid_until(db, [company_id])
+        bump_versions(db, "aso", [company_id])
+        db.commit()
+        invalidate_dashboards(company_id)
+
+    return updated
+
+
+def validate_periodicity_access(db: Session, company_id: Optional[int], current_user: User):
+    if company_id is None:
+        if not is_admin(current_user):
+            raise HTTPException(
+                status_code=403,
+                detail="Somente administrador pode alterar regras globais."
+            )
+        return
+
+    if not validate_company_access(db, company_id, current_user):
+        raise HTTPException(
+            status_code=403,
+            detail="Sem permissão para alterar regras desta empresa."
+        )
+
+
+@router.get("/periodicities", response_model=List[PeriodicityOut])
+def list_periodicities(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    query = db.query(AsoPeriodicity)
+
+    if not is_admin(current_user):
+        query = query.filter(
+            (AsoPeriodicity.company_id.is_(None))
+            | (AsoPeriodicity.company_id.in_(sorted(current_user.owned_company_ids)))
+        )
+
+    return query.order_by(AsoPeriodicity.id.asc()).all()
+
+
+@router.post("/periodicities", response_model=PeriodicityOut)
+def save_periodicity(
+    payload: PeriodicityIn,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Cria ou atualiza (mesma empresa / função / tipo / agente) uma regra
+    de periodicidade e recalcula a validade dos ASOs afetados.
+    """
+    validate_periodicity_access(db, payload.company_id, current_user)
+
+    funcao = normalize_key(payload.funcao)
+    tipo = normalize_key(payload.tipo_exame)
+    agente = normalize_key(payload.agente)
+
+    if agente and payload.meses is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Regra por risco precisa de periodicidade (meses)."
+        )
+
+    candidates = (
+        db.query(AsoPeriodicity)
+        .filter(
+            AsoPeriodicity.company_id.is_(None)
+            if payload.company_id is None
+            else AsoPeriodicity.company_id == payload.company_id
         )
-        .group_by(format_expr)
-        .order_by(format_expr)
         .all()
     )
 
-    exames_por_mes = [
-        {"mes": row.mes, "total": row.total}
-        for row in exames_rows
-    ]
+    rule = next(
+        (
+            r for r in candidates
+            if normalize_key(r.funcao) == funcao
+            and normalize_key(r.tipo_exame) == tipo
+            and normalize_key(r.agente) == agente
+        ),
+        None,
+    )
 
-    total = query.with_entities(func.count(AsoRecord.id)).scalar() or 0
+    if rule is None:
+        rule = AsoPeriodicity(**payload.dict())
+        db.add(rule)
+    else:
+        rule.meses = payload.meses
 
-    status_asos = {
-        "validos": total,
-        "vencidos": 0,
-        "a_vencer": 0,
-    }
+    db.flush()
+    db.refresh(rule)
+
+    recompute_for_scope(db, payload.company_id)
+
+    return rule
+
+
+@router.delete("/periodicities/{rule_id}", response_model=dict)
+def delete_periodicity(
+    rule_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    rule = db.query(AsoPeriodicity).filter(AsoPeriodicity.id == rule_id).first()
+
+    if not rule:
+        raise HTTPException(status_code=404, detail="Regra não encontrada.")
+
+    company_id = rule.company_id
+    validate_periodicity_access(db, company_id, current_user)
+
+    db.delete(rule)
+    db.flush()
+
+    updated = recompute_for_scope(db, company_id)
+
+    return {"msg": "Regra excluída com sucesso.", "atualizados": updated}
+
+
+@router.post("/records/recompute-validity", response_model=dict)
+def recompute_aso_validity(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if is_admin(current_user):
+        updated = recompute_valid_until(db)
+        bump_versions(db, "aso")
+        db.commit()
+        invalidate_all_dashboards()
+    else:
+        company_ids = current_user.owned_company_ids
+        updated = recompute_valid_until(db, company_ids)
+        bump_versions(db, "aso", company_ids)
+        db.commit()
+        invalidate_dashboards(*company_ids)
+
+    return {"atualizados": updated}
+
+
+@router.get("/dashboard/pcmsos")
+def dashboard_pcmsos(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    company_ids = scope_company_ids(current_user)
+
+    # "vencidos" depende do dia, não só dos dados
+    not_modified = conditional_response(request, response, db, ["aso"], company_ids, date.today())
+    if not_modified:
+        return not_modified
+
+    return cached_dashboard(
+        "aso_pcmsos",
+        company_ids,
+        lambda: calcular_dashboard_pcmsos(db, current_user),
+    )
+
+
+def calcular_dashboard_pcmsos(db: Session, current_user: User):
+    query = base_query_for_user(db, current_user)
 
     return {
-        "exames_por_mes": exames_por_mes,
-        "status_asos": status_asos
+        "exames_por_mes": exames_por_mes(query, label=label_mm_yyyy),
+        "status_asos": aso_status_counts(query)
     }
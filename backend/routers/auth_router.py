@@ -1,4 +1,6 @@
-from typing import List, Optional
+import os
+from dataclasses import dataclass
+from typing import FrozenSet, List, Optional
 from datetime import date, timedelta
 
 from fastapi import APIRouter, Depends, HTTPException, Header
@@ -8,10 +10,85 @@ from jose import jwt, JWTError, ExpiredSignatureError
 from database import get_db
 import models, schemas
 from auth import hash_password, verify_password, create_token, SECRET_KEY, ALGORITHM
+from cache import TTLCache
+from dashboard_cache import dashboard_cache
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+# ============================================================
+# CACHE DO USUÁRIO AUTENTICADO
+# ============================================================
+# O cache é local a cada processo: invalidate_principal só limpa o
+# worker que atendeu a alteração. Nos outros workers, um usuário
+# inativado / rebaixado / com plano vencido continua valendo por até
+# PRINCIPAL_CACHE_TTL segundos. Rotas sensíveis (administração,
+# exclusão de empresa) usam get_verified_user, que relê o usuário no
+# banco a cada requisição e não tem essa janela.
+PRINCIPAL_CACHE_TTL = float(os.environ.get("PRINCIPAL_CACHE_TTL", "15"))
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("PRINCIPAL_CACHE_SIZE", "1024"))
+
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Snapshot do usuário autenticado, desacoplado da sessão do banco.
+    Tem os mesmos atributos de models.User usados pelas rotas.
+    """
+    id: int
+    email: str
+    name: str
+    role: str
+    plan: str
+    company_id: Optional[int]
+    is_active: bool
+    plan_expires_at: Optional[date]
+    owned_company_ids: FrozenSet[int]
+
+
+def load_principal(db: Session, user_id: int) -> Optional[Principal]:
+    cached = principal_cache.get(user_id)
+
+    if cached is not None:
+        return cached
+
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+
+    if not user:
+        return None
+
+    owned = (
+        db.query(models.Company.id)
+        .filter(models.Company.owner_id == user.id)
+        .all()
+    )
+
+    principal = Principal(
+        id=user.id,
+        email=user.email,
+        name=user.name,
+        role=user.role,
+        plan=user.plan,
+        company_id=user.company_id,
+        is_active=user.is_active,
+        plan_expires_at=user.plan_expires_at,
+        owned_company_ids=frozenset(company_id for (company_id,) in owned),
+    )
+
+    principal_cache.set(user_id, principal)
+
+    return principal
+
+
+def invalidate_principal(*user_ids: Optional[int]):
+    """Chamar sempre que usuário ou empresas de um dono forem alterados."""
+    for user_id in user_ids:
+        if user_id is not None:
+            principal_cache.invalidate(user_id)
+
+
 def is_plan_expired(user: models.User):
     if not user.plan_expires_at:
         return False
@@ -38,7 +115,7 @@ def get_current_user(
         if not user_id:
             raise HTTPException(status_code=401, detail="Token inválido")
 
-        user = db.query(models.User).filter(models.User.id == user_id).first()
+        user = load_principal(db, user_id)
 
         if not user:
             raise HTTPException(status_code=401, detail="Usuário não encontrado")
@@ -62,7 +139,44 @@ def get_current_user(
         raise HTTPException(status_code=401, detail="Token inválido")
 
 
-def require_admin(current_user: models.User = Depends(get_current_user)):
+def get_verified_user(
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    get_current_user + conferência no banco (sem cache) de situação,
+    perfil e plano. Para rotas em que a janela do cache não é aceitável.
+    """
+    row = (
+        db.query(models.User.is_active, models.User.role, models.User.plan_expires_at)
+        .filter(models.User.id == current_user.id)
+        .first()
+    )
+
+    if not row:
+        invalidate_principal(current_user.id)
+        raise HTTPException(status_code=401, detail="Usuário não encontrado")
+
+    if (row.is_active, row.role, row.plan_expires_at) != (
+        current_user.is_active, current_user.role, current_user.plan_expires_at
+    ):
+        # alterado em outro worker: descarta o snapshot e recarrega
+        invalidate_principal(current_user.id)
+        current_user = load_principal(db, current_user.id)
+
+    if not row.is_active:
+        raise HTTPException(status_code=403, detail="Usuário inativo")
+
+    if is_plan_expired(row):
+        raise HTTPException(
+            status_code=403,
+            detail="Plano vencido. Entre em contato com o administrador."
+        )
+
+    return current_user
+
+
+def require_admin(current_user: models.User = Depends(get_verified_user)):
     if current_user.role != "admin":
         raise HTTPException(
             status_code=403,
@@ -224,6 +338,8 @@ def toggle_user_active(
     db.commit()
     db.refresh(user)
 
+    invalidate_principal(user.id)
+
     return user
 
 
@@ -246,4 +362,14 @@ def renew_plan(
     db.commit()
     db.refresh(user)
 
+    invalidate_principal(user.id)
+
     return user
+
+
+@router.get("/cache-stats")
+def cache_stats(admin: models.User = Depends(require_admin)):
+    return {
+        "principal": principal_cache.stats(),
+        "dashboard": dashboard_cache.stats(),
+    }
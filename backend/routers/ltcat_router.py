@@ -1,9 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, File, UploadFile, status
+from sqlalchemy import delete
 from sqlalchemy.orm import Session
 
 from database import get_db
-from models import LTCATRecord, User, Company
+from models import LTCATRecord, LTCATDosimetry, User
 from routers.auth_router import get_current_user
+from pagination import page_params, keyset_page
+from export import ExportFormat, export_format_param, stream_export
+from search import apply_record_filters
+from tenancy import get_default_company_id, validate_company_access, scope_query, scope_filter, scope_company_ids
+from summary import summary_deltas, track_summary
+from dashboard_cache import invalidate_dashboards, invalidate_all_dashboards
+from versions import bump_versions, conditional_response
+from writes import VERSION_CONFLICT, writable_values, pop_version, insert_returning, update_returning, delete_returning
+from ltcat_engine import recompute_enquadramento
+from dosimetry import (
+    DosimetryError, read_samples, noise_metrics, save_series, remove_series,
+    schedule_removal, remove_pending,
+)
 
 router = APIRouter(
     prefix="/ltcat",
@@ -11,69 +28,157 @@ router = APIRouter(
 )
 
 
-def is_admin(user: User):
-    return user.role == "admin"
+def base_query_for_user(db: Session, current_user: User):
+    return scope_query(db.query(LTCATRecord), LTCATRecord, current_user)
+
+
+@router.get("/records")
+def list_ltcat_records(
+    request: Request,
+    response: Response,
+    page: dict = Depends(page_params),
+    setor: Optional[str] = None,
+    funcao: Optional[str] = None,
+    enquadramento: Optional[str] = None,
+    data_de: Optional[date] = None,
+    data_ate: Optional[date] = None,
+    q: Optional[str] = Query(None, max_length=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    not_modified = conditional_response(request, response, db, ["ltcat"], scope_company_ids(current_user))
+    if not_modified:
+        return not_modified
+
+    query = apply_record_filters(
+        base_query_for_user(db, current_user),
+        LTCATRecord,
+        equals={"setor": setor, "funcao": funcao, "enquadramento": enquadramento},
+        date_column=LTCATRecord.data_avaliacao,
+        data_de=data_de,
+        data_ate=data_ate,
+        q=q,
+    )
+
+    return keyset_page(
+        query,
+        [LTCATRecord.id],
+        **page
+    )
+
+
+@router.get("/records/export")
+def export_ltcat_records(
+    fmt: ExportFormat = Depends(export_format_param),
+    current_user: User = Depends(get_current_user)
+):
+    return stream_export(
+        lambda db: base_query_for_user(db, current_user),
+        LTCATRecord,
+        fmt,
+        "ltcat_records",
+    )
 
 
-def get_default_company_id(db: Session, current_user: User):
-    if is_admin(current_user):
-        return current_user.company_id
+# ============================================================
+# ESCRITAS (usadas pelas rotas e pelo /sync/push)
+# ============================================================
+# Não fazem commit nem mexem na versão da coleção: quem chama agrupa
+# (um registro por requisição, ou um lote inteiro numa transação).
 
-    company = (
-        db.query(Company)
-        .filter(Company.owner_id == current_user.id)
-        .order_by(Company.id.desc())
+def get_record_or_404(db: Session, current_user: User, record_id: int):
+    record = (
+        base_query_for_user(db, current_user)
+        .filter(LTCATRecord.id == record_id)
         .first()
     )
 
-    return company.id if company else None
+    if not record:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Registro LTCAT não encontrado ou sem permissão."
+        )
+
+    return record
 
 
-def validate_company_access(db: Session, company_id: int, current_user: User):
-    if is_admin(current_user):
-        return True
+def create_record(db: Session, data: dict, current_user: User) -> LTCATRecord:
+    company_id = data.get("company_id") or get_default_company_id(current_user)
 
     if not company_id:
-        return False
+        raise HTTPException(
+            status_code=400,
+            detail="Nenhuma empresa vinculada ao usuário. Cadastre uma empresa primeiro."
+        )
 
-    company = (
-        db.query(Company)
-        .filter(
-            Company.id == company_id,
-            Company.owner_id == current_user.id
+    if not validate_company_access(db, company_id, current_user):
+        raise HTTPException(
+            status_code=403,
+            detail="Sem permissão para registrar LTCAT nesta empresa."
         )
-        .first()
-    )
 
-    return company is not None
+    data["company_id"] = company_id
+
+    record = insert_returning(db, LTCATRecord, writable_values(LTCATRecord, data, strict=True))
+    track_summary(db, after=summary_deltas(record))
 
+    return record
 
-def base_query_for_user(db: Session, current_user: User):
-    query = db.query(LTCATRecord)
 
-    if is_admin(current_user):
-        return query
+def update_record(db: Session, record_id: int, data: dict, current_user: User) -> LTCATRecord:
+    """
+    UPDATE ... WHERE id AND version RETURNING, com a versão lida aqui:
+    quem gravou no meio (ou antes, se o cliente mandou version) dá 409.
+    """
+    version = pop_version(data)
+    record = get_record_or_404(db, current_user, record_id)
+
+    if version is not None and version != record.version:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=VERSION_CONFLICT)
 
-    owned_company_ids = (
-        db.query(Company.id)
-        .filter(Company.owner_id == current_user.id)
-        .subquery()
+    data.pop("company_id", None)
+
+    before = summary_deltas(record)
+
+    record = update_returning(
+        db, LTCATRecord, record_id, writable_values(LTCATRecord, data),
+        version=record.version,
     )
 
-    return query.filter(LTCATRecord.company_id.in_(owned_company_ids))
+    if record is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=VERSION_CONFLICT)
 
+    track_summary(db, before, summary_deltas(record))
 
-@router.get("/records")
-def list_ltcat_records(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    return (
-        base_query_for_user(db, current_user)
-        .order_by(LTCATRecord.id.asc())
-        .all()
+    return record
+
+
+def delete_record(db: Session, record_id: int, current_user: User) -> LTCATRecord:
+    """Remove o registro e as dosimetrias (arquivos: remove_pending após o commit)."""
+    arquivos = db.execute(
+        delete(LTCATDosimetry)
+        .where(
+            LTCATDosimetry.record_id == record_id,
+            *scope_filter(LTCATDosimetry, current_user),
+        )
+        .returning(LTCATDosimetry.arquivo)
+    ).scalars().all()
+
+    record = delete_returning(
+        db, LTCATRecord, record_id, *scope_filter(LTCATRecord, current_user)
     )
 
+    if record is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Registro LTCAT não encontrado ou sem permissão."
+        )
+
+    schedule_removal(db, arquivos)
+    track_summary(db, before=summary_deltas(record))
+
+    return record
+
 
 @router.post("/records", status_code=status.HTTP_201_CREATED)
 def create_ltcat_record(
@@ -81,81 +186,179 @@ def create_ltcat_record(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    company_id = data.get("company_id") or get_default_company_id(db, current_user)
+    record = create_record(db, data, current_user)
 
-    if not company_id:
-        raise HTTPException(
-            status_code=400,
-            detail="Nenhuma empresa vinculada ao usuário. Cadastre uma empresa primeiro."
-        )
+    bump_versions(db, "ltcat", [record.company_id])
+    db.commit()
 
-    if not validate_company_access(db, company_id, current_user):
-        raise HTTPException(
-            status_code=403,
-            detail="Sem permissão para registrar LTCAT nesta empresa."
-        )
+    invalidate_dashboards(record.company_id)
 
-    data["company_id"] = company_id
+    return record
 
-    record = LTCATRecord(**data)
 
-    db.add(record)
+@router.put("/records/{record_id}")
+def update_ltcat_record(
+    record_id: int,
+    data: dict,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    record = update_record(db, record_id, data, current_user)
+
+    bump_versions(db, "ltcat", [record.company_id])
     db.commit()
-    db.refresh(record)
+
+    invalidate_dashboards(record.company_id)
 
     return record
 
 
-@router.put("/records/{record_id}")
-def update_ltcat_record(
+@router.delete("/records/{record_id}")
+def delete_ltcat_record(
     record_id: int,
-    data: dict,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    record = (
-        base_query_for_user(db, current_user)
-        .filter(LTCATRecord.id == record_id)
-        .first()
-    )
+    company_id = delete_record(db, record_id, current_user).company_id
 
-    if not record:
+    bump_versions(db, "ltcat", [company_id])
+    db.commit()
+    remove_pending(db)
+
+    invalidate_dashboards(company_id)
+
+    return {"msg": "Registro LTCAT excluído com sucesso."}
+
+
+# ============================================================
+# ENQUADRAMENTO AUTOMÁTICO (motor em lote)
+# ============================================================
+def enquadramento_scope(db: Session, current_user: User, company_id: Optional[int]):
+    query = base_query_for_user(db, current_user)
+
+    if company_id is None:
+        return query
+
+    if not validate_company_access(db, company_id, current_user):
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Registro LTCAT não encontrado ou sem permissão."
+            status_code=403,
+            detail="Sem permissão para acessar esta empresa."
         )
 
-    data.pop("company_id", None)
+    return query.filter(LTCATRecord.company_id == company_id)
 
-    for key, value in data.items():
-        if hasattr(record, key):
-            setattr(record, key, value)
 
+@router.get("/enquadramento/preview")
+def preview_enquadramento(
+    company_id: Optional[int] = None,
+    amostra: int = Query(50, ge=0, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Simulação: mostra o que mudaria, sem gravar."""
+    return recompute_enquadramento(
+        db,
+        enquadramento_scope(db, current_user, company_id),
+        dry_run=True,
+        sample_size=amostra,
+    )
+
+
+@router.post("/enquadramento/recompute")
+def recompute_ltcat_enquadramento(
+    company_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    result = recompute_enquadramento(db, enquadramento_scope(db, current_user, company_id))
+    company_ids = scope_company_ids(current_user) if company_id is None else [company_id]
+
+    bump_versions(db, "ltcat", company_ids)
     db.commit()
-    db.refresh(record)
 
-    return record
+    if company_ids is None:
+        invalidate_all_dashboards()
+    else:
+        invalidate_dashboards(*company_ids)
 
+    return result
 
-@router.delete("/records/{record_id}")
-def delete_ltcat_record(
+
+# ============================================================
+# DOSIMETRIA DE RUÍDO
+# ============================================================
+@router.post("/records/{record_id}/dosimetria", status_code=status.HTTP_201_CREATED)
+def upload_dosimetria(
     record_id: int,
+    file: UploadFile = File(...),
+    intervalo_s: float = Query(1.0, gt=0),
+    fator_duplicacao: int = Query(3),
+    atualizar_intensidade: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    record = (
-        base_query_for_user(db, current_user)
-        .filter(LTCATRecord.id == record_id)
-        .first()
-    )
-
-    if not record:
+    """
+    Recebe o log do dosímetro (uma amostra em dB(A) por linha, com ou
+    sem coluna de horário), calcula Leq, dose, TWA e pico e anexa o
+    resumo ao registro. atualizar_intensidade=true grava o TWA em
+    intensidade / unidade.
+    """
+    if fator_duplicacao not in (3, 5):
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Registro LTCAT não encontrado ou sem permissão."
+            status_code=400,
+            detail="Fator de duplicação deve ser 3 (NHO-01) ou 5 (NR-15)."
         )
 
-    db.delete(record)
-    db.commit()
+    record = get_record_or_404(db, current_user, record_id)
+
+    try:
+        levels = read_samples(file.file)
+        metrics = noise_metrics(levels, intervalo_s=intervalo_s, q=fator_duplicacao)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="O arquivo deve estar em UTF-8.")
+    except DosimetryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    arquivo = save_series(record.id, levels, intervalo_s)
+
+    try:
+        dosimetry = LTCATDosimetry(
+            record_id=record.id,
+            company_id=record.company_id,
+            arquivo=arquivo,
+            nome_original=file.filename,
+            **metrics,
+        )
+        db.add(dosimetry)
 
-    return {"msg": "Registro LTCAT excluído com sucesso."}
+        if atualizar_intensidade and metrics["twa"] is not None:
+            record.intensidade = f"{metrics['twa']:.1f}".replace(".", ",")
+            record.unidade = "dB(A)"
+            record.version = record.version + 1
+            bump_versions(db, "ltcat", [record.company_id])
+
+        db.commit()
+        db.refresh(dosimetry)
+
+    except Exception:
+        db.rollback()
+        remove_series(arquivo)
+        raise
+
+    return dosimetry
+
+
+@router.get("/records/{record_id}/dosimetria")
+def list_dosimetrias(
+    record_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    record = get_record_or_404(db, current_user, record_id)
+
+    return (
+        db.query(LTCATDosimetry)
+        .filter(LTCATDosimetry.record_id == record.id)
+        .order_by(LTCATDosimetry.id.desc())
+        .all()
+    )
@@ -1,9 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import operator
+import os
+from datetime import date, datetime
+from functools import reduce
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import case
 from sqlalchemy.orm import Session
 
 from database import get_db
-from models import NR17Record, User, Company
+from models import NR17Record, User
 from routers.auth_router import get_current_user
+from pagination import page_params, keyset_page
+from export import ExportFormat, export_format_param, stream_export
+from search import apply_record_filters
+from workers import index_record, unindex_record
+from versions import bump_versions, conditional_response
+from changelog import log_changes
+from writes import VERSION_CONFLICT, writable_values, pop_version, insert_returning, update_returning, delete_returning
+from tenancy import is_admin, get_default_company_id, validate_company_access, scope_query, scope_filter, scope_company_ids
+from summary import summary_deltas, track_summary, rebuild_nr17_summary
+from dashboard_cache import invalidate_dashboards, invalidate_all_dashboards
 
 router = APIRouter(
     prefix="/nr17",
@@ -11,77 +28,201 @@ router = APIRouter(
 )
 
 
-def is_admin(user: User):
-    return user.role == "admin"
+def base_query_for_user(db: Session, current_user: User):
+    return scope_query(db.query(NR17Record), NR17Record, current_user)
 
 
-def get_default_company_id(db: Session, current_user: User):
-    if is_admin(current_user):
-        return current_user.company_id
+# ============================================================
+# MOTOR DE PONTUAÇÃO NR-17
+# ============================================================
+# Seis fatores (1 = adequado ... 3 = desfavorável), empacotados em
+# NR17Record.fatores com 2 bits cada, na ordem de NR17_FATORES.
+# score = soma dos fatores; risco pelos limites abaixo. Mudou um
+# limite → POST /nr17/records/rescore reclassifica tudo no banco.
 
-    company = (
-        db.query(Company)
-        .filter(Company.owner_id == current_user.id)
-        .order_by(Company.id.desc())
-        .first()
-    )
+NR17_FATORES = ["mobiliario", "postura", "esforco", "pausas", "ambiente", "organizacao"]
+FATOR_BITS = 2
+FATOR_MASK = (1 << FATOR_BITS) - 1
 
-    return company.id if company else None
+NR17_LIMITE_MEDIO = int(os.environ.get("NR17_LIMITE_MEDIO", "9"))
+NR17_LIMITE_ALTO = int(os.environ.get("NR17_LIMITE_ALTO", "13"))
 
 
-def validate_company_access(db: Session, company_id: int, current_user: User):
-    if is_admin(current_user):
-        return True
+def pack_fatores(fatores: dict, stored: Optional[int] = None) -> int:
+    """
+    stored: fatores já gravados (update); o payload pode mandar só os
+    que mudaram. Sem stored, os seis são obrigatórios.
+    """
+    if stored is not None:
+        fatores = {**unpack_fatores(stored), **fatores}
 
-    if not company_id:
-        return False
-
-    company = (
-        db.query(Company)
-        .filter(
-            Company.id == company_id,
-            Company.owner_id == current_user.id
+    missing = [nome for nome in NR17_FATORES if fatores.get(nome) is None]
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Fatores ergonômicos ausentes: {', '.join(missing)}."
         )
-        .first()
-    )
 
-    return company is not None
+    packed = 0
 
+    for i, nome in enumerate(NR17_FATORES):
+        try:
+            valor = int(fatores[nome])
+        except (TypeError, ValueError):
+            valor = 0
 
-def base_query_for_user(db: Session, current_user: User):
-    query = db.query(NR17Record)
+        if not 1 <= valor <= 3:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Fator ergonômico inválido: {nome} (use 1, 2 ou 3)."
+            )
 
-    if is_admin(current_user):
-        return query
+        packed |= valor << (FATOR_BITS * i)
 
-    owned_company_ids = (
-        db.query(Company.id)
-        .filter(Company.owner_id == current_user.id)
-        .subquery()
-    )
+    return packed
+
+
+def unpack_fatores(packed: int) -> dict:
+    return {
+        nome: (packed >> (FATOR_BITS * i)) & FATOR_MASK
+        for i, nome in enumerate(NR17_FATORES)
+    }
 
-    return query.filter(NR17Record.company_id.in_(owned_company_ids))
+
+def classificar_score(score: int) -> str:
+    if score >= NR17_LIMITE_ALTO:
+        return "Alto"
+    if score >= NR17_LIMITE_MEDIO:
+        return "Médio"
+    return "Baixo"
+
+
+def aplicar_pontuacao(data: dict, stored_fatores: Optional[int] = None):
+    """
+    Com "fatores" no payload, o servidor calcula score e risco (o que
+    vier do cliente é ignorado); no update, os fatores ausentes vêm de
+    stored_fatores. Sem fatores, um score avulso (registros antigos)
+    só é reclassificado.
+    """
+    if data.get("fatores") is not None:
+        fatores = data["fatores"]
+
+        if not isinstance(fatores, dict):
+            raise HTTPException(
+                status_code=400,
+                detail="fatores deve ser um objeto com os seis fatores ergonômicos."
+            )
+
+        packed = pack_fatores(fatores, stored_fatores)
+        score = sum(unpack_fatores(packed).values())
+
+        data["fatores"] = packed
+        data["score"] = score
+        data["risco"] = classificar_score(score)
+
+    elif data.get("score") is not None:
+        try:
+            score = int(data["score"])
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Score inválido (use um número inteiro).")
+
+        data["fatores"] = None
+        data["score"] = score
+        data["risco"] = classificar_score(score)
+
+
+def score_expression():
+    """Mesma soma de pack/unpack, em SQL (operadores de bits)."""
+    parts = [
+        NR17Record.fatores.bitwise_rshift(FATOR_BITS * i).bitwise_and(FATOR_MASK)
+        for i in range(len(NR17_FATORES))
+    ]
+    packed_score = reduce(operator.add, parts)
+
+    return case((NR17Record.fatores.is_(None), NR17Record.score), else_=packed_score)
+
+
+def risco_expression(score):
+    return case(
+        (score.is_(None), NR17Record.risco),
+        (score >= NR17_LIMITE_ALTO, "Alto"),
+        (score >= NR17_LIMITE_MEDIO, "Médio"),
+        else_="Baixo",
+    )
 
 
 @router.get("/records")
 def list_nr17_records(
+    request: Request,
+    response: Response,
+    page: dict = Depends(page_params),
+    setor: Optional[str] = None,
+    funcao: Optional[str] = None,
+    risco: Optional[str] = None,
+    data_de: Optional[date] = None,
+    data_ate: Optional[date] = None,
+    q: Optional[str] = Query(None, max_length=100),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    return (
-        base_query_for_user(db, current_user)
-        .order_by(NR17Record.id.asc())
-        .all()
+    not_modified = conditional_response(request, response, db, ["nr17"], scope_company_ids(current_user))
+    if not_modified:
+        return not_modified
+
+    query = apply_record_filters(
+        base_query_for_user(db, current_user),
+        NR17Record,
+        equals={"setor": setor, "funcao": funcao, "risco": risco},
+        date_column=NR17Record.data_avaliacao,
+        data_de=data_de,
+        data_ate=data_ate,
+        q=q,
+    )
+
+    return keyset_page(
+        query,
+        [NR17Record.id],
+        **page
     )
 
 
-@router.post("/records", status_code=status.HTTP_201_CREATED)
-def create_nr17_record(
-    data: dict,
-    db: Session = Depends(get_db),
+@router.get("/records/export")
+def export_nr17_records(
+    fmt: ExportFormat = Depends(export_format_param),
     current_user: User = Depends(get_current_user)
 ):
-    company_id = data.get("company_id") or get_default_company_id(db, current_user)
+    return stream_export(
+        lambda db: base_query_for_user(db, current_user),
+        NR17Record,
+        fmt,
+        "nr17_records",
+    )
+
+
+# ============================================================
+# ESCRITAS (usadas pelas rotas e pelo /sync/push)
+# ============================================================
+# Não fazem commit nem mexem na versão da coleção: quem chama agrupa
+# (uma avaliação por requisição, ou um lote inteiro numa transação).
+
+def get_record_or_404(db: Session, current_user: User, record_id: int):
+    record = (
+        base_query_for_user(db, current_user)
+        .filter(NR17Record.id == record_id)
+        .first()
+    )
+
+    if not record:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Avaliação NR-17 não encontrada ou sem permissão."
+        )
+
+    return record
+
+
+def create_record(db: Session, data: dict, current_user: User) -> NR17Record:
+    company_id = data.get("company_id") or get_default_company_id(current_user)
 
     if not company_id:
         raise HTTPException(
@@ -96,43 +237,91 @@ def create_nr17_record(
         )
 
     data["company_id"] = company_id
+    aplicar_pontuacao(data)
 
-    record = NR17Record(**data)
+    record = insert_returning(db, NR17Record, writable_values(NR17Record, data, strict=True))
+    track_summary(db, after=summary_deltas(record))
+    index_record(db, "nr17", record)
 
-    db.add(record)
-    db.commit()
-    db.refresh(record)
+    return record
+
+
+def update_record(db: Session, record_id: int, data: dict, current_user: User) -> NR17Record:
+    """
+    UPDATE ... WHERE id AND version RETURNING, com a versão lida aqui:
+    quem gravou no meio (ou antes, se o cliente mandou version) dá 409.
+    """
+    version = pop_version(data)
+    record = get_record_or_404(db, current_user, record_id)
+
+    if version is not None and version != record.version:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=VERSION_CONFLICT)
+
+    data.pop("company_id", None)
+    aplicar_pontuacao(data, record.fatores)
+
+    before = summary_deltas(record)
+
+    record = update_returning(
+        db, NR17Record, record_id, writable_values(NR17Record, data),
+        version=record.version,
+    )
+
+    if record is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=VERSION_CONFLICT)
+
+    track_summary(db, before, summary_deltas(record))
+    index_record(db, "nr17", record)
 
     return record
 
 
-@router.put("/records/{record_id}")
-def update_nr17_record(
-    record_id: int,
-    data: dict,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    record = (
-        base_query_for_user(db, current_user)
-        .filter(NR17Record.id == record_id)
-        .first()
+def delete_record(db: Session, record_id: int, current_user: User) -> NR17Record:
+    record = delete_returning(
+        db, NR17Record, record_id, *scope_filter(NR17Record, current_user)
     )
 
-    if not record:
+    if record is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Avaliação NR-17 não encontrada ou sem permissão."
         )
 
-    data.pop("company_id", None)
+    track_summary(db, before=summary_deltas(record))
+    unindex_record(db, "nr17", record.id)
 
-    for key, value in data.items():
-        if hasattr(record, key):
-            setattr(record, key, value)
+    return record
 
+
+@router.post("/records", status_code=status.HTTP_201_CREATED)
+def create_nr17_record(
+    data: dict,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    record = create_record(db, data, current_user)
+
+    bump_versions(db, "nr17", [record.company_id])
     db.commit()
-    db.refresh(record)
+
+    invalidate_dashboards(record.company_id)
+
+    return record
+
+
+@router.put("/records/{record_id}")
+def update_nr17_record(
+    record_id: int,
+    data: dict,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    record = update_record(db, record_id, data, current_user)
+
+    bump_versions(db, "nr17", [record.company_id])
+    db.commit()
+
+    invalidate_dashboards(record.company_id)
 
     return record
 
@@ -143,19 +332,59 @@ def delete_nr17_record(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    record = (
-        base_query_for_user(db, current_user)
-        .filter(NR17Record.id == record_id)
-        .first()
-    )
-
-    if not record:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Avaliação NR-17 não encontrada ou sem permissão."
-        )
+    company_id = delete_record(db, record_id, current_user).company_id
 
-    db.delete(record)
+    bump_versions(db, "nr17", [company_id])
     db.commit()
 
+    invalidate_dashboards(company_id)
+
     return {"msg": "Avaliação NR-17 excluída com sucesso."}
+
+
+@router.post("/records/rescore")
+def rescore_nr17_records(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Recalcula score / risco de todas as avaliações do usuário (ou de
+    todas, se admin) com um único UPDATE, e reconta o resumo.
+    """
+    score = score_expression()
+    risco = risco_expression(score)
+
+    stale = (
+        base_query_for_user(db, current_user)
+        .filter(
+            NR17Record.score.is_distinct_from(score)
+            | NR17Record.risco.is_distinct_from(risco)
+        )
+    )
+
+    # antes do UPDATE: depois dele o filtro não pega mais nada
+    log_changes(db, NR17Record, stale.whereclause)
+
+    updated = stale.update(
+        {
+            NR17Record.score: score,
+            NR17Record.risco: risco,
+            NR17Record.version: NR17Record.version + 1,
+            NR17Record.updated_at: datetime.utcnow(),
+        },
+        synchronize_session=False,
+    )
+
+    if is_admin(current_user):
+        rebuild_nr17_summary(db)
+        bump_versions(db, "nr17")
+        db.commit()
+        invalidate_all_dashboards()
+    else:
+        company_ids = current_user.owned_company_ids
+        rebuild_nr17_summary(db, company_ids)
+        bump_versions(db, "nr17", company_ids)
+        db.commit()
+        invalidate_dashboards(*company_ids)
+
+    return {"atualizados": updated}
@@ -1,9 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from datetime import date
+from operator import attrgetter
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import delete, exists, func, select
+from sqlalchemy.orm import Session, selectinload
 
 from database import get_db
-from models import Company, Sector, Hazard, Risk, Action, User
-from routers.auth_router import get_current_user
+from models import (
+    Company, Sector, Hazard, Risk, Action, User,
+    AsoRecord, NR17Record, LTCATRecord,
+    AsoPeriodicity, CompanySummary, CompanyAgentCount,
+    RISK_LEVELS, RISK_LEVEL_MAX,
+)
+from routers.auth_router import get_current_user, get_verified_user, invalidate_principal
+from tenancy import is_admin, validate_company_access, scope_filter, scope_company_ids
+from pagination import page_params, keyset_page
+from dashboard_cache import invalidate_dashboards
+from versions import bump_versions, conditional_response
+from changelog import log_changes
+from pgr_clone import clone_tree
+from action_deadlines import due_actions_query, mark_overdue, canonical_status
+from writes import (
+    VERSION_CONFLICT, writable_values, pop_version,
+    insert_returning, update_returning, delete_returning,
+    insert_many_returning, update_many,
+)
 
 router = APIRouter(prefix="/pgr", tags=["PGR / NR-01"])
 
@@ -18,27 +40,196 @@ def get_or_404(db: Session, model, obj_id: int):
     return obj
 
 
-def is_admin(user: User):
-    return user.role == "admin"
+def row_to_dict(obj):
+    return {c.name: getattr(obj, c.name) for c in obj.__table__.columns}
 
 
 def can_create_company(user: User):
     return user.role in ["admin", "gestor"]
 
 
-def validate_company_access(company_id: int, current_user: User, db: Session):
-    if is_admin(current_user):
-        return True
+def get_authorized_or_404(db: Session, model, obj_id: int, current_user: User):
+    """
+    Busca o registro e autoriza pelo company_id do próprio nó.
 
-    if not company_id:
-        return False
+    Todos os nós da árvore do PGR (Sector, Hazard, Risk, Action) têm
+    company_id, então não é preciso subir a cadeia de pais.
+    """
+    obj = get_or_404(db, model, obj_id)
 
-    company = db.query(Company).filter(Company.id == company_id).first()
+    if not validate_company_access(db, obj.company_id, current_user):
+        raise HTTPException(status_code=403, detail="Sem permissão.")
 
-    if not company:
-        return False
+    return obj
+
+
+def propagate_company_id(db: Session, model, obj_id: int, company_id: int, previous_company_id: int):
+    """
+    Replica o company_id de um nó movido para todos os descendentes,
+    com um UPDATE por nível (e registra a mudança para o sync).
+    """
+    if previous_company_id == company_id:
+        previous_company_id = None
+
+    if model is Sector:
+        hazard_filter = Hazard.sector_id == obj_id
+        (
+            db.query(Hazard)
+            .filter(hazard_filter)
+            .update({Hazard.company_id: company_id}, synchronize_session=False)
+        )
+        log_changes(db, Hazard, hazard_filter, previous_company_id=previous_company_id)
+
+        risk_filter = Risk.hazard_id.in_(
+            select(Hazard.id).where(hazard_filter)
+        )
+    elif model is Hazard:
+        risk_filter = Risk.hazard_id == obj_id
+    else:
+        risk_filter = None
+
+    if risk_filter is not None:
+        (
+            db.query(Risk)
+            .filter(risk_filter)
+            .update({Risk.company_id: company_id}, synchronize_session=False)
+        )
+        log_changes(db, Risk, risk_filter, previous_company_id=previous_company_id)
+
+        action_filter = Action.risk_id.in_(select(Risk.id).where(risk_filter))
+    else:
+        action_filter = Action.risk_id == obj_id
+
+    (
+        db.query(Action)
+        .filter(action_filter)
+        .update({Action.company_id: company_id}, synchronize_session=False)
+    )
+    log_changes(db, Action, action_filter, previous_company_id=previous_company_id)
+
+
+# ============================================================
+# ESCRITAS EM UM COMANDO
+# ============================================================
+# Nó de cada modelo → (coluna do pai, modelo do pai). Setor aponta
+# direto para a empresa.
+PARENTS = {
+    Sector: ("company_id", Company),
+    Hazard: ("sector_id", Sector),
+    Risk: ("hazard_id", Hazard),
+    Action: ("risk_id", Risk),
+}
+
+CHILDREN = {
+    Company: ("sectors", Sector),
+    Sector: ("hazards", Hazard),
+    Hazard: ("risks", Risk),
+    Risk: ("actions", Action),
+}
+
+
+def node_values(model, data: dict, strict: bool = False) -> dict:
+    """writable_values + status da ação na forma canônica."""
+    values = writable_values(model, data, strict=strict)
+
+    if model is Action and "status" in values:
+        values["status"] = canonical_status(values["status"])
+
+    return values
+
+
+def create_node(db: Session, model, data: dict, current_user: User):
+    """INSERT ... RETURNING, com company_id herdado do pai autorizado."""
+    parent_key, parent_model = PARENTS[model]
+    parent_id = data.get(parent_key)
+
+    if parent_model is Company:
+        if not validate_company_access(db, parent_id, current_user):
+            raise HTTPException(status_code=403, detail="Sem permissão.")
+    else:
+        parent = get_authorized_or_404(db, parent_model, parent_id, current_user)
+        data["company_id"] = parent.company_id
+
+    node = insert_returning(db, model, node_values(model, data, strict=True))
+    bump_versions(db, "pgr", [node.company_id])
+
+    return node
+
+
+def update_node(db: Session, model, obj_id: int, data: dict, current_user: User):
+    """
+    Caminho rápido: um UPDATE ... RETURNING com escopo, pai e versão no
+    WHERE. Sem linha afetada (não existe, sem permissão, versão velha ou
+    troca de pai), cai no caminho com SELECT, que responde 404 / 403 /
+    409 ou faz a mudança de pai e replica o company_id.
+    """
+    version = pop_version(data)
+    parent_key, parent_model = PARENTS[model]
+
+    if parent_model is not Company:
+        data.pop("company_id", None)
+
+    parent_id = data.get(parent_key)
+    values = node_values(model, data)
+
+    criteria = scope_filter(model, current_user)
+    if parent_id is not None:
+        criteria.append(getattr(model, parent_key) == parent_id)
+
+    node = update_returning(db, model, obj_id, values, *criteria, version=version)
+
+    if node is not None:
+        bump_versions(db, "pgr", [node.company_id])
+        return node
+
+    current = get_authorized_or_404(db, model, obj_id, current_user)
+    previous_company_id = current.company_id
+
+    if version is not None and version != current.version:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=VERSION_CONFLICT)
+
+    if parent_id is not None and parent_id != getattr(current, parent_key):
+        if parent_model is Company:
+            if not validate_company_access(db, parent_id, current_user):
+                raise HTTPException(status_code=403, detail="Sem permissão.")
+        else:
+            parent = get_authorized_or_404(db, parent_model, parent_id, current_user)
+            values["company_id"] = parent.company_id
 
-    return company.owner_id == current_user.id
+    node = update_returning(
+        db, model, obj_id, values,
+        version=current.version,
+        previous_company_id=previous_company_id,
+    )
+
+    if node is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=VERSION_CONFLICT)
+
+    if node.company_id != previous_company_id and model is not Action:
+        propagate_company_id(db, model, node.id, node.company_id, previous_company_id)
+
+    bump_versions(db, "pgr", [previous_company_id, node.company_id])
+
+    return node
+
+
+def delete_subtree(db: Session, model, *criteria):
+    """
+    Exclui os nós de model que atendem aos critérios e toda a
+    descendência, um DELETE por nível (filhos primeiro, pai por
+    IN (SELECT id ...)), sem carregar nenhuma linha. Registra os
+    tombstones do sync antes de cada DELETE. Não faz commit.
+    """
+    if model in CHILDREN:
+        _, child = CHILDREN[model]
+        parent_key = PARENTS[child][0]
+        delete_subtree(
+            db, child,
+            getattr(child, parent_key).in_(select(model.id).where(*criteria)),
+        )
+
+    log_changes(db, model, *criteria, op="delete")
+    db.execute(delete(model).where(*criteria))
 
 
 @router.post("/companies", status_code=status.HTTP_201_CREATED)
@@ -53,32 +244,45 @@ def create_company(
             detail="Sem permissão para criar empresas."
         )
 
-    company = Company(
-        owner_id=current_user.id,
-        **data
-    )
+    company = insert_returning(db, Company, {
+        **writable_values(Company, data, strict=True),
+        "owner_id": current_user.id,
+    })
 
-    db.add(company)
+    bump_versions(db, "pgr", [company.id])
     db.commit()
-    db.refresh(company)
+
+    invalidate_principal(company.owner_id)
 
     return company
 
 
 @router.get("/companies")
 def list_companies(
+    request: Request,
+    response: Response,
+    page: dict = Depends(page_params),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    query = db.query(Company)
+
     if is_admin(current_user):
-        return db.query(Company).order_by(Company.id.desc()).all()
+        not_modified = conditional_response(request, response, db, ["pgr"])
+    else:
+        query = query.filter(Company.owner_id == current_user.id)
+
+        # o conjunto de empresas do Principal pode estar em cache:
+        # (quantas, maior id) do dono entra no ETag
+        owned = query.with_entities(func.count(Company.id), func.max(Company.id)).one()
+        not_modified = conditional_response(
+            request, response, db, ["pgr"], current_user.owned_company_ids, tuple(owned)
+        )
 
-    return (
-        db.query(Company)
-        .filter(Company.owner_id == current_user.id)
-        .order_by(Company.id.desc())
-        .all()
-    )
+    if not_modified:
+        return not_modified
+
+    return keyset_page(query, [Company.id], descending=True, **page)
 
 
 @router.get("/companies/{company_id}")
@@ -87,12 +291,81 @@ def get_company(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    if not validate_company_access(company_id, current_user, db):
+    if not validate_company_access(db, company_id, current_user):
         raise HTTPException(status_code=403, detail="Sem permissão.")
 
     return get_or_404(db, Company, company_id)
 
 
+@router.get("/companies/{company_id}/tree")
+def get_company_tree(
+    company_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Retorna a empresa com toda a árvore do PGR
+    (setores → perigos → riscos → ações) em uma única chamada.
+
+    Cada nível é carregado com selectinload, então o total de queries
+    é fixo (uma por nível), independente do tamanho da árvore.
+    """
+    if not validate_company_access(db, company_id, current_user):
+        raise HTTPException(status_code=403, detail="Sem permissão.")
+
+    not_modified = conditional_response(request, response, db, ["pgr"], [company_id])
+    if not_modified:
+        return not_modified
+
+    company = (
+        db.query(Company)
+        .options(
+            selectinload(Company.sectors)
+            .selectinload(Sector.hazards)
+            .selectinload(Hazard.risks)
+            .selectinload(Risk.actions)
+        )
+        .filter(Company.id == company_id)
+        .first()
+    )
+
+    if not company:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Registro não encontrado."
+        )
+
+    by_id = attrgetter("id")
+
+    return {
+        **row_to_dict(company),
+        "sectors": [
+            {
+                **row_to_dict(sector),
+                "hazards": [
+                    {
+                        **row_to_dict(hazard),
+                        "risks": [
+                            {
+                                **row_to_dict(risk),
+                                "actions": [
+                                    row_to_dict(action)
+                                    for action in sorted(risk.actions, key=by_id)
+                                ],
+                            }
+                            for risk in sorted(hazard.risks, key=by_id)
+                        ],
+                    }
+                    for hazard in sorted(sector.hazards, key=by_id)
+                ],
+            }
+            for sector in sorted(company.sectors, key=by_id)
+        ],
+    }
+
+
 @router.put("/companies/{company_id}")
 def update_company(
     company_id: int,
@@ -100,17 +373,28 @@ def update_company(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    if not validate_company_access(company_id, current_user, db):
+    if not validate_company_access(db, company_id, current_user):
         raise HTTPException(status_code=403, detail="Sem permissão.")
 
-    company = get_or_404(db, Company, company_id)
+    version = pop_version(data)
+    values = writable_values(Company, data)
 
-    for k, v in data.items():
-        if hasattr(company, k):
-            setattr(company, k, v)
+    # troca de dono: precisa do dono anterior para invalidar o cache dele
+    previous_owner_id = None
+    if "owner_id" in values:
+        previous_owner_id = get_or_404(db, Company, company_id).owner_id
 
+    company = update_returning(db, Company, company_id, values, version=version)
+
+    if company is None:
+        get_or_404(db, Company, company_id)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=VERSION_CONFLICT)
+
+    bump_versions(db, "pgr", [company_id])
     db.commit()
-    db.refresh(company)
+
+    if "owner_id" in values and company.owner_id != previous_owner_id:
+        invalidate_principal(previous_owner_id, company.owner_id)
 
     return company
 
@@ -119,7 +403,7 @@ def update_company(
 def delete_company(
     company_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_verified_user)
 ):
     if not is_admin(current_user):
         raise HTTPException(
@@ -127,11 +411,38 @@ def delete_company(
             detail="Somente administrador pode excluir empresas."
         )
 
-    company = get_or_404(db, Company, company_id)
+    get_or_404(db, Company, company_id)
+
+    has_records = db.execute(
+        select(*[
+            exists().where(model.company_id == company_id)
+            for model in (AsoRecord, NR17Record, LTCATRecord)
+        ])
+    ).one()
+
+    if any(has_records):
+        modules = [name for name, found in zip(("ASO", "NR-17", "LTCAT"), has_records) if found]
+        raise HTTPException(
+            status_code=409,
+            detail=f"Empresa possui registros de {', '.join(modules)}. Exclua-os antes de excluir a empresa."
+        )
+
+    # company_id está em todos os nós do PGR: um DELETE por tabela,
+    # sem subir pela cadeia de pais
+    for model in (Action, Risk, Hazard, Sector):
+        log_changes(db, model, model.company_id == company_id, op="delete")
+        db.execute(delete(model).where(model.company_id == company_id))
 
-    db.delete(company)
+    for model in (AsoPeriodicity, CompanySummary, CompanyAgentCount):
+        db.execute(delete(model).where(model.company_id == company_id))
+
+    bump_versions(db, "pgr", [company_id])
+    owner_id = delete_returning(db, Company, company_id).owner_id
     db.commit()
 
+    invalidate_principal(owner_id)
+    invalidate_dashboards(company_id)
+
     return {"msg": "Empresa excluída com sucesso."}
 
 
@@ -141,16 +452,8 @@ def create_sector(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    company_id = data.get("company_id")
-
-    if not validate_company_access(company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
-
-    sector = Sector(**data)
-
-    db.add(sector)
+    sector = create_node(db, Sector, data, current_user)
     db.commit()
-    db.refresh(sector)
 
     return sector
 
@@ -158,13 +461,22 @@ def create_sector(
 @router.get("/sectors/by-company/{company_id}")
 def list_sectors_by_company(
     company_id: int,
+    request: Request,
+    response: Response,
+    page: dict = Depends(page_params),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    if not validate_company_access(company_id, current_user, db):
+    if not validate_company_access(db, company_id, current_user):
         raise HTTPException(status_code=403, detail="Sem permissão.")
 
-    return db.query(Sector).filter(Sector.company_id == company_id).all()
+    not_modified = conditional_response(request, response, db, ["pgr"], [company_id])
+    if not_modified:
+        return not_modified
+
+    query = db.query(Sector).filter(Sector.company_id == company_id)
+
+    return keyset_page(query, [Sector.id], **page)
 
 
 @router.get("/sectors/{sector_id}")
@@ -173,12 +485,7 @@ def get_sector(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    sector = get_or_404(db, Sector, sector_id)
-
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
-
-    return sector
+    return get_authorized_or_404(db, Sector, sector_id, current_user)
 
 
 @router.put("/sectors/{sector_id}")
@@ -188,17 +495,8 @@ def update_sector(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    sector = get_or_404(db, Sector, sector_id)
-
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
-
-    for k, v in data.items():
-        if hasattr(sector, k):
-            setattr(sector, k, v)
-
+    sector = update_node(db, Sector, sector_id, data, current_user)
     db.commit()
-    db.refresh(sector)
 
     return sector
 
@@ -209,12 +507,10 @@ def delete_sector(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    sector = get_or_404(db, Sector, sector_id)
-
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
+    sector = get_authorized_or_404(db, Sector, sector_id, current_user)
 
-    db.delete(sector)
+    bump_versions(db, "pgr", [sector.company_id])
+    delete_subtree(db, Sector, Sector.id == sector.id)
     db.commit()
 
     return {"msg": "Setor excluído com sucesso."}
@@ -226,16 +522,8 @@ def create_hazard(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    sector = get_or_404(db, Sector, data.get("sector_id"))
-
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
-
-    hazard = Hazard(**data)
-
-    db.add(hazard)
+    hazard = create_node(db, Hazard, data, current_user)
     db.commit()
-    db.refresh(hazard)
 
     return hazard
 
@@ -243,15 +531,21 @@ def create_hazard(
 @router.get("/hazards/by-sector/{sector_id}")
 def list_hazards_by_sector(
     sector_id: int,
+    request: Request,
+    response: Response,
+    page: dict = Depends(page_params),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    sector = get_or_404(db, Sector, sector_id)
+    sector = get_authorized_or_404(db, Sector, sector_id, current_user)
 
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
+    not_modified = conditional_response(request, response, db, ["pgr"], [sector.company_id])
+    if not_modified:
+        return not_modified
 
-    return db.query(Hazard).filter(Hazard.sector_id == sector_id).all()
+    query = db.query(Hazard).filter(Hazard.sector_id == sector_id)
+
+    return keyset_page(query, [Hazard.id], **page)
 
 
 @router.get("/hazards/{hazard_id}")
@@ -260,13 +554,7 @@ def get_hazard(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    hazard = get_or_404(db, Hazard, hazard_id)
-    sector = get_or_404(db, Sector, hazard.sector_id)
-
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
-
-    return hazard
+    return get_authorized_or_404(db, Hazard, hazard_id, current_user)
 
 
 @router.put("/hazards/{hazard_id}")
@@ -276,18 +564,8 @@ def update_hazard(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    hazard = get_or_404(db, Hazard, hazard_id)
-    sector = get_or_404(db, Sector, hazard.sector_id)
-
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
-
-    for k, v in data.items():
-        if hasattr(hazard, k):
-            setattr(hazard, k, v)
-
+    hazard = update_node(db, Hazard, hazard_id, data, current_user)
     db.commit()
-    db.refresh(hazard)
 
     return hazard
 
@@ -298,13 +576,10 @@ def delete_hazard(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    hazard = get_or_404(db, Hazard, hazard_id)
-    sector = get_or_404(db, Sector, hazard.sector_id)
+    hazard = get_authorized_or_404(db, Hazard, hazard_id, current_user)
 
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
-
-    db.delete(hazard)
+    bump_versions(db, "pgr", [hazard.company_id])
+    delete_subtree(db, Hazard, Hazard.id == hazard.id)
     db.commit()
 
     return {"msg": "Perigo excluído com sucesso."}
@@ -316,17 +591,8 @@ def create_risk(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    hazard = get_or_404(db, Hazard, data.get("hazard_id"))
-    sector = get_or_404(db, Sector, hazard.sector_id)
-
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
-
-    risk = Risk(**data)
-
-    db.add(risk)
+    risk = create_node(db, Risk, data, current_user)
     db.commit()
-    db.refresh(risk)
 
     return risk
 
@@ -334,16 +600,25 @@ def create_risk(
 @router.get("/risks/by-hazard/{hazard_id}")
 def list_risks_by_hazard(
     hazard_id: int,
+    request: Request,
+    response: Response,
+    page: dict = Depends(page_params),
+    nivel: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    hazard = get_or_404(db, Hazard, hazard_id)
-    sector = get_or_404(db, Sector, hazard.sector_id)
+    hazard = get_authorized_or_404(db, Hazard, hazard_id, current_user)
 
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
+    not_modified = conditional_response(request, response, db, ["pgr"], [hazard.company_id])
+    if not_modified:
+        return not_modified
+
+    query = db.query(Risk).filter(Risk.hazard_id == hazard_id)
+
+    if nivel:
+        query = query.filter(Risk.nivel == nivel)
 
-    return db.query(Risk).filter(Risk.hazard_id == hazard_id).all()
+    return keyset_page(query, [Risk.id], **page)
 
 
 @router.get("/risks/{risk_id}")
@@ -352,14 +627,7 @@ def get_risk(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    risk = get_or_404(db, Risk, risk_id)
-    hazard = get_or_404(db, Hazard, risk.hazard_id)
-    sector = get_or_404(db, Sector, hazard.sector_id)
-
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
-
-    return risk
+    return get_authorized_or_404(db, Risk, risk_id, current_user)
 
 
 @router.put("/risks/{risk_id}")
@@ -369,19 +637,8 @@ def update_risk(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    risk = get_or_404(db, Risk, risk_id)
-    hazard = get_or_404(db, Hazard, risk.hazard_id)
-    sector = get_or_404(db, Sector, hazard.sector_id)
-
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
-
-    for k, v in data.items():
-        if hasattr(risk, k):
-            setattr(risk, k, v)
-
+    risk = update_node(db, Risk, risk_id, data, current_user)
     db.commit()
-    db.refresh(risk)
 
     return risk
 
@@ -392,14 +649,10 @@ def delete_risk(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    risk = get_or_404(db, Risk, risk_id)
-    hazard = get_or_404(db, Hazard, risk.hazard_id)
-    sector = get_or_404(db, Sector, hazard.sector_id)
+    risk = get_authorized_or_404(db, Risk, risk_id, current_user)
 
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
-
-    db.delete(risk)
+    bump_versions(db, "pgr", [risk.company_id])
+    delete_subtree(db, Risk, Risk.id == risk.id)
     db.commit()
 
     return {"msg": "Risco excluído com sucesso."}
@@ -411,18 +664,8 @@ def create_action(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    risk = get_or_404(db, Risk, data.get("risk_id"))
-    hazard = get_or_404(db, Hazard, risk.hazard_id)
-    sector = get_or_404(db, Sector, hazard.sector_id)
-
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
-
-    action = Action(**data)
-
-    db.add(action)
+    action = create_node(db, Action, data, current_user)
     db.commit()
-    db.refresh(action)
 
     return action
 
@@ -430,17 +673,83 @@ def create_action(
 @router.get("/actions/by-risk/{risk_id}")
 def list_actions_by_risk(
     risk_id: int,
+    request: Request,
+    response: Response,
+    page: dict = Depends(page_params),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    risk = get_or_404(db, Risk, risk_id)
-    hazard = get_or_404(db, Hazard, risk.hazard_id)
-    sector = get_or_404(db, Sector, hazard.sector_id)
+    risk = get_authorized_or_404(db, Risk, risk_id, current_user)
 
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
+    not_modified = conditional_response(request, response, db, ["pgr"], [risk.company_id])
+    if not_modified:
+        return not_modified
+
+    query = db.query(Action).filter(Action.risk_id == risk_id)
+
+    return keyset_page(query, [Action.id], **page)
 
-    return db.query(Action).filter(Action.risk_id == risk_id).all()
+
+@router.get("/actions/due")
+def list_due_actions(
+    request: Request,
+    response: Response,
+    dias: int = Query(30, ge=0, le=365),
+    situacao: Optional[Literal["atrasadas", "a_vencer"]] = None,
+    company_id: Optional[int] = None,
+    page: dict = Depends(page_params),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Ações em aberto vencidas e / ou vencendo nos próximos `dias`, em
+    todas as empresas do usuário (ou só em company_id), por prazo.
+    """
+    if company_id is not None:
+        if not validate_company_access(db, company_id, current_user):
+            raise HTTPException(status_code=403, detail="Sem permissão.")
+        company_ids = [company_id]
+    else:
+        company_ids = scope_company_ids(current_user)
+
+    today = date.today()
+
+    not_modified = conditional_response(
+        request, response, db, ["pgr"], company_ids, today.isoformat()
+    )
+    if not_modified:
+        return not_modified
+
+    result = keyset_page(
+        due_actions_query(db, company_ids, today, dias, situacao),
+        [Action.prazo, Action.id],
+        **page,
+    )
+
+    result["items"] = [
+        {
+            **row._mapping,
+            "dias_restantes": (row.prazo - today).days,
+            "atrasada": row.prazo < today,
+        }
+        for row in result["items"]
+    ]
+
+    return result
+
+
+@router.post("/actions/sweep-overdue")
+def sweep_overdue_actions(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Marca agora como Atrasada as ações vencidas do escopo do usuário."""
+    touched = mark_overdue(db, company_ids=scope_company_ids(current_user))
+    db.commit()
+
+    invalidate_dashboards(*touched)
+
+    return {"empresas": sorted(touched)}
 
 
 @router.get("/actions/{action_id}")
@@ -449,15 +758,7 @@ def get_action(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    action = get_or_404(db, Action, action_id)
-    risk = get_or_404(db, Risk, action.risk_id)
-    hazard = get_or_404(db, Hazard, risk.hazard_id)
-    sector = get_or_404(db, Sector, hazard.sector_id)
-
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
-
-    return action
+    return get_authorized_or_404(db, Action, action_id, current_user)
 
 
 @router.put("/actions/{action_id}")
@@ -467,20 +768,8 @@ def update_action(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    action = get_or_404(db, Action, action_id)
-    risk = get_or_404(db, Risk, action.risk_id)
-    hazard = get_or_404(db, Hazard, risk.hazard_id)
-    sector = get_or_404(db, Sector, hazard.sector_id)
-
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
-
-    for k, v in data.items():
-        if hasattr(action, k):
-            setattr(action, k, v)
-
+    action = update_node(db, Action, action_id, data, current_user)
     db.commit()
-    db.refresh(action)
 
     return action
 
@@ -491,15 +780,404 @@ def delete_action(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    action = get_or_404(db, Action, action_id)
-    risk = get_or_404(db, Risk, action.risk_id)
-    hazard = get_or_404(db, Hazard, risk.hazard_id)
-    sector = get_or_404(db, Sector, hazard.sector_id)
+    action = delete_returning(db, Action, action_id, *scope_filter(Action, current_user))
 
-    if not validate_company_access(sector.company_id, current_user, db):
-        raise HTTPException(status_code=403, detail="Sem permissão.")
+    if action is None:
+        # fora do escopo em cache: get_authorized_or_404 confere no banco
+        get_authorized_or_404(db, Action, action_id, current_user)
+        action = delete_returning(db, Action, action_id)
 
-    db.delete(action)
+    bump_versions(db, "pgr", [action.company_id])
     db.commit()
 
     return {"msg": "Ação excluída com sucesso."}
+
+
+# ============================================================
+# LOTES — inventário inteiro numa requisição
+# ============================================================
+# POST .../bulk recebe a subárvore aninhada abaixo de um nó existente:
+#
+#   POST /pgr/companies/1/bulk
+#   {"sectors": [{"nome": "Solda", "hazards": [{"nome": "Ruído",
+#       "risks": [{"probabilidade": 3, "actions": [{...}]}]}]}]}
+#
+# O pai é autorizado uma vez; cada nível é um INSERT multi-linha com
+# RETURNING id, e os ids devolvidos viram o FK do nível de baixo. Tudo
+# num commit só. PUT /pgr/bulk altera nós existentes em executemany.
+BULK_MAX_NODES = 5000
+
+LEVELS = {key: model for key, model in CHILDREN.values()}
+
+
+def _node_list(value, key: str):
+    if value is None:
+        return []
+
+    if not isinstance(value, list) or not all(isinstance(item, dict) for item in value):
+        raise HTTPException(status_code=400, detail=f"{key} deve ser uma lista de objetos.")
+
+    return value
+
+
+def insert_subtree(db: Session, parent_model, parent_id: int, company_id: int, payload: dict):
+    """Insere a subárvore nível a nível; devolve os ids por nível (em largura)."""
+    pending = [(parent_id, payload)]
+    model = parent_model
+    created = {}
+    total = 0
+
+    while model in CHILDREN and pending:
+        key, child = CHILDREN[model]
+        parent_key = PARENTS[child][0]
+        grandchildren_key = CHILDREN[child][0] if child in CHILDREN else None
+
+        rows = []
+        nodes = []
+
+        for node_parent_id, node in pending:
+            for item in _node_list(node.get(key), key):
+                data = {k: v for k, v in item.items() if k != grandchildren_key}
+                values = node_values(child, data, strict=True)
+                values[parent_key] = node_parent_id
+                values["company_id"] = company_id
+
+                rows.append(values)
+                nodes.append(item)
+
+        if not rows:
+            break
+
+        total += len(rows)
+        if total > BULK_MAX_NODES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Lote excede o limite de {BULK_MAX_NODES} itens."
+            )
+
+        ids = insert_many_returning(db, child, rows)
+        log_changes(db, child, child.id.in_(ids))
+
+        created[key] = ids
+        pending = list(zip(ids, nodes))
+        model = child
+
+    return created
+
+
+def bulk_create(db: Session, parent_model, parent_id: int, payload: dict, current_user: User):
+    if parent_model is Company:
+        if not validate_company_access(db, parent_id, current_user):
+            raise HTTPException(status_code=403, detail="Sem permissão.")
+        get_or_404(db, Company, parent_id)
+        company_id = parent_id
+    else:
+        company_id = get_authorized_or_404(db, parent_model, parent_id, current_user).company_id
+
+    created = insert_subtree(db, parent_model, parent_id, company_id, payload)
+
+    if created:
+        bump_versions(db, "pgr", [company_id])
+
+    db.commit()
+
+    return {
+        "criados": {key: len(ids) for key, ids in created.items()},
+        "ids": created,
+    }
+
+
+@router.post("/companies/{company_id}/bulk", status_code=status.HTTP_201_CREATED)
+def bulk_create_sectors(
+    company_id: int,
+    data: dict,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    return bulk_create(db, Company, company_id, data, current_user)
+
+
+@router.post("/sectors/{sector_id}/bulk", status_code=status.HTTP_201_CREATED)
+def bulk_create_hazards(
+    sector_id: int,
+    data: dict,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    return bulk_create(db, Sector, sector_id, data, current_user)
+
+
+@router.post("/hazards/{hazard_id}/bulk", status_code=status.HTTP_201_CREATED)
+def bulk_create_risks(
+    hazard_id: int,
+    data: dict,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    return bulk_create(db, Hazard, hazard_id, data, current_user)
+
+
+@router.post("/risks/{risk_id}/bulk", status_code=status.HTTP_201_CREATED)
+def bulk_create_actions(
+    risk_id: int,
+    data: dict,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    return bulk_create(db, Risk, risk_id, data, current_user)
+
+
+def bulk_update_level(db: Session, model, key: str, items, current_user: User):
+    """
+    Confere tudo com um SELECT (existência, permissão por empresa,
+    versão e pai) e grava com um UPDATE executemany que repete a versão
+    lida no WHERE. Troca de pai não entra no lote: usar o PUT do item,
+    que replica o company_id.
+    """
+    parent_key = PARENTS[model][0]
+    rows = []
+
+    for item in items:
+        data = dict(item)
+        record_id = data.pop("id", None)
+
+        if not isinstance(record_id, int):
+            raise HTTPException(status_code=400, detail=f"Item sem id em {key}.")
+
+        version = pop_version(data)
+        values = node_values(model, data, strict=True)
+
+        if parent_key != "company_id":
+            values.pop("company_id", None)
+
+        rows.append((record_id, version, values))
+
+    ids = [record_id for record_id, _, _ in rows]
+
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail=f"Ids repetidos em {key}.")
+
+    parent_column = getattr(model, parent_key)
+    current = {
+        row.id: row
+        for row in db.execute(
+            select(model.id, model.company_id, model.version, parent_column.label("parent_id"))
+            .where(model.id.in_(ids))
+        )
+    }
+
+    missing = [record_id for record_id in ids if record_id not in current]
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"{key}: registros não encontrados: {', '.join(map(str, missing))}."
+        )
+
+    company_ids = {row.company_id for row in current.values()}
+    for company_id in company_ids:
+        if not validate_company_access(db, company_id, current_user):
+            raise HTTPException(status_code=403, detail="Sem permissão.")
+
+    conflicts = [
+        record_id for record_id, version, _ in rows
+        if version is not None and version != current[record_id].version
+    ]
+    if conflicts:
+        raise HTTPException(
+            status_code=409,
+            detail=f"{VERSION_CONFLICT} ({key}: {', '.join(map(str, conflicts))})"
+        )
+
+    moved = [
+        record_id for record_id, _, values in rows
+        if parent_key in values and values[parent_key] != current[record_id].parent_id
+    ]
+    if moved:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Troca de pai não é aceita no lote ({key}: {', '.join(map(str, moved))}). Use o PUT do item."
+        )
+
+    # versão no WHERE: sem ela, uma gravação entre o SELECT e o UPDATE
+    # seria sobrescrita (item sem version: vale a versão lida acima)
+    updated = update_many(db, model, [
+        {"id": record_id, "version": current[record_id].version, **values}
+        for record_id, _, values in rows
+    ])
+
+    if updated != len(rows):
+        db.rollback()
+        raise HTTPException(status_code=409, detail=f"{VERSION_CONFLICT} ({key})")
+
+    log_changes(db, model, model.id.in_(ids))
+
+    return company_ids
+
+
+@router.put("/bulk")
+def bulk_update(
+    data: dict,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    {"sectors": [{"id": 1, "version": 3, "nome": "..."}], "hazards": [...],
+    "risks": [...], "actions": [...]} — tudo ou nada, um commit.
+    """
+    unknown = sorted(set(data) - set(LEVELS))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campo inválido: {', '.join(unknown)}.")
+
+    levels = {key: _node_list(data.get(key), key) for key in LEVELS}
+
+    if sum(len(items) for items in levels.values()) > BULK_MAX_NODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Lote excede o limite de {BULK_MAX_NODES} itens."
+        )
+
+    company_ids = set()
+    updated = {}
+
+    for key, items in levels.items():
+        if items:
+            company_ids |= bulk_update_level(db, LEVELS[key], key, items, current_user)
+            updated[key] = len(items)
+
+    if company_ids:
+        bump_versions(db, "pgr", company_ids)
+
+    db.commit()
+
+    return {"atualizados": updated}
+
+
+# ============================================================
+# CLONAGEM DE MODELO ENTRE EMPRESAS
+# ============================================================
+@router.post("/companies/{src_company_id}/clone-to/{dst_company_id}", status_code=status.HTTP_201_CREATED)
+def clone_company_tree(
+    src_company_id: int,
+    dst_company_id: int,
+    setor_id: Optional[List[int]] = Query(None, description="só estes setores da origem"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Copia o inventário (setores, perigos, riscos e ações) de uma empresa
+    para outra, inteiro no banco (pgr_clone). Ações chegam pendentes e
+    sem prazo.
+    """
+    for company_id in (src_company_id, dst_company_id):
+        if not validate_company_access(db, company_id, current_user):
+            raise HTTPException(status_code=403, detail="Sem permissão.")
+
+        get_or_404(db, Company, company_id)
+
+    created = clone_tree(db, src_company_id, dst_company_id, setor_id)
+
+    bump_versions(db, "pgr", [dst_company_id])
+    db.commit()
+
+    return {"criados": created}
+
+
+# ============================================================
+# MATRIZ DE RISCO (probabilidade × severidade)
+# ============================================================
+# score e nivel são colunas geradas em Risk: o mapa de calor e as
+# contagens por setor saem de um GROUP BY só; o top N usa o índice
+# (company_id, score).
+RISK_MATRIX_SIZE = 5
+
+
+@router.get("/companies/{company_id}/risk-matrix")
+def get_risk_matrix(
+    company_id: int,
+    request: Request,
+    response: Response,
+    top: int = Query(10, ge=0, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    matriz[p - 1][s - 1] = riscos com probabilidade p e severidade s;
+    niveis / setores = contagem por nível; maiores = os `top` riscos de
+    maior score.
+    """
+    if not validate_company_access(db, company_id, current_user):
+        raise HTTPException(status_code=403, detail="Sem permissão.")
+
+    not_modified = conditional_response(request, response, db, ["pgr"], [company_id])
+    if not_modified:
+        return not_modified
+
+    levels = [label for _, label in RISK_LEVELS] + [RISK_LEVEL_MAX]
+
+    rows = (
+        db.query(
+            Sector.id, Sector.nome,
+            Risk.probabilidade, Risk.severidade, Risk.nivel,
+            func.count(),
+        )
+        .join(Hazard, Hazard.id == Risk.hazard_id)
+        .join(Sector, Sector.id == Hazard.sector_id)
+        .filter(Risk.company_id == company_id)
+        .group_by(Sector.id, Sector.nome, Risk.probabilidade, Risk.severidade, Risk.nivel)
+        .all()
+    )
+
+    matrix = [[0] * RISK_MATRIX_SIZE for _ in range(RISK_MATRIX_SIZE)]
+    totals = dict.fromkeys(levels, 0)
+    sectors = {}
+    unrated = 0
+
+    for sector_id, sector_nome, probabilidade, severidade, nivel, count in rows:
+        sector = sectors.setdefault(sector_id, {
+            "sector_id": sector_id,
+            "nome": sector_nome,
+            "total": 0,
+            "niveis": dict.fromkeys(levels, 0),
+            "sem_avaliacao": 0,
+        })
+        sector["total"] += count
+
+        if nivel is None:
+            sector["sem_avaliacao"] += count
+            unrated += count
+            continue
+
+        sector["niveis"][nivel] += count
+        totals[nivel] += count
+
+        if 1 <= probabilidade <= RISK_MATRIX_SIZE and 1 <= severidade <= RISK_MATRIX_SIZE:
+            matrix[probabilidade - 1][severidade - 1] += count
+
+    highest = []
+
+    if top:
+        highest = [
+            dict(row._mapping)
+            for row in (
+                db.query(
+                    Risk.id, Risk.probabilidade, Risk.severidade,
+                    Risk.score, Risk.nivel, Risk.medidas_existentes,
+                    Hazard.id.label("hazard_id"), Hazard.nome.label("hazard_nome"),
+                    Sector.id.label("sector_id"), Sector.nome.label("sector_nome"),
+                )
+                .join(Hazard, Hazard.id == Risk.hazard_id)
+                .join(Sector, Sector.id == Hazard.sector_id)
+                .filter(Risk.company_id == company_id, Risk.score.isnot(None))
+                .order_by(Risk.score.desc(), Risk.id)
+                .limit(top)
+            )
+        ]
+
+    return {
+        "company_id": company_id,
+        "matriz": matrix,
+        "niveis": totals,
+        "sem_avaliacao": unrated,
+        "setores": sorted(sectors.values(), key=lambda s: s["sector_id"]),
+        "maiores": highest,
+    }
@@ -0,0 +1,212 @@
+import os
+from datetime import datetime, timedelta
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models import IdempotencyKey, User
+from routers.auth_router import get_current_user
+from routers import nr17_router, ltcat_router
+from tenancy import scope_company_ids
+from changelog import SYNC_ENTITIES, SYNC_PAGE_SIZE, changes_since
+from versions import bump_versions
+from dashboard_cache import invalidate_dashboards
+from dosimetry import remove_pending, discard_pending
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["Sincronização"]
+)
+
+
+@router.get("/changes")
+def list_changes(
+    since: int = Query(0, ge=0),
+    entidades: Optional[str] = Query(None, description="ex.: nr17,ltcat"),
+    limit: int = Query(SYNC_PAGE_SIZE, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Registros criados / alterados / excluídos depois do cursor `since`
+    (0 = carga completa). O cliente aplica upserts e deletes e guarda o
+    `cursor` devolvido; com has_more=true, pede de novo a partir dele.
+    """
+    entities = None
+
+    if entidades:
+        entities = {e.strip() for e in entidades.split(",") if e.strip()}
+        unknown = entities - set(SYNC_ENTITIES)
+
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Entidades inválidas: {', '.join(sorted(unknown))}."
+            )
+
+    return changes_since(db, since, scope_company_ids(current_user), entities, limit)
+
+
+# ============================================================
+# ENVIO EM LOTE (fila offline) — /sync/push
+# ============================================================
+# O cliente guarda os formulários numa fila local, cada um com uma
+# chave gerada por ele, e manda a fila inteira de uma vez. O lote é
+# aplicado em ordem numa transação só (tudo ou nada); as chaves
+# aplicadas ficam em idempotency_keys, então reenviar o mesmo lote
+# depois de uma falha de rede não duplica nada.
+
+PUSH_MODULES = {
+    "nr17": nr17_router,
+    "ltcat": ltcat_router,
+}
+
+PUSH_MAX_ITEMS = 500
+IDEMPOTENCY_TTL_DAYS = int(os.environ.get("IDEMPOTENCY_TTL_DAYS", "30"))
+
+
+class PushItem(BaseModel):
+    key: str = Field(..., min_length=1, max_length=100)
+    modulo: Literal["nr17", "ltcat"]
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+    # update / delete de um registro criado antes (mesmo lote ou não)
+    ref: Optional[str] = Field(None, max_length=100)
+    data: dict = Field(default_factory=dict)
+
+
+class PushBatch(BaseModel):
+    items: List[PushItem] = Field(..., min_length=1, max_length=PUSH_MAX_ITEMS)
+
+
+def apply_item(db: Session, item: PushItem, record_id: Optional[int], current_user: User):
+    """Aplica um item; devolve (status, registro ou None)."""
+    module = PUSH_MODULES[item.modulo]
+
+    if item.op == "create":
+        return "aplicado", module.create_record(db, dict(item.data), current_user)
+
+    if record_id is None:
+        raise HTTPException(status_code=400, detail="Informe id ou ref do registro.")
+
+    if item.op == "update":
+        return "aplicado", module.update_record(db, record_id, dict(item.data), current_user)
+
+    try:
+        return "aplicado", module.delete_record(db, record_id, current_user)
+    except HTTPException as e:
+        # já excluído (por outro cliente): o objetivo do item foi atingido
+        if e.status_code == 404:
+            return "ausente", None
+        raise
+
+
+@router.post("/push")
+def push_changes(
+    batch: PushBatch,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    keys = [item.key for item in batch.items]
+
+    if len(set(keys)) != len(keys):
+        raise HTTPException(status_code=400, detail="Chaves de idempotência repetidas no lote.")
+
+    refs = {item.ref for item in batch.items if item.ref}
+
+    applied = {
+        row.idempotency_key: row
+        for row in db.query(IdempotencyKey).filter(
+            IdempotencyKey.user_id == current_user.id,
+            IdempotencyKey.idempotency_key.in_(sorted(set(keys) | refs)),
+        )
+    }
+
+    record_ids = {key: row.record_id for key, row in applied.items()}
+    new_keys = []
+    results = []
+    touched = {modulo: set() for modulo in PUSH_MODULES}
+
+    for index, item in enumerate(batch.items):
+        if item.key in applied:
+            results.append({"key": item.key, "status": "duplicado", "id": applied[item.key].record_id})
+            continue
+
+        record_id = item.id if item.id is not None else record_ids.get(item.ref)
+
+        try:
+            status, record = apply_item(db, item, record_id, current_user)
+        except (HTTPException, TypeError) as e:
+            db.rollback()
+            discard_pending(db)
+
+            raise HTTPException(
+                status_code=getattr(e, "status_code", 400),
+                detail={
+                    "item": index,
+                    "key": item.key,
+                    "detail": getattr(e, "detail", f"Campo inválido: {e}"),
+                },
+            )
+
+        if record is not None:
+            record_id = record.id
+            touched[item.modulo].add(record.company_id)
+
+        record_ids[item.key] = record_id
+        results.append({"key": item.key, "status": status, "id": record_id})
+        new_keys.append({
+            "user_id": current_user.id,
+            "idempotency_key": item.key,
+            "modulo": item.modulo,
+            "op": item.op,
+            "record_id": record_id,
+        })
+
+    for modulo, company_ids in touched.items():
+        if company_ids:
+            bump_versions(db, modulo, company_ids)
+
+    now = datetime.utcnow()
+
+    for row in new_keys:
+        row["criado_em"] = now
+
+    try:
+        if new_keys:
+            db.execute(insert(IdempotencyKey.__table__), new_keys)
+
+        db.commit()
+    except IntegrityError:
+        # o mesmo lote chegou por outra requisição ao mesmo tempo
+        db.rollback()
+        discard_pending(db)
+        raise HTTPException(
+            status_code=409,
+            detail="Lote já em processamento. Reenvie para obter o resultado."
+        )
+
+    remove_pending(db)
+    invalidate_dashboards(*set().union(*touched.values()))
+
+    # limpeza das chaves antigas do usuário (fora da transação do lote)
+    (
+        db.query(IdempotencyKey)
+        .filter(
+            IdempotencyKey.user_id == current_user.id,
+            IdempotencyKey.criado_em < now - timedelta(days=IDEMPOTENCY_TTL_DAYS),
+        )
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+
+    return {
+        "aplicados": sum(1 for r in results if r["status"] != "duplicado"),
+        "duplicados": sum(1 for r in results if r["status"] == "duplicado"),
+        "itens": results,
+    }
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from database import get_db
+from models import User
+from routers.auth_router import get_current_user
+from tenancy import is_admin
+from workers import search_workers, reindex_all
+
+router = APIRouter(
+    prefix="/api/workers",
+    tags=["Trabalhadores"]
+)
+
+
+@router.get("/search")
+def search(
+    q: str = Query(..., min_length=2, max_length=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Tudo o que existe sobre um trabalhador (CPF ou início do nome) nos
+    três módulos: ASOs, avaliações NR-17 e LTCAT da função / setor.
+    """
+    company_ids = None if is_admin(current_user) else current_user.owned_company_ids
+
+    result = search_workers(db, q, company_ids)
+
+    if result is None:
+        raise HTTPException(status_code=400, detail="Informe um nome ou CPF para buscar.")
+
+    return result
+
+
+@router.post("/reindex")
+def reindex(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Somente administrador pode reindexar.")
+
+    total = reindex_all(db)
+    db.commit()
+
+    return {"indexados": total}
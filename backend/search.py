@@ -0,0 +1,151 @@
+from datetime import date
+from typing import Optional
+
+from sqlalchemy import DDL, event, inspect, or_, text
+from sqlalchemy.engine import Engine
+
+from models import AsoRecord, NR17Record, LTCATRecord
+
+
+# ============================================================
+# FILTROS E BUSCA TEXTUAL DOS /records
+# ============================================================
+# Filtros estruturados (setor, função, risco...) usam os índices
+# B-tree compostos (company_id, coluna, ...) de models.py.
+#
+# Busca livre (?q=) é "contém", como o filtro que existia no front:
+# - Postgres: ILIKE '%termo%' por coluna, com índices GIN pg_trgm
+#   (migrations/008_records_search.sql);
+# - SQLite: tabela FTS5 com tokenizer trigram, mantida por triggers.
+#   Termos com menos de 3 letras caem no LIKE.
+
+SEARCH_COLUMNS = {
+    AsoRecord: ["nome", "cpf", "funcao", "setor"],
+    NR17Record: ["empresa", "setor", "funcao", "trabalhador", "risco"],
+    LTCATRecord: ["empresa", "setor", "funcao", "agente"],
+}
+
+TRIGRAM_MIN_LENGTH = 3
+
+
+def _fts_table(model) -> str:
+    return f"{model.__tablename__}_fts"
+
+
+def _sqlite_fts_ddl(model):
+    table = model.__tablename__
+    fts = _fts_table(model)
+    cols = SEARCH_COLUMNS[model]
+    col_list = ", ".join(cols)
+    new_values = ", ".join(f"new.{c}" for c in cols)
+    old_values = ", ".join(f"old.{c}" for c in cols)
+
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{col_list}, content='{table}', content_rowid='id', tokenize='trigram')",
+
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {col_list}) VALUES (new.id, {new_values}); END",
+
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.id, {old_values}); END",
+
+        # só reindexa quando muda uma coluna da busca
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {col_list} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {col_list}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {col_list}) VALUES (new.id, {new_values}); END",
+    ]
+
+
+# create_all no SQLite (dev / testes) já cria o índice FTS junto
+for _model in SEARCH_COLUMNS:
+    for _stmt in _sqlite_fts_ddl(_model):
+        event.listen(_model.__table__, "after_create", DDL(_stmt).execute_if(dialect="sqlite"))
+
+    event.listen(
+        _model.__table__,
+        "before_drop",
+        DDL(f"DROP TABLE IF EXISTS {_fts_table(_model)}").execute_if(dialect="sqlite"),
+    )
+
+
+def ensure_search_indexes(bind: Engine):
+    """
+    Cria (e popula) o FTS de bancos SQLite criados antes dele e
+    atualiza as estatísticas do planner: sem elas o SQLite prefere o
+    índice de company_id à busca FTS e varre o tenant inteiro.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+
+    existing = set(inspect(bind).get_table_names())
+    built = False
+
+    with bind.begin() as conn:
+        for model in SEARCH_COLUMNS:
+            fts = _fts_table(model)
+
+            if model.__tablename__ not in existing or fts in existing:
+                continue
+
+            for stmt in _sqlite_fts_ddl(model):
+                conn.exec_driver_sql(stmt)
+
+            conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+            built = True
+
+        conn.exec_driver_sql("ANALYZE" if built else "PRAGMA optimize")
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def filter_text(query, model, q: Optional[str]):
+    term = (q or "").strip()
+
+    if not term:
+        return query
+
+    dialect = query.session.bind.dialect.name
+
+    if dialect == "sqlite" and len(term) >= TRIGRAM_MIN_LENGTH:
+        fts = _fts_table(model)
+        match = '"' + term.replace('"', '""') + '"'
+
+        return query.filter(
+            model.id.in_(
+                text(f"SELECT rowid FROM {fts} WHERE {fts} MATCH :_match")
+                .bindparams(_match=match)
+            )
+        )
+
+    pattern = f"%{_escape_like(term)}%"
+
+    return query.filter(or_(*[
+        getattr(model, c).ilike(pattern, escape="\\")
+        for c in SEARCH_COLUMNS[model]
+    ]))
+
+
+def apply_record_filters(
+    query,
+    model,
+    equals: Optional[dict] = None,
+    date_column=None,
+    data_de: Optional[date] = None,
+    data_ate: Optional[date] = None,
+    q: Optional[str] = None,
+):
+    """Filtros das listagens: igualdade, intervalo de datas e busca livre."""
+    for column, value in (equals or {}).items():
+        if value:
+            query = query.filter(getattr(model, column) == value)
+
+    if date_column is not None:
+        if data_de:
+            query = query.filter(date_column >= data_de)
+        if data_ate:
+            query = query.filter(date_column <= data_ate)
+
+    return filter_text(query, model, q)
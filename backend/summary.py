@@ -0,0 +1,259 @@
+from collections import Counter, defaultdict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import (
+    AsoRecord, NR17Record, LTCATRecord,
+    CompanySummary, CompanyAgentCount,
+)
+
+
+# ============================================================
+# RESUMO POR EMPRESA (contadores do dashboard geral)
+# ============================================================
+# Os contadores são atualizados na mesma transação de cada
+# create / update / delete dos módulos, então o dashboard lê uma
+# linha por empresa em vez de varrer as tabelas de registros.
+#
+# Um "delta" é (company_id, {coluna: n}, {agente: n}).
+
+SUMMARY_COUNTERS = [
+    "total_aso", "total_nr17", "total_ltcat",
+    "nr17_score_sum", "nr17_score_count",
+    "nr17_baixo", "nr17_medio", "nr17_alto",
+]
+
+SummaryDelta = Tuple[Optional[int], Dict[str, int], Dict[str, int]]
+
+
+def nr17_bucket(risco: Optional[str]):
+    if not risco:
+        return None
+
+    n = str(risco).strip().lower()
+
+    if "baixo" in n:
+        return "nr17_baixo"
+    if "médio" in n or "medio" in n:
+        return "nr17_medio"
+    if "alto" in n:
+        return "nr17_alto"
+
+    return None
+
+
+def summary_deltas(record) -> SummaryDelta:
+    """Contribuição de um registro para o resumo da sua empresa."""
+    counters = {}
+    agents = {}
+
+    if isinstance(record, AsoRecord):
+        counters["total_aso"] = 1
+
+    elif isinstance(record, NR17Record):
+        counters["total_nr17"] = 1
+
+        if record.score is not None:
+            counters["nr17_score_sum"] = int(record.score)
+            counters["nr17_score_count"] = 1
+
+        bucket = nr17_bucket(record.risco)
+        if bucket:
+            counters[bucket] = 1
+
+    elif isinstance(record, LTCATRecord):
+        counters["total_ltcat"] = 1
+        agents[(record.agente or "").strip()] = 1
+
+    return record.company_id, counters, agents
+
+
+def _insert_for(db: Session):
+    dialect = db.bind.dialect.name
+
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+
+    return insert
+
+
+def increment_counters(db: Session, model, key: dict, deltas: dict, values: Optional[dict] = None):
+    """
+    INSERT ... ON CONFLICT DO UPDATE SET col = col + delta (atômico).
+    values: colunas gravadas como estão (ex.: data da última mudança).
+    """
+    table = model.__table__
+    insert = _insert_for(db)
+    values = values or {}
+
+    if insert is not None:
+        stmt = insert(table).values(**key, **deltas, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={**{k: table.c[k] + v for k, v in deltas.items()}, **values},
+        )
+        db.execute(stmt)
+        return
+
+    updated = (
+        db.query(model)
+        .filter_by(**key)
+        .update(
+            {**{table.c[k]: table.c[k] + v for k, v in deltas.items()}, **{table.c[k]: v for k, v in values.items()}},
+            synchronize_session=False,
+        )
+    )
+
+    if not updated:
+        db.add(model(**key, **deltas, **values))
+        db.flush()
+
+
+def track_summary(db: Session, before: Optional[SummaryDelta] = None, after: Optional[SummaryDelta] = None):
+    """
+    Aplica a diferença entre o estado anterior (before) e o novo
+    (after) de um registro. Create: só after. Delete: só before.
+    Não faz commit: roda na transação da rota.
+    """
+    counters = defaultdict(Counter)
+    agents = defaultdict(Counter)
+
+    for delta, sign in ((before, -1), (after, 1)):
+        if not delta:
+            continue
+
+        company_id, delta_counters, delta_agents = delta
+
+        if not company_id:
+            continue
+
+        for k, v in delta_counters.items():
+            counters[company_id][k] += sign * v
+        for k, v in delta_agents.items():
+            agents[company_id][k] += sign * v
+
+    for company_id in set(counters) | set(agents):
+        changed = {k: v for k, v in counters[company_id].items() if v}
+
+        if changed:
+            increment_counters(db, CompanySummary, {"company_id": company_id}, changed)
+
+        for agente, v in agents[company_id].items():
+            if v:
+                increment_counters(
+                    db, CompanyAgentCount,
+                    {"company_id": company_id, "agente": agente},
+                    {"total": v},
+                )
+
+
+def load_dashboard_geral(db: Session, company_ids=None):
+    """
+    Monta o dashboard geral a partir do resumo.
+    company_ids=None → todas as empresas (admin).
+    """
+    summary_query = db.query(
+        *[func.coalesce(func.sum(getattr(CompanySummary, c)), 0) for c in SUMMARY_COUNTERS]
+    )
+    agents_query = db.query(
+        CompanyAgentCount.agente,
+        func.sum(CompanyAgentCount.total).label("total"),
+    )
+
+    if company_ids is not None:
+        ids = sorted(company_ids)
+        summary_query = summary_query.filter(CompanySummary.company_id.in_(ids))
+        agents_query = agents_query.filter(CompanyAgentCount.company_id.in_(ids))
+
+    totals = dict(zip(SUMMARY_COUNTERS, (int(v) for v in summary_query.one())))
+
+    top_agents = (
+        agents_query
+        .group_by(CompanyAgentCount.agente)
+        .having(func.sum(CompanyAgentCount.total) > 0)
+        .order_by(func.sum(CompanyAgentCount.total).desc())
+        .limit(5)
+        .all()
+    )
+
+    score_count = totals["nr17_score_count"]
+
+    return {
+        "total_asos": totals["total_aso"],
+        "total_nr17": totals["total_nr17"],
+        "total_ltcat": totals["total_ltcat"],
+        "risco_medio_nr17": (totals["nr17_score_sum"] / score_count) if score_count else 0.0,
+        "distribuicao_modulos": {
+            "aso": totals["total_aso"],
+            "nr17": totals["total_nr17"],
+            "ltcat": totals["total_ltcat"],
+        },
+        "perfil_risco_nr17": {
+            "baixo": totals["nr17_baixo"],
+            "medio": totals["nr17_medio"],
+            "alto": totals["nr17_alto"],
+        },
+        "agentes_top5": [
+            {"nome": nome or "Agente não informado", "ocorrencias": int(total)}
+            for nome, total in top_agents
+        ],
+        "ultimas_atividades": [],
+    }
+
+
+def rebuild_nr17_summary(db: Session, company_ids=None):
+    """
+    Reconta os contadores NR-17 das empresas a partir da tabela (ex.:
+    depois de um rescore em lote) e aplica só a diferença.
+    company_ids=None → todas as empresas.
+    """
+    nr17_counters = [c for c in SUMMARY_COUNTERS if c.startswith("nr17_")]
+
+    actual_query = db.query(
+        NR17Record.company_id,
+        NR17Record.risco,
+        func.count(NR17Record.id),
+        func.count(NR17Record.score),
+        func.coalesce(func.sum(NR17Record.score), 0),
+    ).filter(NR17Record.company_id.isnot(None))
+
+    stored_query = db.query(CompanySummary)
+
+    if company_ids is not None:
+        ids = sorted(company_ids)
+        actual_query = actual_query.filter(NR17Record.company_id.in_(ids))
+        stored_query = stored_query.filter(CompanySummary.company_id.in_(ids))
+
+    actual = defaultdict(Counter)
+
+    for company_id, risco, total, score_count, score_sum in actual_query.group_by(
+        NR17Record.company_id, NR17Record.risco
+    ):
+        actual[company_id]["nr17_score_sum"] += int(score_sum)
+        actual[company_id]["nr17_score_count"] += int(score_count)
+
+        bucket = nr17_bucket(risco)
+        if bucket:
+            actual[company_id][bucket] += total
+
+    stored = {
+        row.company_id: {c: getattr(row, c) or 0 for c in nr17_counters}
+        for row in stored_query
+    }
+
+    for company_id in set(actual) | set(stored):
+        current = stored.get(company_id, {})
+        changed = {
+            c: actual[company_id][c] - current.get(c, 0)
+            for c in nr17_counters
+        }
+        changed = {k: v for k, v in changed.items() if v}
+
+        if changed:
+            increment_counters(db, CompanySummary, {"company_id": company_id}, changed)
@@ -0,0 +1,78 @@
+from typing import Optional
+
+from sqlalchemy import false
+from sqlalchemy.orm import Session
+
+from models import Company, User
+from routers.auth_router import invalidate_principal
+
+
+# ============================================================
+# ESCOPO DE EMPRESAS DO USUÁRIO (multi-tenant)
+# ============================================================
+# O conjunto de empresas do usuário já vem resolvido no Principal
+# (get_current_user, com cache), então as checagens abaixo não vão
+# ao banco no caminho comum.
+
+
+def is_admin(user: User):
+    return user.role == "admin"
+
+
+def get_default_company_id(current_user: User):
+    if is_admin(current_user):
+        return current_user.company_id
+
+    # mesma regra de antes: empresa mais recente do usuário
+    return max(current_user.owned_company_ids, default=None)
+
+
+def validate_company_access(db: Session, company_id: Optional[int], current_user: User):
+    if is_admin(current_user):
+        return True
+
+    if not company_id:
+        return False
+
+    if company_id in current_user.owned_company_ids:
+        return True
+
+    # A empresa pode ter sido criada por outro worker depois que o
+    # Principal entrou no cache; confirma no banco antes de negar.
+    owned = (
+        db.query(Company.id)
+        .filter(
+            Company.id == company_id,
+            Company.owner_id == current_user.id
+        )
+        .first()
+    )
+
+    if owned:
+        invalidate_principal(current_user.id)
+        return True
+
+    return False
+
+
+def scope_filter(model, current_user: User):
+    """Critérios do escopo do usuário (admin: nenhum), para query ou UPDATE / DELETE."""
+    if is_admin(current_user):
+        return []
+
+    company_ids = current_user.owned_company_ids
+
+    if not company_ids:
+        return [false()]
+
+    return [model.company_id.in_(sorted(company_ids))]
+
+
+def scope_query(query, model, current_user: User):
+    """Restringe a query às empresas do usuário (admin vê tudo)."""
+    return query.filter(*scope_filter(model, current_user))
+
+
+def scope_company_ids(current_user: User):
+    """Empresas do usuário; None = todas (admin)."""
+    return None if is_admin(current_user) else current_user.owned_company_ids
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# os módulos do backend são importados pelo nome (como no uvicorn)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,44 @@
+import io
+
+import numpy as np
+import pytest
+
+from dosimetry import DosimetryError, read_samples
+
+
+def samples(content: bytes) -> list:
+    return read_samples(io.BytesIO(content)).tolist()
+
+
+@pytest.mark.parametrize("content", [
+    b"1 87.5\n2 88.0\n3 90.0\n",
+    b"1\t87.5\n2\t88.0\n3\t90.0\n",
+    b"08:00:01 87.5\n08:00:02 88.0\n08:00:03 90.0\n",
+    b"08:00:01\t87,5\n08:00:02\t88,0\n08:00:03\t90,0\n",
+    b"08:00:01;87,5\n08:00:02;88,0\n08:00:03;90,0\n",
+    b"hora,nivel\n08:00:01,87.5\n08:00:02,88.0\n08:00:03,90.0\n",
+    b"Hora Nivel\n08:00:01 87.5\n08:00:02 88.0\n08:00:03 90.0\n",
+    b"87.5\n88.0\n90.0\n",
+    b"87,5\n88,0\n90,0\n",
+])
+def test_level_is_last_column(content):
+    assert samples(content) == [87.5, 88.0, 90.0]
+
+
+def test_invalid_level_is_an_error():
+    with pytest.raises(DosimetryError):
+        samples(b"1 87.5\n2 alto\n")
+
+
+def test_empty_file_is_an_error():
+    with pytest.raises(DosimetryError):
+        samples(b"\n\n")
+
+
+def test_blocks_keep_lines_whole(monkeypatch):
+    import dosimetry
+
+    monkeypatch.setattr(dosimetry, "READ_BLOCK_SIZE", 7)
+    content = b"".join(b"%d 8%d.5\n" % (i, i % 10) for i in range(50))
+
+    assert np.allclose(samples(content), [80.5 + i % 10 for i in range(50)])
@@ -0,0 +1,146 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import CollectionVersion
+from summary import increment_counters
+
+
+# ============================================================
+# VERSÃO DAS COLEÇÕES + ETAG / 304
+# ============================================================
+# Cada escrita incrementa collection_versions(company_id, coleção) na
+# mesma transação. O ETag de uma listagem / dashboard é um hash das
+# versões do escopo do usuário + parâmetros da URL, calculado com uma
+# única agregação indexada: se o cliente manda If-None-Match igual,
+# a rota responde 304 antes de carregar qualquer registro.
+#
+# Escritas fora da API (SQL direto, migrations) não mudam a versão:
+# depois delas, rodar bump_versions(db, coleção) (todas as empresas).
+
+COLLECTIONS = ("aso", "nr17", "ltcat", "pgr")
+
+# mudar quando o formato das respostas mudar (invalida ETags antigos)
+ETAG_FORMAT = 1
+
+
+def bump_versions(db: Session, collection: str, company_ids=None):
+    """
+    Incrementa a versão da coleção nas empresas informadas.
+    company_ids=None → todas as linhas da coleção (recálculo global).
+    Não faz commit.
+    """
+    now = datetime.utcnow()
+
+    if company_ids is None:
+        (
+            db.query(CollectionVersion)
+            .filter(CollectionVersion.collection == collection)
+            .update(
+                {
+                    CollectionVersion.version: CollectionVersion.version + 1,
+                    CollectionVersion.updated_at: now,
+                },
+                synchronize_session=False,
+            )
+        )
+        return
+
+    for company_id in sorted({c for c in company_ids if c is not None}):
+        increment_counters(
+            db, CollectionVersion,
+            {"company_id": company_id, "collection": collection},
+            {"version": 1},
+            {"updated_at": now},
+        )
+
+
+def collection_state(db: Session, collections: Iterable[str], company_ids=None):
+    """(linhas, soma das versões, última mudança) do escopo."""
+    query = db.query(
+        func.count(),
+        func.coalesce(func.sum(CollectionVersion.version), 0),
+        func.max(CollectionVersion.updated_at),
+    ).filter(CollectionVersion.collection.in_(sorted(collections)))
+
+    if company_ids is not None:
+        query = query.filter(CollectionVersion.company_id.in_(sorted(company_ids)))
+
+    count, total, last_modified = query.one()
+    return int(count), int(total), last_modified
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1(repr((ETAG_FORMAT,) + parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match usa comparação fraca: ignora o prefixo W/
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in [t[2:] if t.startswith("W/") else t for t in tags]
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+
+    return last_modified.replace(microsecond=0) <= since
+
+
+def conditional_response(
+    request: Request,
+    response: Response,
+    db: Session,
+    collections: Iterable[str],
+    company_ids=None,
+    *extra,
+) -> Optional[Response]:
+    """
+    Calcula ETag / Last-Modified do escopo e os coloca na resposta.
+    Devolve um 304 pronto se o cliente já tem essa versão; senão None
+    e a rota segue normalmente.
+
+    extra: o que mais muda a resposta além dos dados (ex.: a data, em
+    dashboards com "vencidos"). A query string já entra no hash.
+    """
+    collections = sorted(collections)
+    count, total, last_modified = collection_state(db, collections, company_ids)
+
+    scope = "*" if company_ids is None else tuple(sorted(company_ids))
+    etag = make_etag(
+        request.url.path, str(request.url.query), collections, scope, count, total, *extra
+    )
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if last_modified is not None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, etag)
+    elif if_modified_since and last_modified is not None and not extra:
+        not_modified = _not_modified_since(if_modified_since, last_modified)
+    else:
+        not_modified = False
+
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    return None
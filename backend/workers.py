@@ -0,0 +1,236 @@
+import re
+from typing import Optional
+
+from sqlalchemy import insert, tuple_
+from sqlalchemy.orm import Session
+
+from models import AsoRecord, NR17Record, LTCATRecord, WorkerIndex
+from aso_validity import normalize_key
+
+
+# ============================================================
+# ÍNDICE DE TRABALHADORES
+# ============================================================
+# Cada ASO (nome / cpf) e cada avaliação NR-17 (trabalhador) vira uma
+# linha em worker_index com o CPF só com dígitos e o nome sem acento,
+# em minúsculas e com espaços normalizados. A busca é uma consulta
+# indexada nessa tabela; os registros vêm depois pela chave primária.
+#
+# O LTCAT é por função / setor, não por pessoa: os registros entram
+# na resposta pela função e setor que o índice encontrou.
+
+WORKER_SOURCES = {
+    "aso": (AsoRecord, "nome", "cpf"),
+    "nr17": (NR17Record, "trabalhador", None),
+}
+
+REINDEX_BATCH_SIZE = 5000
+SEARCH_LIMIT = 50
+CPF_LENGTH = 11
+
+
+def normalize_cpf(cpf) -> Optional[str]:
+    digits = re.sub(r"\D", "", str(cpf or ""))
+    return digits or None
+
+
+def normalize_name(nome) -> Optional[str]:
+    return normalize_key(" ".join(str(nome or "").split()))
+
+
+def worker_entry(modulo: str, record) -> Optional[dict]:
+    model, name_attr, cpf_attr = WORKER_SOURCES[modulo]
+
+    nome = getattr(record, name_attr)
+    cpf = normalize_cpf(getattr(record, cpf_attr)) if cpf_attr else None
+    nome_normalizado = normalize_name(nome)
+
+    if not nome_normalizado and not cpf:
+        return None
+
+    return {
+        "company_id": record.company_id,
+        "modulo": modulo,
+        "record_id": record.id,
+        "cpf": cpf,
+        "nome": nome,
+        "nome_normalizado": nome_normalizado,
+        "funcao": record.funcao,
+        "setor": record.setor,
+    }
+
+
+def unindex_record(db: Session, modulo: str, record_id: int):
+    (
+        db.query(WorkerIndex)
+        .filter(WorkerIndex.modulo == modulo, WorkerIndex.record_id == record_id)
+        .delete(synchronize_session=False)
+    )
+
+
+def index_record(db: Session, modulo: str, record):
+    """Reindexa um registro (precisa de record.id: chamar após flush)."""
+    unindex_record(db, modulo, record.id)
+
+    entry = worker_entry(modulo, record)
+
+    if entry:
+        db.execute(insert(WorkerIndex.__table__), [entry])
+
+
+def _index_batch(db: Session, modulo: str, rows) -> int:
+    entries = [e for e in (worker_entry(modulo, row) for row in rows) if e]
+
+    if entries:
+        db.execute(insert(WorkerIndex.__table__), entries)
+
+    return len(entries)
+
+
+def _source_query(db: Session, modulo: str):
+    model, name_attr, cpf_attr = WORKER_SOURCES[modulo]
+    columns = [model.id, model.company_id, getattr(model, name_attr), model.funcao, model.setor]
+
+    if cpf_attr:
+        columns.append(getattr(model, cpf_attr))
+
+    return model, db.query(*columns)
+
+
+def index_records_after(db: Session, modulo: str, after_id: int, company_ids) -> int:
+    """Indexa os registros com id > after_id (ex.: depois de um import em lote)."""
+    model, query = _source_query(db, modulo)
+
+    indexed = db.query(WorkerIndex.record_id).filter(WorkerIndex.modulo == modulo)
+
+    query = query.filter(
+        model.id > after_id,
+        model.company_id.in_(sorted(set(company_ids))),
+        ~model.id.in_(indexed),
+    )
+
+    return _index_batch(db, modulo, query.all())
+
+
+def reindex_all(db: Session) -> int:
+    """Reconstrói o índice inteiro em blocos. Não faz commit."""
+    db.query(WorkerIndex).delete(synchronize_session=False)
+
+    total = 0
+
+    for modulo in WORKER_SOURCES:
+        model, query = _source_query(db, modulo)
+        last_id = 0
+
+        while True:
+            rows = (
+                query.filter(model.id > last_id)
+                .order_by(model.id)
+                .limit(REINDEX_BATCH_SIZE)
+                .all()
+            )
+
+            if not rows:
+                break
+
+            total += _index_batch(db, modulo, rows)
+            last_id = rows[-1].id
+
+    return total
+
+
+def _name_prefix(db: Session, term: str):
+    column = WorkerIndex.nome_normalizado
+
+    # GLOB usa o índice no SQLite (LIKE lá ignora maiúsculas e não usa)
+    if db.bind.dialect.name == "sqlite":
+        return column.op("GLOB")(re.sub(r"[*?\[\]]", "", term) + "*")
+
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return column.like(escaped + "%", escape="\\")
+
+
+def search_workers(db: Session, q: str, company_ids=None, limit: int = SEARCH_LIMIT):
+    """
+    q com 11 dígitos (com ou sem pontuação) → CPF exato; senão, prefixo
+    do nome normalizado. company_ids=None → todas as empresas (admin).
+    """
+    cpf = normalize_cpf(q)
+    is_cpf = cpf is not None and len(cpf) == CPF_LENGTH and not re.search(r"[^\d\s.\-/]", q)
+
+    query = db.query(WorkerIndex)
+
+    if company_ids is not None:
+        query = query.filter(WorkerIndex.company_id.in_(sorted(company_ids)))
+
+    if is_cpf:
+        query = query.filter(WorkerIndex.cpf == cpf)
+    else:
+        nome = normalize_name(q)
+
+        if not nome:
+            return None
+
+        query = query.filter(_name_prefix(db, nome))
+
+    hits = (
+        query.order_by(WorkerIndex.nome_normalizado, WorkerIndex.id)
+        .limit(limit + 1)
+        .all()
+    )
+
+    truncated = len(hits) > limit
+    hits = hits[:limit]
+
+    workers = {}
+    ids = {modulo: [] for modulo in WORKER_SOURCES}
+    roles = set()
+
+    # NR-17 não tem CPF: junta pelo nome com o ASO que tiver
+    cpf_by_name = {
+        (hit.company_id, hit.nome_normalizado): hit.cpf
+        for hit in hits if hit.cpf and hit.nome_normalizado
+    }
+
+    for hit in hits:
+        key = (
+            hit.company_id,
+            hit.cpf or cpf_by_name.get((hit.company_id, hit.nome_normalizado)) or hit.nome_normalizado,
+        )
+        worker = workers.setdefault(key, {
+            "nome": hit.nome,
+            "cpf": hit.cpf,
+            "company_id": hit.company_id,
+            "funcoes": [],
+            "setores": [],
+        })
+
+        if hit.cpf and not worker["cpf"]:
+            worker["cpf"] = hit.cpf
+        if hit.funcao and hit.funcao not in worker["funcoes"]:
+            worker["funcoes"].append(hit.funcao)
+        if hit.setor and hit.setor not in worker["setores"]:
+            worker["setores"].append(hit.setor)
+
+        ids[hit.modulo].append(hit.record_id)
+
+        if hit.funcao and hit.company_id is not None:
+            roles.add((hit.company_id, hit.funcao))
+
+    result = {"trabalhadores": list(workers.values()), "truncado": truncated}
+
+    for modulo, (model, _, _) in WORKER_SOURCES.items():
+        result[modulo] = (
+            db.query(model).filter(model.id.in_(ids[modulo])).order_by(model.id).all()
+            if ids[modulo] else []
+        )
+
+    result["ltcat"] = (
+        db.query(LTCATRecord)
+        .filter(tuple_(LTCATRecord.company_id, LTCATRecord.funcao).in_(sorted(roles)))
+        .order_by(LTCATRecord.id)
+        .all()
+        if roles else []
+    )
+
+    return result
@@ -0,0 +1,203 @@
+from datetime import date, datetime
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import Date, DateTime, bindparam, delete, insert, update
+from sqlalchemy.orm import Session
+
+from changelog import log_records
+
+
+# ============================================================
+# ESCRITAS EM UM COMANDO (RETURNING + versão otimista)
+# ============================================================
+# PUT vira um UPDATE ... WHERE id = :id [AND version = :v] RETURNING *,
+# POST um INSERT ... RETURNING * e DELETE um DELETE ... RETURNING *:
+# sem SELECT antes (o escopo do usuário vai no WHERE) nem refresh
+# depois. O objeto devolvido sai da sessão, então o commit não o expira
+# e a resposta é serializada sem voltar ao banco.
+#
+# version: o cliente manda a versão que leu; se alguém gravou antes,
+# o UPDATE não acha a linha e a rota responde 409 em vez de sobrescrever.
+
+VERSION_CONFLICT = "Registro alterado por outra pessoa enquanto você editava. Recarregue e salve de novo."
+
+READONLY_COLUMNS = {"id", "version", "origem_id"}
+
+
+def _coerce(column, value):
+    """
+    Texto ISO do JSON → date / datetime. O insert() / update() do Core
+    não passa pela conversão do ORM e o SQLite só aceita objetos Python.
+    """
+    if not isinstance(value, str):
+        return value
+
+    if isinstance(column.type, (Date, DateTime)) and not value.strip():
+        return None
+
+    try:
+        if isinstance(column.type, DateTime):
+            return datetime.fromisoformat(value)
+
+        if isinstance(column.type, Date):
+            # aceita também data com hora ("2024-01-31T00:00:00")
+            if len(value) > 10:
+                return datetime.fromisoformat(value).date()
+            return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Data inválida em {column.name}: {value}.")
+
+    return value
+
+
+def writable_values(model, data: dict, strict: bool = False) -> dict:
+    """Colunas do payload. strict (create): campo desconhecido é erro 400."""
+    columns = model.__table__.c
+
+    if strict:
+        unknown = sorted(k for k in data if k not in columns)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Campo inválido: {', '.join(unknown)}.")
+
+    # colunas geradas (ex.: Risk.score / nivel) são calculadas pelo banco
+    return {
+        k: _coerce(columns[k], v) for k, v in data.items()
+        if k in columns and k not in READONLY_COLUMNS and columns[k].computed is None
+    }
+
+
+def pop_version(data: dict) -> Optional[int]:
+    version = data.pop("version", None)
+
+    if version is None:
+        return None
+
+    try:
+        return int(version)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Versão inválida.")
+
+
+def _returning(db: Session, model, stmt):
+    obj = db.execute(
+        stmt.returning(model).execution_options(populate_existing=True)
+    ).scalar_one_or_none()
+
+    if obj is not None:
+        db.expunge(obj)
+
+    return obj
+
+
+def insert_returning(db: Session, model, values: dict):
+    obj = _returning(db, model, insert(model).values(**values))
+    log_records(db, model, [obj])
+    return obj
+
+
+def update_returning(
+    db: Session,
+    model,
+    record_id: int,
+    values: dict,
+    *criteria,
+    version: Optional[int] = None,
+    previous_company_id: Optional[int] = None,
+):
+    """None: nenhuma linha com esse id / escopo / versão."""
+    stmt = (
+        update(model)
+        .where(model.id == record_id, *criteria)
+        .values(**values, version=model.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+    if version is not None:
+        stmt = stmt.where(model.version == version)
+
+    obj = _returning(db, model, stmt)
+
+    if obj is not None:
+        log_records(db, model, [obj], previous_company_id=previous_company_id)
+
+    return obj
+
+
+def delete_returning(db: Session, model, record_id: int, *criteria):
+    stmt = (
+        delete(model)
+        .where(model.id == record_id, *criteria)
+        .execution_options(synchronize_session=False)
+    )
+
+    obj = _returning(db, model, stmt)
+
+    if obj is not None:
+        log_records(db, model, [obj], op="delete")
+
+    return obj
+
+
+# ============================================================
+# LOTES (INSERT multi-linha / UPDATE executemany)
+# ============================================================
+# O driver só junta linhas com as mesmas colunas num comando; payloads
+# com chaves diferentes viram um comando por conjunto de chaves.
+
+def _group_by_keys(rows):
+    groups = {}
+    for index, row in enumerate(rows):
+        groups.setdefault(tuple(sorted(row)), []).append(index)
+    return groups.values()
+
+
+def insert_many_returning(db: Session, model, rows) -> list:
+    """INSERT ... VALUES (...), (...) RETURNING id; ids na ordem de rows."""
+    table = model.__table__
+    ids = [None] * len(rows)
+
+    for indexes in _group_by_keys(rows):
+        result = db.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True),
+            [rows[i] for i in indexes],
+        )
+
+        for index, record_id in zip(indexes, result.scalars()):
+            ids[index] = record_id
+
+    return ids
+
+
+def update_many(db: Session, model, rows) -> int:
+    """
+    UPDATE por id e versão em executemany (cada row tem "id" e a
+    "version" esperada); version + 1. Devolve quantas linhas mudaram:
+    menos que len(rows) = alguém gravou no meio (conflito).
+    """
+    table = model.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("_id"), table.c.version == bindparam("_version"))
+        .values(version=table.c.version + 1)
+    )
+    # sem rowcount somado no executemany: um comando por linha
+    batched = db.get_bind().dialect.supports_sane_multi_rowcount
+    updated = 0
+
+    for indexes in _group_by_keys(rows):
+        params = [
+            {
+                "_id": rows[i]["id"],
+                "_version": rows[i]["version"],
+                **{k: v for k, v in rows[i].items() if k not in ("id", "version")},
+            }
+            for i in indexes
+        ]
+
+        if batched:
+            updated += db.execute(stmt, params).rowcount
+        else:
+            updated += sum(db.execute(stmt, [p]).rowcount for p in params)
+
+    return updated
@@ -66,6 +66,23 @@ function asList(data) {
   return [];
 }
 
+// Percorre todas as páginas ({ items, next_cursor }) de uma listagem
+async function apiGetAll(path) {
+  const items = [];
+  const sep = path.includes("?") ? "&" : "?";
+  let cursor = null;
+
+  do {
+    const after = cursor ? `&after=${encodeURIComponent(cursor)}` : "";
+    const data = await apiGet(`${path}${sep}limit=500${after}`);
+
+    items.push(...(asList(data)));
+    cursor = data && data.next_cursor;
+  } while (cursor);
+
+  return items;
+}
+
 // ---------- ASO ----------
 async function fetchASORecords() {
   const candidates = [
@@ -74,8 +91,7 @@ async function fetchASORecords() {
 
   for (const path of candidates) {
     try {
-      const data = await apiGet(path);
-      const list = asList(data);
+      const list = await apiGetAll(path);
 
       if (list.length > 0) {
         console.log("ASO carregado pela rota:", path);
@@ -150,8 +166,8 @@ async function loadKPIsAndCharts() {
 
     const [asos, nr17Raw, ltcatRaw] = await Promise.all([
       fetchASORecords(),
-      apiGet(ENDPOINT_NR17).catch(() => []),
-      apiGet(ENDPOINT_LTCAT).catch(() => []),
+      apiGetAll(ENDPOINT_NR17).catch(() => []),
+      apiGetAll(ENDPOINT_LTCAT).catch(() => []),
     ]);
 
     const listaASO = asList(asos);
@@ -490,7 +506,7 @@ function buildNR17TabCharts(nr17) {
 
 // ---------- PGR ----------
 async function carregarArvorePGR() {
-  const companies = await apiGet("/pgr/companies").catch(() => []);
+  const companies = await apiGetAll("/pgr/companies").catch(() => []);
 
   const allSectors = [];
   const allHazards = [];
@@ -498,19 +514,20 @@ async function carregarArvorePGR() {
   const allActions = [];
 
   for (const c of companies || []) {
-    const sectors = await apiGet(`/pgr/sectors/by-company/${c.id}`).catch(() => []);
-    sectors.forEach((s) => allSectors.push({ ...s, company_id: c.id }));
+    const tree = await apiGet(`/pgr/companies/${c.id}/tree`).catch(() => ({ sectors: [] }));
+
+    for (const s of tree.sectors || []) {
+      const { hazards = [], ...sector } = s;
+      allSectors.push({ ...sector, company_id: c.id });
 
-    for (const s of sectors || []) {
-      const hazards = await apiGet(`/pgr/hazards/by-sector/${s.id}`).catch(() => []);
-      hazards.forEach((h) => allHazards.push({ ...h, sector_id: s.id }));
+      for (const h of hazards) {
+        const { risks = [], ...hazard } = h;
+        allHazards.push({ ...hazard, sector_id: s.id });
 
-      for (const h of hazards || []) {
-        const risks = await apiGet(`/pgr/risks/by-hazard/${h.id}`).catch(() => []);
-        risks.forEach((r) => allRisks.push({ ...r, hazard_id: h.id }));
+        for (const r of risks) {
+          const { actions = [], ...risk } = r;
+          allRisks.push({ ...risk, hazard_id: h.id });
 
-        for (const r of risks || []) {
-          const actions = await apiGet(`/pgr/actions/by-risk/${r.id}`).catch(() => []);
           actions.forEach((a) => allActions.push({ ...a, risk_id: r.id }));
         }
       }
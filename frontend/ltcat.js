@@ -26,6 +26,8 @@ function checkUnauthorized(status) {
 
 // ID do registro em edição (null = criando novo)
 let selectedLTCATId = null;
+// versão lida do registro em edição (o servidor recusa se mudou)
+let selectedLTCATVersion = null;
 function formatarDataBR(data) {
   if (!data) return "-";
 
@@ -39,7 +41,10 @@ document.addEventListener("DOMContentLoaded", () => {
     return;
   }
 
-  carregarLTCATDoServidor();
+  // pendências de uma sessão offline vão antes de sincronizar
+  enviarFilaLTCAT()
+    .catch(err => console.error("Fila LTCAT ainda pendente:", err))
+    .finally(carregarLTCATDoServidor);
   attachTabelaLTCATHandlers();
 });
 
@@ -112,12 +117,97 @@ function preencherFormularioLTCAT(r) {
   document.getElementById("observacoes").value  = r.observacoes || "";
 
   selectedLTCATId = r.id;
+  selectedLTCATVersion = r.version ?? null;
 
   // botão vira "Atualizar"
   const btn = document.getElementById("btn-salvar-ltcat");
   if (btn) btn.textContent = "💾 Atualizar Registro";
 }
 
+// ===============================
+// Fila de envio (funciona offline)
+// ===============================
+// Cada formulário salvo entra numa fila local com uma chave única, e a
+// fila inteira vai num POST /sync/push. Se a rede cair, a fila fica no
+// aparelho e é reenviada depois; a chave impede gravar em dobro.
+const FILA_LTCAT = "filaSyncLTCAT";
+
+function novaChaveSync() {
+  if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+  return `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+}
+
+function enfileirarLTCAT(item) {
+  const fila = JSON.parse(localStorage.getItem(FILA_LTCAT)) || [];
+  const key = novaChaveSync();
+
+  // segunda edição offline do mesmo registro: a versão já vai mudar com
+  // a primeira, então só a primeira confere
+  if (item.op === "update" && fila.some(i => i.op === "update" && i.id === item.id)) {
+    item = { ...item, data: { ...item.data } };
+    delete item.data.version;
+  }
+
+  fila.push({ key, modulo: "ltcat", ...item });
+  localStorage.setItem(FILA_LTCAT, JSON.stringify(fila));
+
+  return key;
+}
+
+// Envia a fila. Devolve {chave: id} do que foi gravado, ou null se o
+// servidor recusou o lote (o item recusado sai da fila).
+// Erro de rede: lança exceção e a fila continua como estava.
+async function enviarFilaLTCAT() {
+  const fila = JSON.parse(localStorage.getItem(FILA_LTCAT)) || [];
+  if (fila.length === 0) return {};
+
+  const res = await fetch(`${API_BASE}/sync/push`, {
+    method: "POST",
+    headers: getAuthHeaders({ "Content-Type": "application/json" }),
+    body: JSON.stringify({ items: fila })
+  });
+
+  if (checkUnauthorized(res.status)) return null;
+
+  if (!res.ok) {
+    const erro = await res.json().catch(() => null);
+    const detalhe = erro && erro.detail;
+    console.error("Erro ao enviar fila LTCAT:", res.status, detalhe);
+
+    // o lote é tudo ou nada: tira da fila só o item recusado
+    if (detalhe && detalhe.key) {
+      const restante = fila.filter(item => item.key !== detalhe.key);
+      localStorage.setItem(FILA_LTCAT, JSON.stringify(restante));
+    }
+
+    alert(
+      "⚠️ Erro ao salvar no servidor.\n\n" +
+      "Status: " + res.status + "\n" +
+      "Detalhe: " + (detalhe && detalhe.detail ? detalhe.detail : JSON.stringify(detalhe))
+    );
+    return null;
+  }
+
+  const resultado = await res.json();
+
+  // remove o que foi enviado (outro formulário pode ter entrado na fila)
+  const enviados = new Set(fila.map(item => item.key));
+  const restante = (JSON.parse(localStorage.getItem(FILA_LTCAT)) || [])
+    .filter(item => !enviados.has(item.key));
+  localStorage.setItem(FILA_LTCAT, JSON.stringify(restante));
+
+  return Object.fromEntries(resultado.itens.map(item => [item.key, item.id]));
+}
+
+// Conexão voltou: envia o que ficou pendente
+window.addEventListener("online", async () => {
+  try {
+    if (await enviarFilaLTCAT()) await carregarLTCATDoServidor();
+  } catch (err) {
+    console.error("Fila LTCAT ainda pendente:", err);
+  }
+});
+
 // ===============================
 // Salvar / atualizar
 // ===============================
@@ -152,45 +242,30 @@ async function salvarLTCAT() {
     observacoes: form.observacoes || null,
   };
 
-  try {
-    let url = `${API_BASE}/ltcat/records`;
-    let method = "POST";
-
-    if (selectedLTCATId) {
-      url = `${API_BASE}/ltcat/records/${selectedLTCATId}`;
-      method = "PUT";
-    }
-
-    const res = await fetch(url, {
-      method,
-      headers: getAuthHeaders({ "Content-Type": "application/json" }),
-      body: JSON.stringify(payload),
-    });
-
-    if (checkUnauthorized(res.status)) return;
-
-    if (!res.ok) {
-      const txt = await res.text().catch(() => "");
-      console.error("Erro ao salvar/atualizar LTCAT:", res.status, txt);
-      alert(
-        "⚠️ Erro ao salvar o registro LTCAT.\n\n" +
-        "Status: " + res.status + "\n" +
-        (txt ? "Detalhe: " + txt : "Sem corpo de resposta.")
-      );
-      return;
-    }
+  const chave = enfileirarLTCAT(
+    selectedLTCATId
+      ? {
+          op: "update",
+          id: selectedLTCATId,
+          data: selectedLTCATVersion != null ? { ...payload, version: selectedLTCATVersion } : payload
+        }
+      : { op: "create", data: payload }
+  );
 
-    const saved = await res.json().catch(() => null);
+  try {
+    const ids = await enviarFilaLTCAT();
+    if (!ids) return;
 
-    // Atualiza lista com o que veio do servidor
+    // Atualiza lista com o que mudou no servidor
     await carregarLTCATDoServidor();
 
-    const idToStore = saved && saved.id ? saved.id : selectedLTCATId;
+    const idToStore = ids[chave] || selectedLTCATId;
     if (idToStore) {
       localStorage.setItem("ultimoLTCATId", String(idToStore));
     }
 
     selectedLTCATId = null;
+    selectedLTCATVersion = null;
     limparLTCAT();
 
     const btn = document.getElementById("btn-salvar-ltcat");
@@ -198,8 +273,17 @@ async function salvarLTCAT() {
 
     alert("✅ Registro LTCAT salvo com sucesso!");
   } catch (err) {
+    // sem rede: o formulário fica na fila e vai no próximo envio
     console.error("Erro de rede ao salvar LTCAT:", err);
-    alert("⚠️ Erro de rede ao salvar o registro LTCAT.");
+
+    selectedLTCATId = null;
+    selectedLTCATVersion = null;
+    limparLTCAT();
+
+    const btn = document.getElementById("btn-salvar-ltcat");
+    if (btn) btn.textContent = "💾 Salvar Registro";
+
+    alert("📶 Sem conexão: registro guardado no aparelho. Será enviado quando a conexão voltar.");
   }
 }
 
@@ -208,20 +292,45 @@ async function salvarLTCAT() {
 // ===============================
 async function carregarLTCATDoServidor() {
   try {
-    const res = await fetch(`${API_BASE}/ltcat/records`, {
-      headers: getAuthHeaders(),
-    });
+    // Espelho local + cursor: só baixa o que mudou desde o último sync
+    // (na primeira vez, since=0 traz tudo)
+    const porId = new Map(
+      (JSON.parse(localStorage.getItem("registrosLTCAT")) || []).map(item => [item.id, item])
+    );
+    let since = Number(localStorage.getItem("syncCursorLTCAT") || 0);
+    if (porId.size === 0) since = 0;
 
-    if (checkUnauthorized(res.status)) return;
+    let hasMore = true;
 
-    if (!res.ok) {
-      console.error("Erro ao buscar LTCAT:", await res.text());
-      return;
+    while (hasMore) {
+      const res = await fetch(`${API_BASE}/sync/changes?entidades=ltcat&since=${since}`, {
+        headers: getAuthHeaders(),
+      });
+
+      if (checkUnauthorized(res.status)) return;
+
+      if (!res.ok) {
+        console.error("Erro ao sincronizar LTCAT:", await res.text());
+        return;
+      }
+
+      const page = await res.json();
+      const mudancas = page.changes.ltcat || { upserts: [], deletes: [] };
+
+      mudancas.upserts.forEach(item => porId.set(item.id, item));
+      mudancas.deletes.forEach(id => porId.delete(id));
+
+      since = page.cursor;
+      hasMore = page.has_more;
     }
 
-    const lista = await res.json();
+    const lista = [...porId.values()].sort((a, b) => a.id - b.id);
 
+    // Sincroniza localStorage para dashboard e relatórios
     localStorage.setItem("registrosLTCAT", JSON.stringify(lista));
+    localStorage.setItem("syncCursorLTCAT", String(since));
+
+    // Monta tabela na tela
     carregarLTCAT(lista);
   } catch (err) {
     console.error("Erro de rede ao carregar LTCAT:", err);
@@ -288,36 +397,51 @@ function limparLTCAT() {
   document.getElementById("observacoes").value = "";
 
   selectedLTCATId = null;
+  selectedLTCATVersion = null;
   const btn = document.getElementById("btn-salvar-ltcat");
   if (btn) btn.textContent = "💾 Salvar Registro";
 }
 
 // ===============================
-// Filtro da tabela
+// Filtro da tabela (busca no servidor: ?q=)
 // ===============================
+let filtroLTCATTimer = null;
+let filtroLTCATSeq = 0;
+
 function filtrarLTCAT() {
-  const termo = document
-    .getElementById("filtroLTCAT")
-    .value.trim()
-    .toLowerCase();
+  clearTimeout(filtroLTCATTimer);
+  filtroLTCATTimer = setTimeout(buscarLTCAT, 250);
+}
 
-  let lista = JSON.parse(localStorage.getItem("registrosLTCAT")) || [];
+async function buscarLTCAT() {
+  const termo = document.getElementById("filtroLTCAT").value.trim();
+  const seq = ++filtroLTCATSeq;
 
   if (termo === "") {
-    carregarLTCAT(lista);
+    carregarLTCAT(JSON.parse(localStorage.getItem("registrosLTCAT")) || []);
     return;
   }
 
-  const filtrada = lista.filter((item) => {
-    return (
-      (item.empresa || "").toLowerCase().includes(termo) ||
-      (item.setor || "").toLowerCase().includes(termo) ||
-      (item.funcao || "").toLowerCase().includes(termo) ||
-      (item.agente || "").toLowerCase().includes(termo)
+  try {
+    const res = await fetch(
+      `${API_BASE}/ltcat/records?limit=500&q=${encodeURIComponent(termo)}`,
+      { headers: getAuthHeaders() }
     );
-  });
 
-  carregarLTCAT(filtrada);
+    if (checkUnauthorized(res.status)) return;
+
+    if (!res.ok) {
+      console.error("Erro ao filtrar LTCAT:", await res.text());
+      return;
+    }
+
+    const page = await res.json();
+
+    // ignora respostas de buscas já substituídas por outra digitação
+    if (seq === filtroLTCATSeq) carregarLTCAT(page.items);
+  } catch (err) {
+    console.error("Erro de rede ao filtrar LTCAT:", err);
+  }
 }
 
 // ===============================
@@ -26,6 +26,8 @@ function checkUnauthorized(status) {
 
 // ID da avaliação em edição (null = criando nova)
 let selectedNR17Id = null;
+// versão lida do registro em edição (o servidor recusa se mudou)
+let selectedNR17Version = null;
 function formatarDataBR(data) {
   if (!data) return "-";
 
@@ -39,7 +41,10 @@ document.addEventListener("DOMContentLoaded", () => {
     window.location.href = "index.html";
     return;
   }
-  carregarNR17DoServidor();
+  // pendências de uma sessão offline vão antes de sincronizar
+  enviarFilaNR17()
+    .catch(err => console.error("Fila NR-17 ainda pendente:", err))
+    .finally(carregarNR17DoServidor);
   attachTabelaNR17Handlers();
 });
 
@@ -74,6 +79,25 @@ function calcularIndiceNR17() {
   return { soma, classificacao };
 }
 
+// Ordem dos fatores no campo empacotado (2 bits cada), igual ao backend
+const FATORES_NR17 = ["mobiliario", "postura", "esforco", "pausas", "ambiente", "organizacao"];
+
+function lerFatoresNR17() {
+  const fatores = {};
+  FATORES_NR17.forEach(nome => {
+    fatores[nome] = parseInt(document.getElementById(nome).value || "1");
+  });
+  return fatores;
+}
+
+function desempacotarFatoresNR17(packed) {
+  const fatores = {};
+  FATORES_NR17.forEach((nome, i) => {
+    fatores[nome] = (packed >> (2 * i)) & 3;
+  });
+  return fatores;
+}
+
 // ===============================
 // Preencher formulário a partir de um registro
 // ===============================
@@ -86,6 +110,14 @@ function preencherFormularioNR17(av) {
   document.getElementById("dataAvaliacao").value = av.data_avaliacao || av.dataAvaliacao || "";
   document.getElementById("observacoes").value   = av.observacoes || "";
 
+  // Registros antigos não têm os fatores: os selects ficam como estão
+  if (av.fatores !== null && av.fatores !== undefined) {
+    const fatores = desempacotarFatoresNR17(av.fatores);
+    FATORES_NR17.forEach(nome => {
+      document.getElementById(nome).value = String(fatores[nome]);
+    });
+  }
+
   // Atualiza indicação de risco na sidebar
   const span = document.getElementById("resultadoRisco");
   span.textContent = `${av.risco} (score: ${av.score})`;
@@ -99,6 +131,90 @@ function preencherFormularioNR17(av) {
   if (btn) btn.textContent = "💾 Atualizar Avaliação";
 }
 
+// ===============================
+// Fila de envio (funciona offline)
+// ===============================
+// Cada formulário salvo entra numa fila local com uma chave única, e a
+// fila inteira vai num POST /sync/push. Se a rede cair, a fila fica no
+// aparelho e é reenviada depois; a chave impede gravar em dobro.
+const FILA_NR17 = "filaSyncNR17";
+
+function novaChaveSync() {
+  if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+  return `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+}
+
+function enfileirarNR17(item) {
+  const fila = JSON.parse(localStorage.getItem(FILA_NR17)) || [];
+  const key = novaChaveSync();
+
+  // segunda edição offline do mesmo registro: a versão já vai mudar com
+  // a primeira, então só a primeira confere
+  if (item.op === "update" && fila.some(i => i.op === "update" && i.id === item.id)) {
+    item = { ...item, data: { ...item.data } };
+    delete item.data.version;
+  }
+
+  fila.push({ key, modulo: "nr17", ...item });
+  localStorage.setItem(FILA_NR17, JSON.stringify(fila));
+
+  return key;
+}
+
+// Envia a fila. Devolve {chave: id} do que foi gravado, ou null se o
+// servidor recusou o lote (o item recusado sai da fila).
+// Erro de rede: lança exceção e a fila continua como estava.
+async function enviarFilaNR17() {
+  const fila = JSON.parse(localStorage.getItem(FILA_NR17)) || [];
+  if (fila.length === 0) return {};
+
+  const res = await fetch(`${API_BASE}/sync/push`, {
+    method: "POST",
+    headers: getAuthHeaders({ "Content-Type": "application/json" }),
+    body: JSON.stringify({ items: fila })
+  });
+
+  if (checkUnauthorized(res.status)) return null;
+
+  if (!res.ok) {
+    const erro = await res.json().catch(() => null);
+    const detalhe = erro && erro.detail;
+    console.error("Erro ao enviar fila NR-17:", res.status, detalhe);
+
+    // o lote é tudo ou nada: tira da fila só o item recusado
+    if (detalhe && detalhe.key) {
+      const restante = fila.filter(item => item.key !== detalhe.key);
+      localStorage.setItem(FILA_NR17, JSON.stringify(restante));
+    }
+
+    alert(
+      "⚠️ Erro ao salvar no servidor.\n\n" +
+      "Status: " + res.status + "\n" +
+      "Detalhe: " + (detalhe && detalhe.detail ? detalhe.detail : JSON.stringify(detalhe))
+    );
+    return null;
+  }
+
+  const resultado = await res.json();
+
+  // remove o que foi enviado (outro formulário pode ter entrado na fila)
+  const enviados = new Set(fila.map(item => item.key));
+  const restante = (JSON.parse(localStorage.getItem(FILA_NR17)) || [])
+    .filter(item => !enviados.has(item.key));
+  localStorage.setItem(FILA_NR17, JSON.stringify(restante));
+
+  return Object.fromEntries(resultado.itens.map(item => [item.key, item.id]));
+}
+
+// Conexão voltou: envia o que ficou pendente
+window.addEventListener("online", async () => {
+  try {
+    if (await enviarFilaNR17()) await carregarNR17DoServidor();
+  } catch (err) {
+    console.error("Fila NR-17 ainda pendente:", err);
+  }
+});
+
 // ===============================
 // Salvar OU atualizar avaliação
 // ===============================
@@ -116,27 +232,7 @@ async function salvarNR17() {
     return;
   }
 
-  let risco, score;
-
-  if (selectedNR17Id) {
-    // EDIÇÃO: mantém risco/score original (não temos mais os fatores detalhados)
-    const lista = JSON.parse(localStorage.getItem("avaliacoesNR17")) || [];
-    const avOrig = lista.find(a => String(a.id) === String(selectedNR17Id));
-    if (avOrig) {
-      risco = avOrig.risco;
-      score = avOrig.score;
-    } else {
-      const indice = calcularIndiceNR17();
-      risco = indice.classificacao;
-      score = indice.soma;
-    }
-  } else {
-    // NOVO: calcula índice com base nos selects
-    const indice = calcularIndiceNR17();
-    risco = indice.classificacao;
-    score = indice.soma;
-  }
-
+  // score e risco são calculados no servidor a partir dos fatores
   const payload = {
     empresa: empresa || null,
     setor,
@@ -144,53 +240,35 @@ async function salvarNR17() {
     trabalhador: trabalhador || null,
     tipo_posto: tipoPosto,
     data_avaliacao: dataAvaliacao,
-    risco,
-    score,
+    fatores: lerFatoresNR17(),
     observacoes: observacoes || null
   };
 
-  try {
-    let url = `${API_BASE}/nr17/records`;
-    let method = "POST";
-
-    if (selectedNR17Id) {
-      url = `${API_BASE}/nr17/records/${selectedNR17Id}`;
-      method = "PUT";
-    }
-
-    const res = await fetch(url, {
-      method,
-      headers: getAuthHeaders({ "Content-Type": "application/json" }),
-      body: JSON.stringify(payload)
-    });
-
-    if (checkUnauthorized(res.status)) return;
-
-    if (!res.ok) {
-      const txt = await res.text().catch(() => "");
-      console.error("Erro ao salvar/atualizar NR-17:", res.status, txt);
-
-      alert(
-        "⚠️ Erro ao salvar no servidor.\n\n" +
-        "Status: " + res.status + "\n" +
-        (txt ? "Detalhe: " + txt : "Sem corpo de resposta.")
-      );
-      return;
-    }
+  const chave = enfileirarNR17(
+    selectedNR17Id
+      ? {
+          op: "update",
+          id: selectedNR17Id,
+          data: selectedNR17Version != null ? { ...payload, version: selectedNR17Version } : payload
+        }
+      : { op: "create", data: payload }
+  );
 
-    const saved = await res.json().catch(() => null);
+  try {
+    const ids = await enviarFilaNR17();
+    if (!ids) return;
 
-    // Atualiza lista trazendo tudo do servidor de novo
+    // Atualiza lista com o que mudou no servidor
     await carregarNR17DoServidor();
 
-    // guarda id da última avaliação salva (para imprimir / PDF)
-    const idToStore = saved && saved.id ? saved.id : selectedNR17Id;
+    const idToStore = ids[chave] || selectedNR17Id;
     if (idToStore) {
       localStorage.setItem("ultimaNR17Id", String(idToStore));
     }
 
     // Limpa formulário e volta para modo "salvar novo"
     selectedNR17Id = null;
+    selectedNR17Version = null;
     limparNR17(false);
 
     const btn = document.getElementById("btn-salvar-nr17");
@@ -198,8 +276,17 @@ async function salvarNR17() {
 
     alert("✅ Avaliação NR-17 salva com sucesso!");
   } catch (err) {
+    // sem rede: o formulário fica na fila e vai no próximo envio
     console.error("Erro de rede ao salvar NR-17:", err);
-    alert("⚠️ Erro de rede ao salvar a avaliação NR-17.");
+
+    selectedNR17Id = null;
+    selectedNR17Version = null;
+    limparNR17(false);
+
+    const btn = document.getElementById("btn-salvar-nr17");
+    if (btn) btn.textContent = "💾 Salvar Avaliação";
+
+    alert("📶 Sem conexão: avaliação guardada no aparelho. Será enviada quando a conexão voltar.");
   }
 }
 
@@ -209,21 +296,43 @@ async function salvarNR17() {
 // ===============================
 async function carregarNR17DoServidor() {
   try {
-    const res = await fetch(`${API_BASE}/nr17/records`, {
-      headers: getAuthHeaders()
-    });
+    // Espelho local + cursor: só baixa o que mudou desde o último sync
+    // (na primeira vez, since=0 traz tudo)
+    const porId = new Map(
+      (JSON.parse(localStorage.getItem("avaliacoesNR17")) || []).map(item => [item.id, item])
+    );
+    let since = Number(localStorage.getItem("syncCursorNR17") || 0);
+    if (porId.size === 0) since = 0;
 
-    if (checkUnauthorized(res.status)) return;
+    let hasMore = true;
 
-    if (!res.ok) {
-      console.error("Erro ao buscar NR-17:", await res.text());
-      return;
+    while (hasMore) {
+      const res = await fetch(`${API_BASE}/sync/changes?entidades=nr17&since=${since}`, {
+        headers: getAuthHeaders()
+      });
+
+      if (checkUnauthorized(res.status)) return;
+
+      if (!res.ok) {
+        console.error("Erro ao sincronizar NR-17:", await res.text());
+        return;
+      }
+
+      const page = await res.json();
+      const mudancas = page.changes.nr17 || { upserts: [], deletes: [] };
+
+      mudancas.upserts.forEach(item => porId.set(item.id, item));
+      mudancas.deletes.forEach(id => porId.delete(id));
+
+      since = page.cursor;
+      hasMore = page.has_more;
     }
 
-    const lista = await res.json();
+    const lista = [...porId.values()].sort((a, b) => a.id - b.id);
 
     // Sincroniza localStorage para dashboard e relatórios
     localStorage.setItem("avaliacoesNR17", JSON.stringify(lista));
+    localStorage.setItem("syncCursorNR17", String(since));
 
     // Monta tabela na tela
     carregarNR17(lista);
@@ -294,34 +403,51 @@ function limparNR17(resetIndice = true) {
 
   // volta para modo "novo"
   selectedNR17Id = null;
+  selectedNR17Version = null;
   const btn = document.getElementById("btn-salvar-nr17");
   if (btn) btn.textContent = "💾 Salvar Avaliação";
 }
 
 // ===============================
-// Filtro na tabela (usa localStorage sincronizado)
+// Filtro na tabela (busca no servidor: ?q=)
 // ===============================
+let filtroNR17Timer = null;
+let filtroNR17Seq = 0;
+
 function filtrarNR17() {
-  const termo = document.getElementById("filtroNR17").value.trim().toLowerCase();
-  let lista = JSON.parse(localStorage.getItem("avaliacoesNR17")) || [];
+  clearTimeout(filtroNR17Timer);
+  filtroNR17Timer = setTimeout(buscarNR17, 250);
+}
+
+async function buscarNR17() {
+  const termo = document.getElementById("filtroNR17").value.trim();
+  const seq = ++filtroNR17Seq;
 
   if (termo === "") {
-    carregarNR17(lista);
+    carregarNR17(JSON.parse(localStorage.getItem("avaliacoesNR17")) || []);
     return;
   }
 
-  const filtrada = lista.filter(item => {
-    const setor = (item.setor || "").toLowerCase();
-    const funcao = (item.funcao || "").toLowerCase();
-    const risco = (item.risco || "").toLowerCase();
-    return (
-      setor.includes(termo) ||
-      funcao.includes(termo) ||
-      risco.includes(termo)
+  try {
+    const res = await fetch(
+      `${API_BASE}/nr17/records?limit=500&q=${encodeURIComponent(termo)}`,
+      { headers: getAuthHeaders() }
     );
-  });
 
-  carregarNR17(filtrada);
+    if (checkUnauthorized(res.status)) return;
+
+    if (!res.ok) {
+      console.error("Erro ao filtrar NR-17:", await res.text());
+      return;
+    }
+
+    const page = await res.json();
+
+    // ignora respostas de buscas já substituídas por outra digitação
+    if (seq === filtroNR17Seq) carregarNR17(page.items);
+  } catch (err) {
+    console.error("Erro de rede ao filtrar NR-17:", err);
+  }
 }
 
 // ===============================
@@ -352,6 +478,7 @@ function attachTabelaNR17Handlers() {
     // Editar
     if (btn.classList.contains("edit-nr17")) {
       selectedNR17Id = av.id;
+      selectedNR17Version = av.version ?? null;
       preencherFormularioNR17(av);
       window.scrollTo({ top: 0, behavior: "smooth" });
       return;
@@ -62,6 +62,23 @@ async function apiGet(path) {
   return handleResponse(res, "GET", path);
 }
 
+// Percorre todas as páginas ({ items, next_cursor }) de uma listagem
+async function apiGetAll(path) {
+  const items = [];
+  const sep = path.includes("?") ? "&" : "?";
+  let cursor = null;
+
+  do {
+    const after = cursor ? `&after=${encodeURIComponent(cursor)}` : "";
+    const data = await apiGet(`${path}${sep}limit=500${after}`);
+
+    items.push(...((data && data.items) || []));
+    cursor = data && data.next_cursor;
+  } while (cursor);
+
+  return items;
+}
+
 async function apiPost(path, body) {
   const res = await fetch(`${API_BASE}${path}`, {
     method: "POST",
@@ -154,7 +171,7 @@ async function carregarASO() {
   `;
 
   try {
-    const lista = (await apiGet(ASO_ENDPOINT)) || [];
+    const lista = await apiGetAll(ASO_ENDPOINT);
 
     _asoCache = lista;
     localStorage.setItem("registrosASO", JSON.stringify(lista));
@@ -475,7 +492,8 @@ function visualizarASO(id) {
 }
 
 async function obterUltimoASO() {
-  const lista = (await apiGet(ASO_ENDPOINT)) || [];
+  const page = await apiGet(`${ASO_ENDPOINT}?limit=1`);
+  const lista = (page && page.items) || [];
 
   if (!lista.length) return null;
 
@@ -6,6 +6,8 @@ if (!token) {
 }
 
 let selectedCompanyId = null;
+// versão lida da empresa em edição (o servidor recusa se mudou)
+let selectedCompanyVersion = null;
 let selectedSectorId = null;
 let selectedHazardId = null;
 let selectedRiskId = null;
@@ -45,6 +47,23 @@ async function apiGet(path) {
   return handleResponse(res, "GET", path);
 }
 
+// Percorre todas as páginas ({ items, next_cursor }) de uma listagem
+async function apiGetAll(path) {
+  const items = [];
+  const sep = path.includes("?") ? "&" : "?";
+  let cursor = null;
+
+  do {
+    const after = cursor ? `&after=${encodeURIComponent(cursor)}` : "";
+    const data = await apiGet(`${path}${sep}limit=500${after}`);
+
+    items.push(...((data && data.items) || []));
+    cursor = data && data.next_cursor;
+  } while (cursor);
+
+  return items;
+}
+
 async function apiPost(path, body) {
   const res = await fetch(`${API_BASE}${path}`, {
     method: "POST",
@@ -92,6 +111,7 @@ function getTbody(tableId) {
 
 function clearCompanyForm() {
   selectedCompanyId = null;
+  selectedCompanyVersion = null;
   selectedSectorId = null;
   selectedHazardId = null;
   selectedRiskId = null;
@@ -111,7 +131,7 @@ function clearCompanyForm() {
 
 async function loadCompanies() {
   try {
-    const companies = await apiGet("/pgr/companies");
+    const companies = await apiGetAll("/pgr/companies");
 
        renderCompanies(companies || []);
   } catch (err) {
@@ -163,7 +183,10 @@ async function handleSaveCompany(event) {
 
   try {
     if (selectedCompanyId) {
-      await apiPut(`/pgr/companies/${selectedCompanyId}`, payload);
+      await apiPut(`/pgr/companies/${selectedCompanyId}`, {
+        ...payload,
+        version: selectedCompanyVersion
+      });
       alert("Empresa atualizada com sucesso!");
     } else {
       await apiPost("/pgr/companies", payload);
@@ -182,6 +205,7 @@ async function selectCompany(id) {
   try {
     const company = await apiGet(`/pgr/companies/${id}`);
     selectedCompanyId = company.id;
+    selectedCompanyVersion = company.version ?? null;
     selectedSectorId = null;
     selectedHazardId = null;
     selectedRiskId = null;
@@ -226,7 +250,7 @@ async function loadSectors(companyId) {
   if (!tbody) return;
 
   try {
-    const sectors = await apiGet(`/pgr/sectors/by-company/${companyId}`);
+    const sectors = await apiGetAll(`/pgr/sectors/by-company/${companyId}`);
 
     if (!sectors.length) {
       tbody.innerHTML = `<tr><td colspan="4">Nenhum setor cadastrado.</td></tr>`;
@@ -312,7 +336,7 @@ async function loadHazards(sectorId) {
   if (!tbody) return;
 
   try {
-    const hazards = await apiGet(`/pgr/hazards/by-sector/${sectorId}`);
+    const hazards = await apiGetAll(`/pgr/hazards/by-sector/${sectorId}`);
 
     if (!hazards.length) {
       tbody.innerHTML = `<tr><td colspan="5">Nenhum perigo cadastrado.</td></tr>`;
@@ -397,23 +421,12 @@ async function deleteHazard(id) {
 // RISCOS
 // ===============================
 
-function calcRiskLevel(prob, sev) {
-  if (!prob || !sev) return "-";
-
-  const score = prob * sev;
-
-  if (score <= 4) return "Baixo";
-  if (score <= 9) return "Médio";
-  if (score <= 16) return "Alto";
-  return "Crítico";
-}
-
 async function loadRisks(hazardId) {
   const tbody = getTbody("risks-table");
   if (!tbody) return;
 
   try {
-    const risks = await apiGet(`/pgr/risks/by-hazard/${hazardId}`);
+    const risks = await apiGetAll(`/pgr/risks/by-hazard/${hazardId}`);
 
     if (!risks.length) {
       tbody.innerHTML = `<tr><td colspan="6">Nenhum risco cadastrado.</td></tr>`;
@@ -423,7 +436,7 @@ async function loadRisks(hazardId) {
     tbody.innerHTML = risks.map(risk => `
       <tr>
         <td>${risk.id}</td>
-        <td>${calcRiskLevel(risk.probabilidade, risk.severidade)}</td>
+        <td>${risk.nivel || "-"}</td>
         <td>${risk.probabilidade ?? "-"}</td>
         <td>${risk.severidade ?? "-"}</td>
         <td>${risk.medidas_existentes || "-"}</td>
@@ -500,7 +513,7 @@ async function loadActions(riskId) {
   if (!tbody) return;
 
   try {
-    const actions = await apiGet(`/pgr/actions/by-risk/${riskId}`);
+    const actions = await apiGetAll(`/pgr/actions/by-risk/${riskId}`);
 
     if (!actions.length) {
       tbody.innerHTML = `<tr><td colspan="6">Nenhuma ação cadastrada.</td></tr>`;
@@ -586,20 +599,20 @@ async function montarRelatorioPGRCompleto() {
   let setoresHTML = "";
 
   if (selectedCompanyId) {
-    const setores = await apiGet(`/pgr/sectors/by-company/${selectedCompanyId}`);
+    const arvore = await apiGet(`/pgr/companies/${selectedCompanyId}/tree`);
 
-    for (const setor of setores || []) {
+    for (const setor of arvore.sectors || []) {
       let perigosHTML = "";
 
-      const perigos = await apiGet(`/pgr/hazards/by-sector/${setor.id}`);
+      const perigos = setor.hazards;
 
       for (const perigo of perigos || []) {
         let riscosHTML = "";
 
-        const riscos = await apiGet(`/pgr/risks/by-hazard/${perigo.id}`);
+        const riscos = perigo.risks;
 
         for (const risco of riscos || []) {
-          const acoes = await apiGet(`/pgr/actions/by-risk/${risco.id}`);
+          const acoes = risco.actions;
 
           const acoesHTML = (acoes || []).map(acao => `
             <tr>
@@ -613,7 +626,7 @@ async function montarRelatorioPGRCompleto() {
 
           riscosHTML += `
             <div style="margin-top:18px; padding:16px; border:1px solid #e5e7eb; border-radius:14px;">
-              <h4 style="margin-bottom:10px;">Risco: ${calcRiskLevel(risco.probabilidade, risco.severidade)}</h4>
+              <h4 style="margin-bottom:10px;">Risco: ${risco.nivel || "-"}</h4>
               <p><strong>Probabilidade:</strong> ${risco.probabilidade ?? "-"}</p>
               <p><strong>Severidade:</strong> ${risco.severidade ?? "-"}</p>
               <p><strong>Medidas existentes:</strong> ${risco.medidas_existentes || "-"}</p>